@@ -0,0 +1,3 @@
+"""
+Benchmark harness with in-process stand-ins for OpenAI and Firestore.
+"""
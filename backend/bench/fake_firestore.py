@@ -0,0 +1,215 @@
+"""In-memory stand-in for the async Firestore client used by the services."""
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1.transforms import ArrayRemove, ArrayUnion, DELETE_FIELD, Increment
+import asyncio
+import copy
+import operator
+import uuid
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+    "array_contains": lambda value, item: isinstance(value, list) and item in value,
+}
+
+def _get_path(data: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+def _apply_update(data: dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    field = parts[-1]
+    if value is DELETE_FIELD:
+        data.pop(field, None)
+    elif isinstance(value, ArrayUnion):
+        current = data.setdefault(field, [])
+        current.extend(copy.deepcopy(item) for item in value.values if item not in current)
+    elif isinstance(value, ArrayRemove):
+        data[field] = [item for item in data.get(field, []) if item not in value.values]
+    elif isinstance(value, Increment):
+        data[field] = data.get(field, 0) + value.value
+    else:
+        data[field] = copy.deepcopy(value)
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = copy.deepcopy(data)
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+class FakeDocumentReference:
+    def __init__(self, client, collection: str, document_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = document_id
+
+    @property
+    def _store(self) -> dict:
+        return self._client._collections.setdefault(self._collection, {})
+
+    async def get(self, transaction=None):
+        await self._client._latency()
+        return FakeDocumentSnapshot(self, self._store.get(self.id))
+
+    async def set(self, data: dict, merge: bool = False):
+        await self._client._latency()
+        self._set(data, merge)
+
+    async def create(self, data: dict):
+        await self._client._latency()
+        if self.id in self._store:
+            raise AlreadyExists(f"Document already exists: {self._collection}/{self.id}")
+        self._set(data)
+
+    async def update(self, fields: dict):
+        await self._client._latency()
+        self._update(fields)
+
+    async def delete(self):
+        await self._client._latency()
+        self._store.pop(self.id, None)
+
+    def _set(self, data: dict, merge: bool = False) -> None:
+        if merge and self.id in self._store:
+            for path, value in data.items():
+                _apply_update(self._store[self.id], path, value)
+        else:
+            self._store[self.id] = {}
+            for path, value in data.items():
+                _apply_update(self._store[self.id], path, value)
+
+    def _update(self, fields: dict) -> None:
+        if self.id not in self._store:
+            raise NotFound(f"No document to update: {self._collection}/{self.id}")
+        for path, value in fields.items():
+            _apply_update(self._store[self.id], path, value)
+
+class FakeQuery:
+    def __init__(self, collection, filters: list = None, limit: int = None):
+        self._collection = collection
+        self._filters = filters or []
+        self._limit = limit
+
+    def where(self, field: str, op: str, value):
+        return FakeQuery(self._collection, self._filters + [(field, OPERATORS[op], value)], self._limit)
+
+    def limit(self, count: int):
+        return FakeQuery(self._collection, self._filters, count)
+
+    async def stream(self):
+        await self._collection._client._latency()
+        matched = 0
+        for document_id, data in list(self._collection._store.items()):
+            if all(_get_path(data, field) is not None and op(_get_path(data, field), value) for field, op, value in self._filters):
+                yield FakeDocumentSnapshot(self._collection.document(document_id), data)
+                matched += 1
+                if self._limit is not None and matched >= self._limit:
+                    return
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, name: str):
+        self._client = client
+        self.id = name
+        super().__init__(self)
+
+    @property
+    def _store(self) -> dict:
+        return self._client._collections.setdefault(self.id, {})
+
+    def document(self, document_id: str = None):
+        return FakeDocumentReference(self._client, self.id, document_id or uuid.uuid4().hex[:20])
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, data: dict, merge: bool = False):
+        self._writes.append(lambda: reference._set(data, merge))
+
+    def update(self, reference, fields: dict):
+        self._writes.append(lambda: reference._update(fields))
+
+    def delete(self, reference):
+        self._writes.append(lambda: reference._store.pop(reference.id, None))
+
+    def __len__(self):
+        return len(self._writes)
+
+    async def commit(self):
+        await self._client._latency()
+        for write in self._writes:
+            write()
+        self._writes = []
+
+class FakeTransaction(FakeWriteBatch):
+    """Serializes transactions with a client-wide lock, enough for google.cloud.firestore.async_transactional."""
+
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._id = None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._id = None
+
+    async def _begin(self, retry_id=None) -> None:
+        await self._client._transaction_lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    async def _commit(self):
+        try:
+            await self.commit()
+        finally:
+            self._client._transaction_lock.release()
+
+    async def _rollback(self) -> None:
+        self._writes = []
+        if self._client._transaction_lock.locked():
+            self._client._transaction_lock.release()
+
+class FakeAsyncFirestore:
+    """Async Firestore client keeping every collection in process memory."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._collections = {}
+        self._transaction_lock = asyncio.Lock()
+
+    async def _latency(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+    def collection(self, name: str):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,303 @@
+"""In-process stand-in for the parts of AsyncOpenAI the services use.
+
+Runs complete after a configurable latency, fail at a configurable rate and
+answer with canned question or learning path bodies.
+"""
+from types import SimpleNamespace
+import asyncio
+import hashlib
+import httpx
+import json
+import openai
+import random
+import time
+import uuid
+
+DEFAULT_QUESTIONS = {
+    "questions": [
+        {"id": 1, "question": "Which area of computing interests you most?", "options": ["AI", "Systems", "Theory", "Security"], "freeText": False},
+        {"id": 2, "question": "How much weekly workload can you take on?", "options": ["Light", "Moderate", "Heavy"], "freeText": False},
+        {"id": 3, "question": "Do you prefer project-based or exam-based courses?", "options": ["Projects", "Exams", "Mixed"], "freeText": False},
+        {"id": 4, "question": "Which career are you aiming for?", "options": [], "freeText": True},
+        {"id": 5, "question": "Anything else we should know?", "options": [], "freeText": True}
+    ]
+}
+
+DEFAULT_LEARNING_PATH = [
+    {
+        "title": f"CS {100 + i} Course {i}",
+        "description": f"Step {i} of the recommended path, building on the previous semester.",
+        "estimated_time": "1 semester",
+        "match_percentage": 90 - i * 3,
+        "public_reviews": ["Great course", "Heavy but rewarding"],
+        "professor_reviews": ["Clear lectures, fair exams"]
+    }
+    for i in range(1, 11)
+]
+
+def _usage(prompt: str, completion: str):
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(completion) // 4
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens)
+
+def _text_part(value: str):
+    return SimpleNamespace(type="text", text=SimpleNamespace(value=value, annotations=[]))
+
+class FakeStream:
+    """Async iterator over an event generator, closeable like the client's AsyncStream."""
+
+    def __init__(self, events):
+        self._events = events
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._events.__anext__()
+
+    async def close(self) -> None:
+        self.closed = True
+        await self._events.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+class FakeOpenAIBehaviour:
+    """Latency, failure and response settings shared by every fake resource."""
+
+    def __init__(self, run_latency: float = 2.0, run_latency_jitter: float = 0.5, failure_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, malformed_rate: float = 0.0, request_latency: float = 0.05, questions: dict = None, learning_path: list = None, stream_chunk_size: int = 60):
+        self.run_latency = run_latency
+        self.run_latency_jitter = run_latency_jitter
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.request_latency = request_latency
+        self.questions = questions or DEFAULT_QUESTIONS
+        self.learning_path = learning_path or DEFAULT_LEARNING_PATH
+        self.stream_chunk_size = stream_chunk_size
+
+    def sample_run_latency(self) -> float:
+        return max(0.0, random.gauss(self.run_latency, self.run_latency_jitter))
+
+    def sample_failure(self) -> bool:
+        return random.random() < self.failure_rate
+
+    def response_for(self, prompt: str) -> str:
+        # Requests to fix an unparseable reply always succeed
+        if "could not be parsed" not in prompt and random.random() < self.malformed_rate:
+            return "I'm sorry, I could not put together a recommendation this time."
+        if "questionnaire" in prompt or '"questions"' in prompt:
+            return json.dumps(self.questions)
+        return json.dumps(self.learning_path)
+
+    async def request(self) -> None:
+        await asyncio.sleep(self.request_latency)
+        if random.random() < self.rate_limit_rate:
+            response = httpx.Response(429, headers={"retry-after-ms": "200"}, request=httpx.Request("POST", "https://api.openai.com/v1"))
+            raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+class FakeAssistants:
+    def __init__(self, behaviour):
+        self._behaviour = behaviour
+
+    async def create(self, **kwargs):
+        await self._behaviour.request()
+        return SimpleNamespace(id=f"asst_{uuid.uuid4().hex[:24]}", **kwargs)
+
+    async def delete(self, assistant_id: str):
+        await self._behaviour.request()
+        return SimpleNamespace(id=assistant_id, deleted=True)
+
+class FakeMessages:
+    def __init__(self, behaviour, threads: dict):
+        self._behaviour = behaviour
+        self._threads = threads
+
+    async def create(self, thread_id: str, role: str, content: str, **kwargs):
+        await self._behaviour.request()
+        message = SimpleNamespace(id=f"msg_{uuid.uuid4().hex[:24]}", role=role, content=[_text_part(content)], created_at=time.time())
+        self._threads[thread_id]["messages"].append(message)
+        return message
+
+    async def list(self, thread_id: str, **kwargs):
+        await self._behaviour.request()
+        # Newest first, like the API's default order
+        return SimpleNamespace(data=list(reversed(self._threads[thread_id]["messages"])))
+
+class FakeRuns:
+    def __init__(self, behaviour, threads: dict):
+        self._behaviour = behaviour
+        self._threads = threads
+        self._runs = {}
+
+    def _start(self, thread_id: str, assistant_id: str):
+        thread = self._threads[thread_id]
+        prompt = thread["messages"][-1].content[0].text.value if thread["messages"] else ""
+        run = SimpleNamespace(
+            id=f"run_{uuid.uuid4().hex[:24]}",
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            status="queued",
+            last_error=None,
+            usage=None,
+            prompt=prompt,
+            text=self._behaviour.response_for(prompt),
+            finishes_at=time.monotonic() + self._behaviour.sample_run_latency(),
+            fails=self._behaviour.sample_failure()
+        )
+        self._runs[run.id] = run
+        return run
+
+    def _finish(self, run):
+        if run.status not in ("queued", "in_progress"):
+            return run
+        if run.fails:
+            run.status = "failed"
+            run.last_error = SimpleNamespace(code="server_error", message="Simulated failure")
+            return run
+        text = run.text
+        self._threads[run.thread_id]["messages"].append(
+            SimpleNamespace(id=f"msg_{uuid.uuid4().hex[:24]}", role="assistant", content=[_text_part(text)], created_at=time.time())
+        )
+        run.status = "completed"
+        run.usage = _usage(run.prompt, text)
+        return run
+
+    async def create(self, thread_id: str, assistant_id: str, stream: bool = False, **kwargs):
+        await self._behaviour.request()
+        run = self._start(thread_id, assistant_id)
+        if stream:
+            return FakeStream(self._stream(run))
+        return run
+
+    async def _stream(self, run):
+        run.status = "in_progress"
+        yield SimpleNamespace(event="thread.run.created", data=run)
+        yield SimpleNamespace(event="thread.run.in_progress", data=run)
+        if run.fails:
+            await asyncio.sleep(max(run.finishes_at - time.monotonic(), 0))
+            self._finish(run)
+            yield SimpleNamespace(event="thread.run.failed", data=run)
+            return
+
+        text = run.text
+        size = self._behaviour.stream_chunk_size
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        delay = max(run.finishes_at - time.monotonic(), 0) / len(chunks)
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=SimpleNamespace(content=[_text_part(chunk)])))
+        self._finish(run)
+        yield SimpleNamespace(event="thread.run.completed", data=run)
+
+    async def retrieve(self, thread_id: str, run_id: str, **kwargs):
+        await self._behaviour.request()
+        run = self._runs[run_id]
+        if run.status in ("queued", "in_progress"):
+            run.status = "in_progress"
+            if time.monotonic() >= run.finishes_at:
+                self._finish(run)
+        return run
+
+    async def list(self, thread_id: str, limit: int = 20, **kwargs):
+        await self._behaviour.request()
+        # Newest first, like the API's default order
+        runs = [run for run in self._runs.values() if run.thread_id == thread_id]
+        return SimpleNamespace(data=list(reversed(runs))[:limit])
+
+    async def cancel(self, thread_id: str, run_id: str, **kwargs):
+        await self._behaviour.request()
+        run = self._runs[run_id]
+        if run.status in ("queued", "in_progress", "requires_action"):
+            run.status = "cancelled"
+        return run
+
+class FakeThreads:
+    def __init__(self, behaviour):
+        self._behaviour = behaviour
+        self._threads = {}
+        self.messages = FakeMessages(behaviour, self._threads)
+        self.runs = FakeRuns(behaviour, self._threads)
+
+    async def create(self, **kwargs):
+        await self._behaviour.request()
+        thread = SimpleNamespace(id=f"thread_{uuid.uuid4().hex[:24]}")
+        self._threads[thread.id] = {"messages": []}
+        for message in kwargs.get("messages", []):
+            await self.messages.create(thread.id, message["role"], message["content"])
+        return thread
+
+    async def delete(self, thread_id: str, **kwargs):
+        await self._behaviour.request()
+        self._threads.pop(thread_id, None)
+        return SimpleNamespace(id=thread_id, deleted=True)
+
+class FakeChatCompletions:
+    def __init__(self, behaviour):
+        self._behaviour = behaviour
+
+    async def create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        await self._behaviour.request()
+        prompt = messages[-1]["content"]
+        text = self._behaviour.response_for(prompt)
+        if "questionnaire" not in prompt:
+            text = json.dumps({"learning_path": json.loads(text)})
+        latency = self._behaviour.sample_run_latency()
+        if stream:
+            return FakeStream(self._stream(prompt, text, latency))
+        await asyncio.sleep(latency)
+        if self._behaviour.sample_failure():
+            raise RuntimeError("Simulated chat completion failure")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text, refusal=None), finish_reason="stop")],
+            usage=_usage(prompt, text)
+        )
+
+    async def _stream(self, prompt: str, text: str, latency: float):
+        size = self._behaviour.stream_chunk_size
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))], usage=None)
+        yield SimpleNamespace(choices=[], usage=_usage(prompt, text))
+
+class FakeEmbeddings:
+    def __init__(self, behaviour, dimensions: int = 64):
+        self._behaviour = behaviour
+        self._dimensions = dimensions
+
+    def _vector(self, text: str) -> list:
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        return [rng.uniform(-1, 1) for _ in range(self._dimensions)]
+
+    async def create(self, model: str, input, **kwargs):
+        await self._behaviour.request()
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=self._vector(text)) for i, text in enumerate(texts)])
+
+class FakeModels:
+    def __init__(self, behaviour: FakeOpenAIBehaviour):
+        self._behaviour = behaviour
+
+    async def retrieve(self, model: str):
+        await self._behaviour.request()
+        return SimpleNamespace(id=model, object="model")
+
+class FakeAsyncOpenAI:
+    """AsyncOpenAI look-alike covering assistants, threads, runs, chat and embeddings."""
+
+    def __init__(self, behaviour: FakeOpenAIBehaviour = None):
+        self.behaviour = behaviour or FakeOpenAIBehaviour()
+        self.beta = SimpleNamespace(assistants=FakeAssistants(self.behaviour), threads=FakeThreads(self.behaviour))
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(self.behaviour))
+        self.embeddings = FakeEmbeddings(self.behaviour)
+        self.models = FakeModels(self.behaviour)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,178 @@
+"""Load test the API in-process against fake OpenAI and Firestore backends.
+
+Each virtual student walks the full flow: start-session, initial-survey,
+submit, generate-survey, submit, learning-path. Run from the backend directory:
+
+    python -m bench.run_bench --sessions 200 --concurrency 50 --run-latency 2
+
+Use --json-out to save the report and compare it between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+FLOW = ["start-session", "initial-survey", "submit-initial", "generate-survey", "submit-follow-up", "learning-path"]
+
+STUDENTS = [
+    ("berkeley", "cs", "first_year"),
+    ("berkeley", "cs", "typical"),
+    ("hpi", "dh", "junior_transfer"),
+    ("hpi", "dh", "typical"),
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100, help="Total student sessions to run")
+    parser.add_argument("--concurrency", type=int, default=25, help="Sessions running at the same time")
+    parser.add_argument("--run-latency", type=float, default=2.0, help="Mean fake assistant run latency in seconds")
+    parser.add_argument("--run-latency-jitter", type=float, default=0.5, help="Standard deviation of the run latency")
+    parser.add_argument("--request-latency", type=float, default=0.05, help="Latency of every other fake OpenAI request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of fake runs that fail")
+    parser.add_argument("--duplicate-requests", type=int, default=1, help="Concurrent learning path requests per session")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of fake runs that reply with text that is not JSON")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of fake OpenAI requests answered with a 429")
+    parser.add_argument("--firestore-latency", type=float, default=0.01, help="Latency of every fake Firestore operation")
+    parser.add_argument("--free-text-rate", type=float, default=0.5, help="Fraction of students answering free-text questions")
+    parser.add_argument("--stream", action="store_true", help="Fetch the learning path from the SSE endpoint")
+    parser.add_argument("--mode", choices=["single", "fanout"], help="Learning path generation mode, the server default if omitted")
+    parser.add_argument("--navigation-delay", type=float, default=0.0, help="Seconds between a submit and the request of the next page")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for answers")
+    parser.add_argument("--json-out", help="Write the report as JSON to this path")
+    return parser.parse_args()
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def answer(question: dict, rng: random.Random, free_text: bool) -> str:
+    if question.get("freeText") or not question.get("options"):
+        return "I want to work on machine learning systems" if free_text else ""
+    return rng.choice(question["options"])
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {step: [] for step in FLOW}
+        self.errors = {step: 0 for step in FLOW}
+
+    async def call(self, step: str, request):
+        started_at = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            self.errors[step] += 1
+            raise
+        self.latencies[step].append(time.perf_counter() - started_at)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+            raise RuntimeError(f"{step} failed with {response.status_code}: {response.text[:200]}")
+        return response
+
+async def run_session(http, recorder: Recorder, index: int, args) -> None:
+    rng = random.Random(args.seed + index)
+    university_id, major_id, student_type = STUDENTS[index % len(STUDENTS)]
+    free_text = rng.random() < args.free_text_rate
+
+    response = await recorder.call("start-session", http.post("/api/start-session", json={
+        "university_id": university_id, "major_id": major_id, "student_type": student_type
+    }))
+    session_id = response.json()["session_id"]
+
+    response = await recorder.call("initial-survey", http.get(f"/api/surveys/{student_type}"))
+    responses = [{"question": q["question"], "answer": answer(q, rng, free_text)} for q in response.json()["questions"]]
+    await recorder.call("submit-initial", http.post("/api/submit-survey-response", params={"session_id": session_id}, json=responses))
+
+    await asyncio.sleep(args.navigation_delay)
+    response = await recorder.call("generate-survey", http.post("/api/generate-survey", params={"session_id": session_id}))
+    responses = [{"question": q["question"], "answer": answer(q, rng, True)} for q in response.json()["questions"]]
+    await recorder.call("submit-follow-up", http.post("/api/submit-survey-response", params={"session_id": session_id}, json=responses))
+
+    await asyncio.sleep(args.navigation_delay)
+    # Duplicate requests mimic re-renders and refreshes that fetch the same path at once
+    path = f"/api/learning-path/{session_id}/stream" if args.stream else f"/api/learning-path/{session_id}"
+    params = {"mode": args.mode} if args.mode else {}
+    await asyncio.gather(*[recorder.call("learning-path", http.get(path, params=params)) for _ in range(args.duplicate_requests)])
+
+def report(recorder: Recorder, elapsed: float, args) -> dict:
+    endpoints = {}
+    for step in FLOW:
+        latencies = recorder.latencies[step]
+        endpoints[step] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[step],
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99)
+        }
+    return {"settings": vars(args), "elapsed_seconds": elapsed, "endpoints": endpoints}
+
+def print_report(result: dict) -> None:
+    print(f"\nCompleted in {result['elapsed_seconds']:.2f}s\n")
+    print(f"{'endpoint':<18}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, stats in result["endpoints"].items():
+        print(
+            f"{step:<18}{stats['requests']:>9}{stats['errors']:>8}{stats['rps']:>9.1f}"
+            f"{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}"
+        )
+
+async def main():
+    args = parse_args()
+
+    # The fakes must be selected before any service module imports config
+    os.environ["CLIENT_BACKEND"] = "fake"
+    os.environ.setdefault("LEARNING_PATH_CACHE_BACKEND", "memory")
+    os.environ.setdefault("JOB_BACKEND", "memory")
+    os.environ.setdefault("OPENAI_GOVERNOR_BACKEND", "memory")
+
+    import httpx
+    import config
+    from bench.fake_openai import FakeOpenAIBehaviour
+    from main import app
+
+    config.clients.openai.behaviour.__dict__.update(vars(FakeOpenAIBehaviour(
+        run_latency=args.run_latency,
+        run_latency_jitter=args.run_latency_jitter,
+        failure_rate=args.failure_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        request_latency=args.request_latency
+    )))
+    config.clients.db.latency = args.firestore_latency
+
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failed = 0
+
+    async def guarded(index: int) -> None:
+        nonlocal failed
+        async with semaphore:
+            try:
+                await run_session(http, recorder, index, args)
+            except Exception:
+                failed += 1
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+            started_at = time.perf_counter()
+            await asyncio.gather(*[guarded(i) for i in range(args.sessions)])
+            elapsed = time.perf_counter() - started_at
+
+    result = report(recorder, elapsed, args)
+    result["failed_sessions"] = failed
+    print_report(result)
+    print(f"\nFailed sessions: {failed}/{args.sessions}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,9 @@
 import os
 from dotenv import load_dotenv
 import logging
-from firebase_admin import credentials, firestore, initialize_app
+import firebase_admin
+from firebase_admin import credentials, firestore_async, initialize_app
+import httpx
 import openai
 
 # Configure logging
@@ -11,10 +13,181 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize Firebase
-cred = credentials.Certificate("serviceAccountKey.json")
-initialize_app(cred)
-db = firestore.client()
+# "fake" swaps in the in-process stand-ins from bench/, which need no credentials
+CLIENT_BACKEND = os.getenv("CLIENT_BACKEND", "live")
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "serviceAccountKey.json")
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "50"))
 
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+class ClientProvider:
+    """Lazily builds the Firestore and OpenAI clients and owns their lifecycle.
+
+    Nothing connects at import time, the clients are created on first use (or
+    by warm_up from the application lifespan) and reused for every request.
+    """
+
+    def __init__(self, backend: str = CLIENT_BACKEND):
+        self.backend = backend
+        self._db = None
+        self._openai = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            if self.backend == "fake":
+                from bench.fake_firestore import FakeAsyncFirestore
+                self._db = FakeAsyncFirestore()
+            else:
+                if not firebase_admin._apps:
+                    initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS))
+                self._db = firestore_async.client()
+        return self._db
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            if self.backend == "fake":
+                from bench.fake_openai import FakeAsyncOpenAI
+                self._openai = FakeAsyncOpenAI()
+            else:
+                # One pooled HTTP client keeps connections to the API alive across requests
+                # Retries are left to the rate governor so 429s slow down every worker
+                self._openai = openai.AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=0,
+                    http_client=openai.DefaultAsyncHttpxClient(limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+                    ))
+                )
+        return self._openai
+
+    async def warm_up(self) -> None:
+        """Open the Firestore channel and an OpenAI connection before serving traffic."""
+        try:
+            await self.db.collection('assistants').document('_warm_up').get()
+        except Exception as e:
+            logger.warning(f"Firestore warm-up failed: {str(e)}")
+        try:
+            await self.openai.models.retrieve(CHAT_COMPLETIONS_MODEL)
+        except Exception as e:
+            logger.warning(f"OpenAI warm-up failed: {str(e)}")
+
+    async def close(self) -> None:
+        """Close the clients and their connection pools."""
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        if self._db is not None:
+            result = self._db.close()
+            if hasattr(result, "__await__"):
+                await result
+            self._db = None
+
+clients = ClientProvider()
+
+# Assistant run settings
+RUN_DEADLINE_SECONDS = float(os.getenv("ASSISTANT_RUN_DEADLINE_SECONDS", "120"))
+RUN_POLL_INITIAL_DELAY = float(os.getenv("ASSISTANT_RUN_POLL_INITIAL_DELAY", "0.25"))
+RUN_POLL_MAX_DELAY = float(os.getenv("ASSISTANT_RUN_POLL_MAX_DELAY", "4"))
+RUN_STREAMING_ENABLED = os.getenv("ASSISTANT_RUN_STREAMING", "true").lower() == "true"
+
+# Learning path cache settings
+LEARNING_PATH_CACHE_BACKEND = os.getenv("LEARNING_PATH_CACHE_BACKEND", "firestore")
+LEARNING_PATH_CACHE_SIZE = int(os.getenv("LEARNING_PATH_CACHE_SIZE", "512"))
+LEARNING_PATH_CACHE_TTL_SECONDS = float(os.getenv("LEARNING_PATH_CACHE_TTL_SECONDS", "86400"))
+LEARNING_PATH_CACHE_SQLITE_PATH = os.getenv("LEARNING_PATH_CACHE_SQLITE_PATH", "learning_path_cache.sqlite3")
+
+# Generation job queue settings
+JOB_BACKEND = os.getenv("JOB_BACKEND", "firestore")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("JOB_RETRY_AFTER_SECONDS", "10"))
+# A running job is taken over by another worker once its owner stops renewing the lease for this long
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+# Generation engine settings
+GENERATION_ENGINE = os.getenv("GENERATION_ENGINE", "assistants")
+# Comma separated per university/major overrides, e.g. "berkeley_cs=chat,hpi_dh=assistants"
+GENERATION_ENGINE_OVERRIDES = dict(
+    override.split("=", 1)
+    for override in os.getenv("GENERATION_ENGINE_OVERRIDES", "").split(",")
+    if "=" in override
+)
+CHAT_COMPLETIONS_MODEL = os.getenv("CHAT_COMPLETIONS_MODEL", "gpt-4o-mini")
+
+# Course index settings
+COURSE_INDEX_DIR = os.getenv("COURSE_INDEX_DIR", os.path.join(os.path.dirname(__file__), "data", "course_index"))
+COURSE_INDEX_TOP_K = int(os.getenv("COURSE_INDEX_TOP_K", "25"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+LEARNING_PATH_COURSE_COUNT = int(os.getenv("LEARNING_PATH_COURSE_COUNT", "12"))
+
+# Local search settings
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "1.5"))
+SEARCH_MIN_RESULTS = int(os.getenv("SEARCH_MIN_RESULTS", "3"))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "10"))
+
+# Metrics settings
+# Requests sending this header with value 1 get a Server-Timing header with per-stage durations
+TIMING_HEADER = os.getenv("TIMING_HEADER", "X-Debug-Timing")
+
+# OpenAI rate governor settings
+# "sqlite" shares the budget between every worker process on the host, "memory" keeps it per process
+OPENAI_GOVERNOR_BACKEND = os.getenv("OPENAI_GOVERNOR_BACKEND", "sqlite")
+OPENAI_GOVERNOR_SQLITE_PATH = os.getenv("OPENAI_GOVERNOR_SQLITE_PATH", "openai_governor.sqlite3")
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+OPENAI_MAX_CONCURRENT_RUNS = int(os.getenv("OPENAI_MAX_CONCURRENT_RUNS", "20"))
+# Tokens charged up front for a run or completion, whose real usage is only known afterwards
+OPENAI_RUN_TOKEN_ESTIMATE = int(os.getenv("OPENAI_RUN_TOKEN_ESTIMATE", "3000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+
+# Survey catalog settings
+# Surveys only change with a deploy, so browsers and CDNs may cache them and revalidate with the ETag
+SURVEY_CACHE_MAX_AGE = int(os.getenv("SURVEY_CACHE_MAX_AGE", "3600"))
+
+# Session thread settings
+# Past this many estimated tokens a session's thread is replaced by a fresh one seeded with a full prompt
+SESSION_THREAD_TOKEN_BUDGET = int(os.getenv("SESSION_THREAD_TOKEN_BUDGET", "16000"))
+
+# Learning path fan-out settings
+# "single" generates the whole path in one run, "fanout" generates one part per course cluster concurrently
+LEARNING_PATH_MODE = os.getenv("LEARNING_PATH_MODE", "single")
+LEARNING_PATH_FANOUT_PARTS = int(os.getenv("LEARNING_PATH_FANOUT_PARTS", "3"))
+# Part generations of one request running at once, each also holds a rate governor run slot
+LEARNING_PATH_FANOUT_CONCURRENCY = int(os.getenv("LEARNING_PATH_FANOUT_CONCURRENCY", "3"))
+
+# Speculative generation settings
+# Follow-up questions start generating once the initial survey is submitted, the learning path once the follow-up answers are
+SPECULATIVE_GENERATION_ENABLED = os.getenv("SPECULATIVE_GENERATION", "true").lower() == "true"
+
+# Session repository settings
+# "firestore" keeps sessions durable, "memory" keeps them in process memory for tests and local runs
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "firestore")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# In-memory copies are re-read after this long. The default 0 always reads through, which is safe with several
+# workers. Raise it only for a single worker or with sticky sessions, other workers' writes are missed until then
+SESSION_HOT_TTL_SECONDS = float(os.getenv("SESSION_HOT_TTL_SECONDS", "0"))
+# Queued session updates are committed on this interval, or sooner once this many sessions have some
+SESSION_FLUSH_INTERVAL_SECONDS = float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "1.0"))
+SESSION_FLUSH_BATCH_SIZE = int(os.getenv("SESSION_FLUSH_BATCH_SIZE", "200"))
+# Sessions not updated for this long are archived, or deleted, by the periodic compaction, 0 disables it
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "30"))
+SESSION_COMPACTION_INTERVAL_SECONDS = float(os.getenv("SESSION_COMPACTION_INTERVAL_SECONDS", "3600"))
+SESSION_COMPACTION_ACTIONS = ("archive", "delete")
+SESSION_COMPACTION_ACTION = os.getenv("SESSION_COMPACTION_ACTION", "archive")
+# Anything but an explicit "delete" must not remove sessions, so refuse to start with an unknown action
+if SESSION_COMPACTION_ACTION not in SESSION_COMPACTION_ACTIONS:
+    raise ValueError(f"SESSION_COMPACTION_ACTION must be one of {', '.join(SESSION_COMPACTION_ACTIONS)}, got {SESSION_COMPACTION_ACTION!r}")
+
+# Cohort settings
+COHORT_MAX_STUDENTS = int(os.getenv("COHORT_MAX_STUDENTS", "5000"))
+# Distinct answer profiles of a cohort generated at once
+COHORT_CONCURRENCY = int(os.getenv("COHORT_CONCURRENCY", "8"))
+
+# Catalog prewarm settings
+# Startup resolves the assistant and loads the course data of every registered major before reporting ready
+CATALOG_PREWARM = os.getenv("CATALOG_PREWARM", "true").lower() == "true"
+CATALOG_PREWARM_CONCURRENCY = int(os.getenv("CATALOG_PREWARM_CONCURRENCY", "4"))
+# Majors that failed to prewarm are retried on this interval, the instance is not ready until they succeed
+CATALOG_PREWARM_RETRY_SECONDS = float(os.getenv("CATALOG_PREWARM_RETRY_SECONDS", "30"))
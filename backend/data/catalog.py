@@ -0,0 +1,78 @@
+"""Registry of the universities and majors LINK advises on.
+
+This is the single source for the supported pairs: the backend validates
+sessions against it, startup prewarms an assistant and course data for every
+major, and frontend/src/data/universities.ts is generated from it with
+`python -m scripts.generate_frontend_catalog`.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+
+class Major(NamedTuple):
+    """A major, with the course catalog its retrieval index is built from."""
+    id: str
+    name: str
+    description: str
+    # Course catalog as JSON Lines, relative to the backend directory
+    catalog: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "name": self.name, "description": self.description}
+
+class University(NamedTuple):
+    id: str
+    name: str
+    location: str
+    majors: Tuple[Major, ...]
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "location": self.location,
+            "majors": [major.to_dict() for major in self.majors]
+        }
+
+UNIVERSITIES = (
+    University(
+        id="berkeley",
+        name="University of California, Berkeley",
+        location="Berkeley, CA",
+        majors=(
+            Major(
+                id="cs",
+                name="Computer Science",
+                description="Study of computers and computational systems",
+                catalog="catalogs/berkeley_cs.jsonl"
+            ),
+        )
+    ),
+    University(
+        id="hpi",
+        name="Hasso Plattner Institute",
+        location="Berlin, Germany",
+        majors=(
+            Major(
+                id="dh",
+                name="Digital Health",
+                description="Study of digital health and its impact on healthcare",
+                catalog="catalogs/hpi_dh.jsonl"
+            ),
+        )
+    ),
+)
+
+# Indexes over the registry, built once at import
+UNIVERSITIES_BY_ID = {university.id: university for university in UNIVERSITIES}
+MAJORS_BY_KEY = {(university.id, major.id): major for university in UNIVERSITIES for major in university.majors}
+# A major id shared by several universities takes the name of its first registration
+MAJOR_NAMES = {major.id: major.name for university in reversed(UNIVERSITIES) for major in university.majors}
+
+def get_major(university_id: str, major_id: str) -> Optional[Major]:
+    """Get a major of a university, or None if the pair is not in the registry."""
+    return MAJORS_BY_KEY.get((university_id, major_id))
+
+def iter_majors():
+    """Yield every (university, major) pair in the registry."""
+    for university in UNIVERSITIES:
+        for major in university.majors:
+            yield university, major
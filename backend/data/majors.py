@@ -0,0 +1,5 @@
+from data.catalog import MAJOR_NAMES
+
+def major_id_to_name(major_id: str) -> str:
+    """Get the display name of a major from the catalog registry."""
+    return MAJOR_NAMES.get(major_id, "Unknown")
@@ -1,13 +1,61 @@
-from fastapi import FastAPI, HTTPException, Body, Query
+from fastapi import FastAPI, HTTPException, Body, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 from typing import List
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import time
 from services.session_service import create_session, get_session
-from services.survey_service import get_initial_questions, submit_survey_responses
-from services.assistant_service import generate_questions, generate_learning_path_from_responses
-from firebase_admin import firestore
+from services.session_repository import session_repository
+from services.survey_service import get_initial_survey, submit_survey_responses
+from services.assistant_service import warm_assistant_registry
+from services.learning_path_service import get_learning_path_for_session, stream_learning_path_for_session, get_survey_responses, get_generation_mode
+from services.cache_service import learning_path_cache
+from config import clients, logger, TIMING_HEADER, SURVEY_CACHE_MAX_AGE, CATALOG_PREWARM
+from services.question_bank_service import get_follow_up_questions
+from services.speculation_service import schedule_speculation
+from services.cohort_service import get_cohort_format, parse_cohort, stream_cohort
+from services.catalog_service import prewarm_catalog, retry_failed_majors, get_prewarm_summary
+from services.job_service import job_queue
+from services.engine_service import get_engine_stats
+from services.rate_governor import rate_governor
+from services.metrics_service import render_metrics, start_request_timings, format_server_timing, HTTP_REQUEST_DURATION
 
-app = FastAPI()
+# Flipped once clients and registries are warm, so load balancers only route to ready instances
+readiness = {"ready": False}
+# Background tasks owned by the lifespan
+_background_tasks = []
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm clients and registries before serving traffic, then close them on shutdown."""
+    await clients.warm_up()
+    # Warm process-local registries so the first sessions skip Firestore lookups
+    await warm_assistant_registry()
+    if CATALOG_PREWARM:
+        # Every registered major gets its assistant and course data before the first student arrives
+        await prewarm_catalog()
+        _background_tasks.append(asyncio.create_task(retry_failed_majors()))
+    await session_repository.start()
+    await job_queue.start()
+    readiness["ready"] = True
+    logger.info("Application warm-up complete")
+    try:
+        yield
+    finally:
+        readiness["ready"] = False
+        for task in _background_tasks:
+            task.cancel()
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+        _background_tasks.clear()
+        await job_queue.stop()
+        # Commit queued session updates before the clients go away
+        await session_repository.stop()
+        await clients.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -16,8 +64,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record request latency and, when asked for, return per-stage timings."""
+    timings = start_request_timings()
+    started_at = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started_at
+    
+    endpoint = request.scope.get("endpoint")
+    HTTP_REQUEST_DURATION.observe(
+        elapsed,
+        method=request.method,
+        endpoint=endpoint.__name__ if endpoint else "unmatched",
+        status=response.status_code
+    )
+    if request.headers.get(TIMING_HEADER) == "1":
+        response.headers["Server-Timing"] = format_server_timing(timings + [("total", elapsed)])
+    return response
+
 class SurveyResponse(BaseModel):
     question: str
     answer: str
@@ -30,18 +98,11 @@ class SessionRequest(BaseModel):
     major_id: str
     student_type: str
 
-# this is hardcoded for now, but we should make it dynamic later
-def major_id_to_name(major_id: str) -> str:
-    return {
-        "cs": "Computer Science",
-        "dh": "Digital Health",
-    }.get(major_id, "Unknown")
-
 @app.post("/api/start-session")
 async def start_session(request: SessionRequest):
     """Start a new session and initialize the assistant."""
     try:
-        session_id = create_session(request.university_id, request.major_id, request.student_type)
+        session_id = await create_session(request.university_id, request.major_id, request.student_type)
         return {"session_id": session_id}
     except HTTPException as he:
         raise he
@@ -49,39 +110,52 @@ async def start_session(request: SessionRequest):
         logger.error(f"Error in start_session: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag, using the weak comparison RFC 9110 asks for."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def survey_response(request: Request, survey, cache_control: str) -> Response:
+    """Serve a precompiled survey, or 304 when the client already has this version."""
+    headers = {"ETag": survey.etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), survey.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=survey.body, media_type="application/json", headers=headers)
+
+@app.get("/api/surveys/{student_type}")
+async def get_survey(student_type: str, request: Request):
+    """Get the initial survey for a student type, cacheable by browsers and CDNs."""
+    return survey_response(request, get_initial_survey(student_type), f"public, max-age={SURVEY_CACHE_MAX_AGE}")
+
 @app.get("/api/initial-survey/{session_id}")
-async def get_initial_survey(session_id: str):
+async def get_initial_survey_for_session(session_id: str, request: Request):
     """Get initial survey questions based on session ID."""
     try:
         # Get session data
-        session = get_session(session_id)
+        session = await get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Get questions based on student type
-        questions = get_initial_questions(session["student_type"])
-        return {"questions": questions}
+        # The body depends on the session, so only the browser may cache it
+        return survey_response(request, get_initial_survey(session["student_type"]), "private, no-cache")
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Error in get_initial_survey: {str(e)}", exc_info=True)
+        logger.error(f"Error in get_initial_survey_for_session: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/generate-survey")
 async def generate_survey(session_id: str = Query(..., description="Session ID")):
     """Generate additional survey questions based on initial responses."""
     try:
-        session = get_session(session_id)
+        session = await get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Get all survey responses from the session
-        survey_responses = session.get("survey_responses", {}).get("responses", [])
-        if not survey_responses:
-            raise HTTPException(status_code=400, detail="No survey responses found")
-        
-        print(major_id_to_name(session["major_id"]))
-        questions = generate_questions(session["assistant_id"], survey_responses, session["student_type"], major_id_to_name(session["major_id"]))
+        questions = await get_follow_up_questions(session)
         return {"questions": questions}
     except HTTPException as he:
         raise he
@@ -96,7 +170,9 @@ async def submit_survey_response(
 ):
     """Submit survey responses for a session."""
     try:
-        submit_survey_responses(session_id, [r.dict() for r in responses])
+        await submit_survey_responses(session_id, [r.dict() for r in responses])
+        # The next request needs generation that can already start now
+        schedule_speculation(session_id)
         return {"status": "success"}
     except HTTPException as he:
         raise he
@@ -105,28 +181,17 @@ async def submit_survey_response(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/learning-path/{session_id}")
-async def get_learning_path(session_id: str, search: str = None):
-    """Generate a learning path based on survey responses and optional search query."""
+async def get_learning_path(session_id: str, search: str = None, mode: str = None):
+    """Generate a learning path based on survey responses and optional search query.
+
+    mode "fanout" generates the path in concurrent parts, "single" in one run.
+    """
     try:
-        session = get_session(session_id)
+        session = await get_session(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Get all survey responses from the session
-        survey_responses = session.get("survey_responses", {}).get("responses", [])
-        if not survey_responses:
-            raise HTTPException(status_code=400, detail="No survey responses found")
-        
-        # Generate learning path using the assistant
-        learning_path = generate_learning_path_from_responses(session["assistant_id"], survey_responses, search)
-        
-        # Update session with learning path
-        db = firestore.client()
-        doc_ref = db.collection('sessions').document(session_id)
-        doc_ref.update({
-            "learning_path": learning_path,
-            "status": "learning_path_generated"
-        })
+        learning_path = await get_learning_path_for_session(session_id, session, search, mode)
         
         return {"learning_path": learning_path}
     except HTTPException as he:
@@ -135,6 +200,122 @@ async def get_learning_path(session_id: str, search: str = None):
         logger.error(f"Error in generate_learning_path: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/jobs/generate-survey", status_code=202)
+async def enqueue_generate_survey(session_id: str = Query(..., description="Session ID")):
+    """Queue follow-up question generation and return the job ID."""
+    await get_session(session_id)
+    job = await job_queue.enqueue("generate_survey", session_id)
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.post("/api/jobs/learning-path", status_code=202)
+async def enqueue_learning_path(session_id: str = Query(..., description="Session ID"), search: str = None, mode: str = None):
+    """Queue learning path generation and return the job ID."""
+    await get_session(session_id)
+    job = await job_queue.enqueue("learning_path", session_id, {"search": search, "mode": get_generation_mode(mode)})
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.post("/api/cohorts")
+async def onboard_cohort(
+    file: UploadFile = File(..., description="Cohort as CSV or JSON Lines"),
+    format: str = Query(None, description="csv or jsonl, detected from the file name if omitted"),
+    mode: str = None
+):
+    """Create sessions for a cohort and stream their learning paths back as JSON Lines.
+
+    Students with identical answers share one generation. Lines are typed as
+    cohort, result, error, progress and a final done.
+    """
+    students, errors = parse_cohort(await file.read(), get_cohort_format(file.filename, file.content_type, format))
+    mode = get_generation_mode(mode)
+
+    async def cohort_lines():
+        try:
+            async for line in stream_cohort(students, errors, mode):
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        except HTTPException as he:
+            logger.error(f"Error in onboard_cohort: {he.detail}")
+            yield json.dumps({"type": "error", "detail": he.detail}) + "\n"
+        except Exception as e:
+            logger.error(f"Error in onboard_cohort: {str(e)}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(cohort_lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status and, once finished, the result of a generation job."""
+    return await job_queue.get(job_id)
+
+@app.get("/health/live")
+async def get_liveness():
+    """Report that the process is up."""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def get_readiness():
+    """Report whether warm-up has finished and the instance can take traffic.
+
+    Not ready while any registered major failed to prewarm, those are retried
+    in the background. Majors without a course index are listed but ready.
+    """
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail="Warming up")
+    majors = get_prewarm_summary()
+    if majors["failed"]:
+        raise HTTPException(status_code=503, detail=f"Majors failed to warm: {', '.join(majors['failed'])}")
+    return {"status": "ready", "majors": majors}
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get learning path cache hit/miss counters."""
+    return {"learning_path": learning_path_cache.get_stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Export latency histograms and counters in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/engines/stats")
+async def get_engines_stats():
+    """Get latency and token usage per generation engine."""
+    return get_engine_stats()
+
+@app.get("/api/rate-governor/stats")
+async def get_rate_governor_stats():
+    """Get the shared OpenAI request and token budgets and active run count."""
+    return await rate_governor.get_stats()
+
+def format_sse(event: str, data) -> str:
+    """Format a Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/api/learning-path/{session_id}/stream")
+async def stream_learning_path(session_id: str, search: str = None, mode: str = None):
+    """Stream learning path steps as Server-Sent Events while they are generated."""
+    session = await get_session(session_id)
+    get_survey_responses(session)
+    mode = get_generation_mode(mode)
+
+    async def event_stream():
+        total_steps = 0
+        try:
+            async for step in stream_learning_path_for_session(session_id, session, search, mode):
+                total_steps += 1
+                yield format_sse("step", step)
+            yield format_sse("done", {"total_steps": total_steps})
+        except HTTPException as he:
+            logger.error(f"Error in stream_learning_path: {he.detail}")
+            yield format_sse("error", {"detail": he.detail})
+        except Exception as e:
+            logger.error(f"Error in stream_learning_path: {str(e)}", exc_info=True)
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
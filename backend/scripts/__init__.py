@@ -0,0 +1,3 @@
+"""
+Command line jobs for the learning path generator application.
+"""
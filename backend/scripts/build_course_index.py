@@ -0,0 +1,24 @@
+"""Build the local course retrieval index for a university and major.
+
+Rerun whenever the catalog changes. Run from the backend directory:
+
+    python -m scripts.build_course_index --university berkeley --major cs --catalog catalogs/berkeley_cs.jsonl
+"""
+import argparse
+import asyncio
+from services.assistant_service import get_assistant_key
+from services.course_index_service import build_course_index
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--university", required=True, help="University ID")
+    parser.add_argument("--major", required=True, help="Major ID")
+    parser.add_argument("--catalog", required=True, help="Course catalog as JSON Lines, one course per line")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    await build_course_index(get_assistant_key(args.university, args.major), args.catalog)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+"""Pre-generate follow-up survey questions for common initial answer profiles.
+
+Run from the backend directory:
+
+    python -m scripts.build_question_bank --university berkeley --major cs
+"""
+import argparse
+import asyncio
+from config import logger
+from data.surveys import SURVEY_TYPES
+from services.question_bank_service import build_question_bank
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--university", required=True, help="University ID")
+    parser.add_argument("--major", required=True, help="Major ID")
+    parser.add_argument("--student-type", choices=list(SURVEY_TYPES), action="append",
+                        help="Student type to build (repeatable, defaults to all)")
+    parser.add_argument("--limit", type=int, default=None, help="Sample at most this many profiles per student type")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent assistant runs")
+    parser.add_argument("--overwrite", action="store_true", help="Regenerate profiles that are already banked")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    for student_type in args.student_type or list(SURVEY_TYPES):
+        generated = await build_question_bank(
+            args.university,
+            args.major,
+            student_type,
+            limit=args.limit,
+            concurrency=args.concurrency,
+            overwrite=args.overwrite
+        )
+        logger.info(f"Generated {generated} question sets for {student_type}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+"""Archive or delete sessions that have not been updated for a while.
+
+The API compacts sessions periodically, this runs a compaction on demand. Run
+from the backend directory:
+
+    python -m scripts.compact_sessions --ttl-days 30 --action archive
+"""
+import argparse
+import asyncio
+from config import logger, SESSION_TTL_DAYS, SESSION_COMPACTION_ACTION, SESSION_COMPACTION_ACTIONS
+from services.session_repository import session_repository
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ttl-days", type=float, default=SESSION_TTL_DAYS, help="Remove sessions not updated for this many days")
+    parser.add_argument("--action", choices=SESSION_COMPACTION_ACTIONS, default=SESSION_COMPACTION_ACTION,
+                        help="Copy stale sessions to the sessions_archive collection before deleting them, or only delete them")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    removed = await session_repository.compact(args.ttl_days, args.action)
+    logger.info(f"Compacted {removed} sessions")
+
+if __name__ == "__main__":
+    asyncio.run(main())
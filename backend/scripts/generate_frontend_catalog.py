@@ -0,0 +1,64 @@
+"""Generate the frontend's university list from the catalog registry.
+
+Rerun after changing data/catalog.py. Run from the backend directory:
+
+    python -m scripts.generate_frontend_catalog
+"""
+import argparse
+import json
+import os
+from data.catalog import UNIVERSITIES
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "src", "data", "universities.ts")
+
+HEADER = """// Generated from backend/data/catalog.py by `python -m scripts.generate_frontend_catalog`, do not edit.
+
+export interface University {
+  id: string;
+  name: string;
+  location: string;
+  majors: Major[];
+}
+
+export interface Major {
+  id: string;
+  name: string;
+  description: string;
+}
+"""
+
+def _fields(values: dict, indent: str) -> list:
+    return [f"{indent}{key}: {json.dumps(value, ensure_ascii=False)}," for key, value in values.items()]
+
+def render() -> str:
+    """Render universities.ts in the formatting of the frontend code."""
+    lines = ["export const universities: University[] = ["]
+    for university in UNIVERSITIES:
+        values = university.to_dict()
+        majors = values.pop("majors")
+        lines += ["  {", *_fields(values, "    "), "    majors: ["]
+        for major in majors:
+            lines += ["      {", *_fields(major, "        "), "      },"]
+        lines += ["    ],", "  },"]
+    lines.append("];")
+    return HEADER + "\n" + "\n".join(lines) + "\n"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Path of the generated universities.ts")
+    parser.add_argument("--check", action="store_true", help="Fail if the file is not up to date instead of writing it")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    content = render()
+    if args.check:
+        with open(args.output) as f:
+            if f.read() != content:
+                raise SystemExit(f"{args.output} is out of date, run python -m scripts.generate_frontend_catalog")
+        return
+    with open(args.output, "w") as f:
+        f.write(content)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Resolve the assistant and load the course data of every registered major.
+
+The API does this on startup. Run it ahead of a deploy, with --build-indexes
+to also build the course indexes that are missing from their catalog files.
+Run from the backend directory:
+
+    python -m scripts.prewarm_catalog --build-indexes
+"""
+import argparse
+import asyncio
+import json
+from config import CATALOG_PREWARM_CONCURRENCY
+from data.catalog import UNIVERSITIES_BY_ID
+from services.catalog_service import prewarm_catalog
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--university", choices=list(UNIVERSITIES_BY_ID), help="Only prewarm the majors of this university")
+    parser.add_argument("--build-indexes", action="store_true", help="Build missing course indexes from the registered catalogs")
+    parser.add_argument("--concurrency", type=int, default=CATALOG_PREWARM_CONCURRENCY, help="Majors prewarmed at the same time")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    results = await prewarm_catalog(args.university, args.build_indexes, args.concurrency)
+    print(json.dumps(results, indent=2))
+    # A missing index is reported, but only a failure needs attention before a deploy
+    if any(result["status"] == "failed" for result in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,31 +1,30 @@
-from config import client, db, logger
+from config import clients, logger, OPENAI_RUN_TOKEN_ESTIMATE
 from fastapi import HTTPException
-import json
+from google.cloud.firestore import async_transactional
 from datetime import datetime
-import time
+from services.run_service import run_assistant, stream_run_text
+from services.rate_governor import rate_governor, estimate_tokens
+from services.thread_service import session_thread
+from services.json_stream import JsonArrayStreamParser
+from services.response_parser import parse_questions, parse_learning_path, learning_path_step_validator, build_fix_json_prompt
+from services.single_flight import SingleFlight
+from services.course_index_service import format_course
+from services.metrics_service import timed
 
 def get_assistant_key(university_id: str, major_id: str) -> str:
     """Get the unique key for an assistant based on university and major."""
     return f"{university_id}_{major_id}"
 
-def get_or_create_assistant(university_id: str, major_id: str) -> str:
-    """Get an existing assistant or create a new one if it doesn't exist."""
-    assistant_key = get_assistant_key(university_id, major_id)
-    
-    # Check if assistant exists in Firestore
-    assistant_doc = db.collection('assistants').document(assistant_key).get()
-    
-    if assistant_doc.exists:
-        logger.info(f"Found existing assistant for {assistant_key}")
-        return assistant_doc.to_dict()['assistant_id']
-    
-    # If no existing assistant, create a new one
-    logger.info(f"Creating new assistant for {assistant_key}")
+def format_responses(responses: list) -> str:
+    """Format survey responses as a Q/A transcript for the assistant."""
+    return "\n".join([
+        f"Q: {response['question']}\nA: {response['answer']}"
+        for response in responses
+    ])
 
-    try:
-        assistant = client.beta.assistants.create(
-            name=f"Course Advisor - {university_id} - {major_id}",
-            instructions=f"""You are a course advisor for {university_id} specializing in {major_id}.
+def build_assistant_instructions(university_id: str, major_id: str) -> str:
+    """Build the course advisor instructions for a university and major."""
+    return f"""You are a course advisor for {university_id} specializing in {major_id}.
 
             Your role is to help students by:
             1. Generating relevant survey questions based on the course catalog
@@ -40,43 +39,29 @@ def get_or_create_assistant(university_id: str, major_id: str) -> str:
             5. Only recommend courses that are in the course catalog
             
             Always provide detailed explanations for your recommendations.
-            Return responses in valid JSON format.""",
-            model="gpt-4o-mini"
-        )
-        
-        # Store assistant info in Firestore so we don't have to create a new assistant every time
-        assistant_data = {
-            'assistant_id': assistant.id,
-            'university_id': university_id,
-            'major_id': major_id,
-            'created_at': datetime.utcnow().isoformat()
-        }
-        db.collection('assistants').document(assistant_key).set(assistant_data)
-        
-        return assistant.id
-    except Exception as e:
-        logger.error(f"Failed to create assistant: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to create assistant: {str(e)}")
+            Return responses in valid JSON format."""
 
-def generate_questions(assistant_id: str, responses: list, student_type: str, major_id: str) -> list:
-    """Generate survey questions using the assistant."""
-    try:
-        # Create a thread
-        thread = client.beta.threads.create()
+def format_course_context(courses: list = None) -> str:
+    """Format the retrieved catalog courses for a prompt, or nothing if there are none."""
+    if not courses:
+        return ""
+    context = "Relevant courses from the course catalog:\n" + "\n".join(format_course(course) for course in courses)
+    if any('match_percentage' in course for course in courses):
+        context += "\n\nThe match percentages above are already computed, prefer the best matching courses and copy their match percentage unchanged."
+    return context
 
-        # Format responses for the assistant
-        formatted_responses = "\n".join([
-            f"Q: {response['question']}\nA: {response['answer']}"
-            for response in responses
-        ])
+def get_run_options(courses: list = None) -> dict:
+    """Skip the assistant's own catalog retrieval when the prompt already carries the courses."""
+    return {"tools": []} if courses else {}
 
-        print(formatted_responses)
-        
-        # Add message to thread
-        message = client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=f"""
+# Bump whenever the follow-up questions prompt changes so banked questions are regenerated
+QUESTIONS_PROMPT_VERSION = "1"
+
+def build_questions_prompt(responses: list, student_type: str, major_id: str, courses: list = None) -> str:
+    """Build the follow-up questionnaire prompt for the given initial responses."""
+    formatted_responses = format_responses(responses)
+
+    return f"""
             Student responses:
             {formatted_responses}
 
@@ -87,6 +72,8 @@ def generate_questions(assistant_id: str, responses: list, student_type: str, ma
 
             Based on this information and the student's initial survey responses, create a dynamic follow-up questionnaire that will help match them with the most suitable courses.
 
+            {format_course_context(courses)}
+
             Include questions specific only to the courses in the course catalog.
 
             The questionnaire should:
@@ -107,87 +94,159 @@ def generate_questions(assistant_id: str, responses: list, student_type: str, ma
                 ]
             }}
         """
-        )
-        
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=assistant_id
-        )
-        
-        # Wait for the run to complete
-        while True:
-            run_status = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
+
+# Process-local registry of assistant ids, keyed by assistant key
+_assistant_registry = {}
+_assistant_creation = SingleFlight()
+
+async def warm_assistant_registry() -> None:
+    """Load every known assistant id into the process-local registry."""
+    try:
+        async for doc in clients.db.collection('assistants').stream():
+            _assistant_registry[doc.id] = doc.to_dict()['assistant_id']
+        logger.info(f"Loaded {len(_assistant_registry)} assistants into the registry")
+    except Exception as e:
+        logger.error(f"Failed to warm assistant registry: {str(e)}", exc_info=True)
+
+async def get_or_create_assistant(university_id: str, major_id: str) -> str:
+    """Get an existing assistant or create a new one if it doesn't exist."""
+    assistant_key = get_assistant_key(university_id, major_id)
+    if assistant_key in _assistant_registry:
+        return _assistant_registry[assistant_key]
+
+    # Concurrent callers for the same key share a single lookup/creation
+    return await _assistant_creation.do(assistant_key, _resolve_assistant, university_id, major_id)
+
+@async_transactional
+async def _claim_assistant(transaction, doc_ref, assistant_data: dict) -> str:
+    """Store the assistant unless another worker already did, returning the winning id."""
+    snapshot = await doc_ref.get(transaction=transaction)
+    if snapshot.exists:
+        return snapshot.to_dict()['assistant_id']
+    transaction.set(doc_ref, assistant_data)
+    return assistant_data['assistant_id']
+
+async def _resolve_assistant(university_id: str, major_id: str) -> str:
+    assistant_key = get_assistant_key(university_id, major_id)
+    doc_ref = clients.db.collection('assistants').document(assistant_key)
+    
+    # Refresh the registry from Firestore on a miss
+    with timed("firestore.get_assistant"):
+        assistant_doc = await doc_ref.get()
+    
+    if assistant_doc.exists:
+        logger.info(f"Found existing assistant for {assistant_key}")
+        _assistant_registry[assistant_key] = assistant_doc.to_dict()['assistant_id']
+        return _assistant_registry[assistant_key]
+    
+    # If no existing assistant, create a new one
+    logger.info(f"Creating new assistant for {assistant_key}")
+
+    try:
+        with timed("openai.assistant_create"):
+            assistant = await rate_governor.call(
+                clients.openai.beta.assistants.create,
+                idempotent=False,
+                name=f"Course Advisor - {university_id} - {major_id}",
+                instructions=build_assistant_instructions(university_id, major_id),
+                model="gpt-4o-mini"
             )
-            if run_status.status == 'completed':
-                break
-            elif run_status.status == 'failed':
-                logger.error(f"Run failed: {run_status.last_error}")
-                raise HTTPException(status_code=500, detail="Failed to generate questions")
         
-        # Get the messages
-        messages = client.beta.threads.messages.list(
-            thread_id=thread.id
-        )
+        # Store assistant info in Firestore so we don't have to create a new assistant every time
+        assistant_data = {
+            'assistant_id': assistant.id,
+            'university_id': university_id,
+            'major_id': major_id,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        assistant_id = await _claim_assistant(clients.db.transaction(), doc_ref, assistant_data)
         
-        # Parse the JSON response from the last message
-        try:
-            response_text = messages.data[0].content[0].text.value
-            logger.info(f"Raw response from assistant: {response_text}")
-            
-            # Try to find JSON in the response text
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            if json_start == -1 or json_end == 0:
-                raise ValueError("No JSON object found in response")
-            
-            json_str = response_text[json_start:json_end]
-            response_json = json.loads(json_str)
-            
-            # Validate the response structure
-            if 'questions' not in response_json:
-                raise ValueError("Response missing 'questions' field")
-            
-            for question in response_json['questions']:
-                if not all(key in question for key in ['id', 'question', 'options', 'freeText']):
-                    raise ValueError("Question missing required fields")
-            
-            return response_json['questions']
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse assistant response as JSON: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to parse assistant response as JSON"
-            )
-        except ValueError as e:
-            logger.error(f"Invalid response format: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Invalid response format: {str(e)}"
-            )
+        # Another worker won the race, so drop the duplicate we just created
+        if assistant_id != assistant.id:
+            logger.info(f"Assistant for {assistant_key} was created concurrently, deleting duplicate {assistant.id}")
+            try:
+                await rate_governor.call(clients.openai.beta.assistants.delete, assistant.id)
+            except Exception as e:
+                logger.warning(f"Failed to delete duplicate assistant {assistant.id}: {str(e)}")
+        
+        _assistant_registry[assistant_key] = assistant_id
+        return assistant_id
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        logger.error(f"Error in generate_questions: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error(f"Failed to create assistant: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to create assistant: {str(e)}")
 
-def generate_learning_path_from_responses(assistant_id: str, responses: list, search_query: str = None) -> list:
-    """Generate a learning path based on survey responses and optional search query."""
-    try:
-        # Format responses for the assistant
-        formatted_responses = "\n".join([
-            f"Q: {response['question']}\nA: {response['answer']}"
-            for response in responses
-        ])
+async def _latest_reply(thread_id: str) -> str:
+    """Get the text of the assistant's latest message on a thread."""
+    with timed("openai.message_list"):
+        messages = await rate_governor.call(
+            clients.openai.beta.threads.messages.list,
+            thread_id=thread_id
+        )
+    assistant_messages = [msg for msg in messages.data if msg.role == "assistant"]
+    if not assistant_messages:
+        raise Exception("No response from assistant")
+    return assistant_messages[0].content[0].text.value
 
-        # Create the prompt for the assistant
-        prompt = f"""Based on the following survey responses, create a personalized learning path with specific steps, resources, and time estimates:
+async def _fix_json(thread_id: str, assistant_id: str, kind: str, parse) -> list:
+    """Ask the assistant to restate its unparseable reply as JSON, on the same thread."""
+    logger.warning(f"Nothing salvageable in the {kind} response on thread {thread_id}, asking for a JSON fix")
+    prompt = build_fix_json_prompt(kind)
+    with timed("openai.message_create"):
+        await rate_governor.call(
+            clients.openai.beta.threads.messages.create,
+            tokens=estimate_tokens(prompt),
+            idempotent=False,
+            thread_id=thread_id,
+            role="user",
+            content=prompt
+        )
+    # The fix only needs the broken reply and the request, not the catalog or the original prompt
+    await run_assistant(thread_id, assistant_id, tools=[], truncation_strategy={"type": "last_messages", "last_messages": 2})
+    with timed(f"parse.{kind}"):
+        items = parse(await _latest_reply(thread_id), kind=f"{kind}_fix")
+    if not items:
+        raise HTTPException(status_code=500, detail=f"Failed to parse the generated {kind.replace('_', ' ')}")
+    return items
 
-            {formatted_responses}
+async def _parse_reply(thread_id: str, assistant_id: str, kind: str, parse) -> list:
+    """Parse the assistant's latest reply, falling back to a JSON fix when nothing is salvageable."""
+    response_text = await _latest_reply(thread_id)
+    logger.info(f"Raw response from assistant: {response_text}")
+    with timed(f"parse.{kind}"):
+        items = parse(response_text)
+    if items:
+        return items
+    return await _fix_json(thread_id, assistant_id, kind, parse)
 
-            {f"Additionally, focus on courses and topics related to: {search_query}" if search_query else ""}
+async def generate_questions(assistant_id: str, responses: list, student_type: str, major_id: str, courses: list = None, session: dict = None) -> list:
+    """Generate survey questions using the assistant, on the session's thread if one is given."""
+    try:
+        prompt = build_questions_prompt(responses, student_type, major_id, courses)
+        async with session_thread(
+            session,
+            "questions",
+            prompt,
+            lambda state: build_thread_update(state, "questions", responses, None, courses),
+            responses,
+            courses
+        ) as thread:
+            # Run the assistant and wait for the run to complete
+            run = await run_assistant(thread.thread_id, assistant_id, **get_run_options(courses))
+            thread.add_tokens(_reply_tokens(run))
+
+            return await _parse_reply(thread.thread_id, assistant_id, "questions", parse_questions)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error in generate_questions: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bump whenever the learning path prompt changes so cached paths are regenerated
+LEARNING_PATH_PROMPT_VERSION = "4"
 
-            Please provide a structured learning path with the following format for each step:
+LEARNING_PATH_INSTRUCTIONS = """Please provide a structured learning path with the following format for each step:
             - title: A clear, concise title for the step
             - description: A detailed explanation of what to do and why
             - estimated_time: How long this step should take
@@ -202,73 +261,119 @@ def generate_learning_path_from_responses(assistant_id: str, responses: list, se
 
             Format the response as a JSON array of objects with these fields."""
 
-        # Create a thread if it doesn't exist
-        thread = client.beta.threads.create()
+def build_learning_path_prompt(responses: list, search_query: str = None, courses: list = None, part: str = None) -> str:
+    """Build the learning path prompt for the given survey responses and search query.
 
-        # Add the message to the thread
-        message = client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=prompt
-        )
+    part, if given, restricts the prompt to one part of a fanned out learning path.
+    """
+    formatted_responses = format_responses(responses)
 
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=assistant_id
-        )
+    return f"""Based on the following survey responses, create a personalized learning path with specific steps, resources, and time estimates:
 
-        # Wait for the run to complete
-        while True:
-            run_status = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-            if run_status.status == 'completed':
-                break
-            elif run_status.status in ['failed', 'cancelled', 'expired']:
-                raise Exception(f"Run failed with status: {run_status.status}")
-            time.sleep(1)
-
-        # Get the messages
-        messages = client.beta.threads.messages.list(
-            thread_id=thread.id
-        )
+            {formatted_responses}
 
-        # Get the latest assistant message
-        assistant_messages = [msg for msg in messages.data if msg.role == "assistant"]
-        if not assistant_messages:
-            raise Exception("No response from assistant")
-        
-        latest_message = assistant_messages[0]
-        content = latest_message.content[0].text.value
-
-        # Parse the response to get the learning path
-        try:
-            # Find JSON array in the response
-            start_idx = content.find('[')
-            end_idx = content.rfind(']') + 1
-            if start_idx == -1 or end_idx == 0:
-                raise ValueError("No JSON array found in response")
-            
-            json_str = content[start_idx:end_idx]
-            learning_path = json.loads(json_str)
-            
-            # Validate the structure
-            for step in learning_path:
-                if not all(key in step for key in ['title', 'description']):
-                    raise ValueError("Invalid learning path structure")
-                if 'resources' in step and not isinstance(step['resources'], list):
-                    step['resources'] = [step['resources']]
-            
-            return learning_path
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse learning path JSON: {str(e)}")
-            raise HTTPException(status_code=500, detail="Failed to parse learning path")
-        except ValueError as e:
-            logger.error(f"Invalid learning path structure: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+            {f"Additionally, focus on courses and topics related to: {search_query}" if search_query else ""}
+
+            {format_course_context(courses)}
+
+            {part or ""}
 
+            {LEARNING_PATH_INSTRUCTIONS}"""
+
+def format_course_update(courses: list, sent_courses: list) -> str:
+    """Format the retrieved courses for a thread that already describes some of them."""
+    if not courses:
+        return ""
+    sent = set(sent_courses)
+    new_courses = [course for course in courses if course.get('code') not in sent]
+    known_courses = [course for course in courses if course.get('code') in sent]
+    parts = []
+    if new_courses:
+        parts.append("Additional relevant courses from the course catalog:\n" + "\n".join(format_course(course) for course in new_courses))
+    if known_courses:
+        # Already described earlier in the thread, only the current match is new
+        parts.append("Relevant courses described earlier:\n" + "\n".join(
+            f"- {course.get('code', '')} {course.get('title', '')}".rstrip()
+            + (f" [match: {course['match_percentage']}%]" if 'match_percentage' in course else "")
+            for course in known_courses
+        ))
+    if any('match_percentage' in course for course in courses):
+        parts.append("The match percentages above are already computed, prefer the best matching courses and copy their match percentage unchanged.")
+    return "\n\n".join(parts)
+
+def build_thread_update(state: dict, task: str, responses: list, search_query: str = None, courses: list = None):
+    """Build the message that brings a session thread up to date for a task.
+
+    Returns None when the thread cannot be continued, e.g. the questionnaire
+    task was never set up on it or the recorded answers no longer line up.
+    """
+    sent_responses = state.get("sent_responses", 0)
+    if (task != "learning_path" and task not in state.get("tasks", [])) or len(responses) < sent_responses:
+        return None
+
+    parts = []
+    if responses[sent_responses:]:
+        parts.append("The student has since answered:\n" + format_responses(responses[sent_responses:]))
+    if search_query:
+        parts.append(f"Focus on courses and topics related to: {search_query}")
+    elif task in state.get("tasks", []):
+        parts.append("Do not apply any earlier topic focus.")
+    parts.append(format_course_update(courses, state.get("sent_courses", [])))
+    if task not in state.get("tasks", []):
+        parts.append(LEARNING_PATH_INSTRUCTIONS)
+    elif task == "learning_path":
+        parts.append("Create the learning path again for everything the student has told you, as a complete JSON array in the same format as before.")
+    else:
+        parts.append("Create a new follow-up questionnaire for everything the student has told you, in the same JSON format as before.")
+    return "\n\n".join(part for part in parts if part)
+
+def _reply_tokens(run) -> int:
+    """Tokens a completed run added to its thread."""
+    return run.usage.completion_tokens if getattr(run, "usage", None) else OPENAI_RUN_TOKEN_ESTIMATE
+
+def _learning_path_thread(session: dict, responses: list, search_query: str = None, courses: list = None, part: str = None):
+    # Parts of a fanned out path run side by side, so none of them can use the session thread
+    return session_thread(
+        None if part else session,
+        "learning_path",
+        build_learning_path_prompt(responses, search_query, courses, part),
+        lambda state: build_thread_update(state, "learning_path", responses, search_query, courses),
+        responses,
+        courses
+    )
+
+async def generate_learning_path_from_responses(assistant_id: str, responses: list, search_query: str = None, courses: list = None, session: dict = None, part: str = None) -> list:
+    """Generate a learning path, or one part of it, based on survey responses and optional search query."""
+    try:
+        async with _learning_path_thread(session, responses, search_query, courses, part) as thread:
+            # Run the assistant and wait for the run to complete
+            run = await run_assistant(thread.thread_id, assistant_id, **get_run_options(courses))
+            thread.add_tokens(_reply_tokens(run))
+
+            return await _parse_reply(thread.thread_id, assistant_id, "learning_path", parse_learning_path)
+
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Error generating learning path: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def stream_learning_path_from_responses(assistant_id: str, responses: list, search_query: str = None, courses: list = None, session: dict = None):
+    """Stream learning path steps as the assistant generates them."""
+    async with _learning_path_thread(session, responses, search_query, courses) as thread:
+        parser = JsonArrayStreamParser()
+        validator = learning_path_step_validator()
+        yielded = 0
+
+        async for text in stream_run_text(thread.thread_id, assistant_id, **get_run_options(courses)):
+            thread.add_tokens(estimate_tokens(text))
+            for step in parser.feed(text):
+                step = validator.validate(step)
+                if step is not None:
+                    yielded += 1
+                    yield step
+
+        validator.report.record()
+        if not yielded:
+            for step in await _fix_json(thread.thread_id, assistant_id, "learning_path", parse_learning_path):
+                yield step
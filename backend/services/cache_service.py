@@ -0,0 +1,171 @@
+from config import (
+    clients,
+    logger,
+    LEARNING_PATH_CACHE_BACKEND,
+    LEARNING_PATH_CACHE_SIZE,
+    LEARNING_PATH_CACHE_TTL_SECONDS,
+    LEARNING_PATH_CACHE_SQLITE_PATH,
+)
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+def normalize_responses(responses: list) -> list:
+    """Normalize survey responses so equivalent answer sets compare equal."""
+    normalized = [
+        [" ".join(str(response['question']).split()), " ".join(str(response['answer']).split())]
+        for response in responses
+    ]
+    return sorted(normalized)
+
+def learning_path_cache_key(assistant_id: str, responses: list, search_query: str = None, prompt_version: str = "") -> str:
+    """Build a stable content hash for a learning path request."""
+    payload = json.dumps({
+        "assistant_id": assistant_id,
+        "responses": normalize_responses(responses),
+        "search": " ".join((search_query or "").lower().split()),
+        "prompt_version": prompt_version
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class FirestoreCacheStore:
+    """Persistent cache tier backed by a Firestore collection."""
+
+    def __init__(self, collection: str = "learning_path_cache"):
+        self.collection = collection
+
+    async def get(self, key: str):
+        doc = await clients.db.collection(self.collection).document(key).get()
+        if not doc.exists:
+            return None
+        entry = doc.to_dict()
+        if entry.get("expires_at", 0) < time.time():
+            return None
+        return entry["value"]
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        await clients.db.collection(self.collection).document(key).set({
+            "value": value,
+            "expires_at": time.time() + ttl
+        })
+
+    async def delete(self, key: str) -> None:
+        await clients.db.collection(self.collection).document(key).delete()
+
+class SQLiteCacheStore:
+    """Persistent cache tier backed by a local SQLite file, used for tests and local runs."""
+
+    def __init__(self, path: str = LEARNING_PATH_CACHE_SQLITE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def _get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def _set(self, key: str, value, ttl: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl)
+            )
+
+    def _delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+class TwoTierCache:
+    """Bounded in-process LRU with TTL in front of an optional persistent store."""
+
+    def __init__(self, store=None, max_size: int = LEARNING_PATH_CACHE_SIZE, ttl: float = LEARNING_PATH_CACHE_TTL_SECONDS):
+        self.store = store
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "evictions": 0}
+
+    def _remember(self, key: str, value) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            del self.entries[key]
+
+        if self.store is not None:
+            try:
+                value = await self.store.get(key)
+            except Exception as e:
+                logger.warning(f"Persistent cache read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                self.stats["persistent_hits"] += 1
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value) -> None:
+        self._remember(key, value)
+        if self.store is not None:
+            try:
+                await self.store.set(key, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"Persistent cache write failed: {str(e)}")
+
+    async def delete(self, key: str) -> None:
+        self.entries.pop(key, None)
+        if self.store is not None:
+            try:
+                await self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"Persistent cache delete failed: {str(e)}")
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["persistent_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+def _create_store():
+    if LEARNING_PATH_CACHE_BACKEND == "firestore":
+        return FirestoreCacheStore()
+    if LEARNING_PATH_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheStore()
+    return None
+
+learning_path_cache = TwoTierCache(_create_store())
@@ -0,0 +1,95 @@
+"""Prewarming of the universities and majors in the catalog registry.
+
+For every registered major the assistant is resolved, or created, and the
+course index with its scoring matrix and search tokens is loaded, so the first
+student of a major does not pay for assistant creation or a cold catalog.
+
+A major ends up "warm", "no_index" when its assistant is ready but no course
+index was built, or "failed". Failed majors are retried in the background and
+keep the instance from reporting ready.
+"""
+from config import logger, CATALOG_PREWARM_CONCURRENCY, CATALOG_PREWARM_RETRY_SECONDS
+from fastapi import HTTPException
+from data.catalog import get_major, iter_majors
+from services.assistant_service import get_assistant_key, get_or_create_assistant
+from services.course_index_service import get_course_index, build_course_index
+from services.scoring_service import get_course_matrix
+from services.search_service import warm_catalog
+import asyncio
+import os
+
+PREWARM_STATES = ("warm", "no_index", "failed")
+
+# The result of the latest prewarm per assistant key, reported by the readiness check
+prewarm_report = {}
+
+def validate_major(university_id: str, major_id: str):
+    """Raise a 400 unless the university and major are in the registry."""
+    major = get_major(university_id, major_id)
+    if major is None:
+        raise HTTPException(status_code=400, detail=f"Unknown university or major: {university_id}/{major_id}")
+    return major
+
+async def prewarm_major(university_id: str, major, build_indexes: bool = False) -> dict:
+    """Resolve the assistant and load the course data of one major."""
+    assistant_key = get_assistant_key(university_id, major.id)
+    result = {"university_id": university_id, "major_id": major.id}
+    try:
+        result["assistant_id"] = await get_or_create_assistant(university_id, major.id)
+
+        index = get_course_index(assistant_key)
+        if index is None and build_indexes and major.catalog and os.path.exists(major.catalog):
+            await build_course_index(assistant_key, major.catalog)
+            index = get_course_index(assistant_key)
+        if index is None:
+            # Generation still works without an index, prompts just carry no catalog courses
+            logger.warning(f"No course index for {assistant_key}, build it from {major.catalog or 'its catalog'}")
+            result["courses"] = 0
+            result["status"] = "no_index"
+        else:
+            get_course_matrix(assistant_key, index)
+            result["courses"] = warm_catalog(assistant_key, index)
+            result["status"] = "warm"
+    except Exception as e:
+        logger.error(f"Failed to prewarm {assistant_key}: {str(e)}", exc_info=True)
+        result["status"] = "failed"
+        result["error"] = e.detail if isinstance(e, HTTPException) else str(e)
+    prewarm_report[assistant_key] = result
+    return result
+
+async def prewarm_catalog(university_id: str = None, build_indexes: bool = False,
+                          concurrency: int = CATALOG_PREWARM_CONCURRENCY) -> list:
+    """Prewarm every registered major, or those of one university."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def prewarm(university, major) -> dict:
+        async with semaphore:
+            return await prewarm_major(university.id, major, build_indexes)
+
+    results = await asyncio.gather(*[
+        prewarm(university, major)
+        for university, major in iter_majors()
+        if university_id is None or university.id == university_id
+    ])
+    warm = sum(result["status"] == "warm" for result in results)
+    logger.info(f"Prewarmed {warm} of {len(results)} majors")
+    return results
+
+def get_prewarm_summary() -> dict:
+    """Get the assistant keys of the prewarmed majors by state."""
+    summary = {state: [] for state in PREWARM_STATES}
+    for assistant_key, result in sorted(prewarm_report.items()):
+        summary[result["status"]].append(assistant_key)
+    return summary
+
+async def retry_failed_majors(interval: float = CATALOG_PREWARM_RETRY_SECONDS) -> None:
+    """Prewarm the majors that failed again on an interval until none are left."""
+    while True:
+        failed = [result for result in prewarm_report.values() if result["status"] == "failed"]
+        if not failed:
+            return
+        await asyncio.sleep(interval)
+        for result in failed:
+            major = get_major(result["university_id"], result["major_id"])
+            if major is not None:
+                await prewarm_major(result["university_id"], major)
@@ -0,0 +1,218 @@
+"""Bulk onboarding of a cohort of students from a CSV or JSON Lines file.
+
+Every student becomes a session with their answers already submitted. The
+sessions are created in batched writes and grouped by learning path cache key,
+so students with identical answer profiles share one generation. A bounded
+pool of workers generates the distinct profiles, and the results are streamed
+back as they finish, one line per student, with a progress line per profile.
+"""
+from config import logger, COHORT_MAX_STUDENTS, COHORT_CONCURRENCY
+from fastapi import HTTPException
+from datetime import datetime
+from data.surveys import SURVEY_TYPES
+from data.catalog import get_major
+from services.assistant_service import get_or_create_assistant
+from services.session_service import build_session_data
+from services.survey_service import derive_session_status
+from services.session_repository import session_repository
+from services.learning_path_service import get_cache_key, get_learning_path_for_session, save_learning_path
+import asyncio
+import csv
+import io
+import json
+import uuid
+
+# CSV columns that describe the student, every other column is a survey question
+STUDENT_FIELDS = ("student_id", "university_id", "major_id", "student_type")
+
+COHORT_FORMATS = ("csv", "jsonl")
+
+def get_cohort_format(filename: str = None, content_type: str = None, file_format: str = None) -> str:
+    """Get the format of a cohort file, from the explicit format or else the file name and type."""
+    if file_format:
+        if file_format not in COHORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown cohort format: {file_format}")
+        return file_format
+    filename = (filename or "").lower()
+    if filename.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if filename.endswith((".jsonl", ".ndjson")) or content_type in ("application/jsonl", "application/x-ndjson"):
+        return "jsonl"
+    raise HTTPException(status_code=400, detail="Could not tell the cohort format, pass format=csv or format=jsonl")
+
+def _read_rows(text: str, file_format: str) -> list:
+    """Read the rows of a cohort file as (row number, record or error message) pairs."""
+    if file_format == "csv":
+        # Row 1 is the header
+        return [(position, row) for position, row in enumerate(csv.DictReader(io.StringIO(text)), start=2)]
+    rows = []
+    for position, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append((position, json.loads(line)))
+        except json.JSONDecodeError as e:
+            rows.append((position, f"Invalid JSON: {e.msg}"))
+    return rows
+
+def _record_responses(record: dict, file_format: str) -> list:
+    if file_format == "csv":
+        return [
+            {"question": question, "answer": answer.strip()}
+            for question, answer in record.items()
+            if question and question not in STUDENT_FIELDS and isinstance(answer, str) and answer.strip()
+        ]
+    # JSON Lines records carry a list of responses, or a mapping of question to answer
+    responses = record.get("responses")
+    if responses is None and isinstance(record.get("answers"), dict):
+        responses = [{"question": question, "answer": answer} for question, answer in record["answers"].items()]
+    if not isinstance(responses, list) or not all(isinstance(response, dict) for response in responses):
+        return []
+    return [
+        {"question": str(response.get("question", "")), "answer": str(response.get("answer", ""))}
+        for response in responses
+        if str(response.get("question", "")).strip()
+    ]
+
+def parse_cohort(content: bytes, file_format: str) -> tuple:
+    """Parse a cohort file into valid students and errors for the rows that are not."""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Cohort file must be UTF-8 encoded")
+    rows = _read_rows(text, file_format)
+    if len(rows) > COHORT_MAX_STUDENTS:
+        raise HTTPException(status_code=413, detail=f"Cohort has {len(rows)} students, at most {COHORT_MAX_STUDENTS} are accepted")
+
+    students = []
+    errors = []
+    for row, record in rows:
+        if not isinstance(record, dict):
+            errors.append({"row": row, "detail": record if isinstance(record, str) else "Expected an object per line"})
+            continue
+        student = {field: str(record.get(field) or "").strip() for field in STUDENT_FIELDS}
+        student["row"] = row
+        student["responses"] = _record_responses(record, file_format)
+        missing = [field for field in ("university_id", "major_id", "student_type") if not student[field]]
+        if missing:
+            detail = f"Missing {', '.join(missing)}"
+        elif get_major(student["university_id"], student["major_id"]) is None:
+            detail = f"Unknown university or major: {student['university_id']}/{student['major_id']}"
+        elif student["student_type"] not in SURVEY_TYPES:
+            detail = f"Invalid student type: {student['student_type']}"
+        elif not student["responses"]:
+            detail = "No survey responses"
+        else:
+            students.append(student)
+            continue
+        errors.append({"row": row, "student_id": student["student_id"], "detail": detail})
+    return students, errors
+
+def _student_line(student: dict, **fields) -> dict:
+    return {"row": student["row"], "student_id": student["student_id"], **fields}
+
+async def create_cohort_sessions(cohort_id: str, students: list) -> tuple:
+    """Create a session per student in batched writes, returning the sessions and the errors."""
+    pairs = sorted({(student["university_id"], student["major_id"]) for student in students})
+    assistant_ids = await asyncio.gather(*[get_or_create_assistant(*pair) for pair in pairs], return_exceptions=True)
+    assistants = dict(zip(pairs, assistant_ids))
+
+    submitted_at = datetime.utcnow().isoformat()
+    created = []
+    errors = []
+    for student in students:
+        assistant_id = assistants[(student["university_id"], student["major_id"])]
+        if isinstance(assistant_id, Exception):
+            detail = assistant_id.detail if isinstance(assistant_id, HTTPException) else str(assistant_id)
+            errors.append(_student_line(student, detail=f"Could not set up the assistant: {detail}"))
+            continue
+        data = build_session_data(student["university_id"], student["major_id"], student["student_type"], assistant_id)
+        # The same shape submit_survey_responses appends
+        data["survey_responses"] = {
+            "responses": [
+                {**response, "submitted_at": submitted_at, "position": position}
+                for position, response in enumerate(student["responses"])
+            ],
+            "total_questions_answered": len(student["responses"]),
+            "submitted_at": submitted_at
+        }
+        data["cohort_id"] = cohort_id
+        created.append((student, data))
+
+    session_ids = await session_repository.create_many([data for _, data in created])
+    sessions = [
+        (student, derive_session_status({**data, "session_id": session_id}))
+        for (student, data), session_id in zip(created, session_ids)
+    ]
+    return sessions, errors
+
+async def _generate_profile(members: list, cache_key: str, mode: str, semaphore: asyncio.Semaphore) -> list:
+    _, session = members[0]
+    async with semaphore:
+        learning_path = await get_learning_path_for_session(session["session_id"], session, None, mode)
+    # Students with the same answers get the same path without another generation
+    for _, member in members[1:]:
+        await save_learning_path(member["session_id"], learning_path, cache_key)
+    return learning_path
+
+async def stream_cohort(students: list, errors: list, mode: str):
+    """Onboard a parsed cohort, yielding a line per student and progress as profiles finish."""
+    cohort_id = uuid.uuid4().hex
+    yield {"type": "cohort", "cohort_id": cohort_id, "students": len(students), "invalid_rows": len(errors)}
+    for error in errors:
+        yield {"type": "error", **error}
+
+    sessions, session_errors = await create_cohort_sessions(cohort_id, students)
+    for error in session_errors:
+        yield {"type": "error", **error}
+
+    profiles = {}
+    for student, session in sessions:
+        profiles.setdefault(get_cache_key(session, None, mode), []).append((student, session))
+    logger.info(f"Cohort {cohort_id}: {len(sessions)} sessions with {len(profiles)} distinct answer profiles")
+    yield {"type": "progress", "stage": "sessions_created", "sessions": len(sessions), "profiles": len(profiles)}
+
+    semaphore = asyncio.Semaphore(COHORT_CONCURRENCY)
+    tasks = {
+        asyncio.ensure_future(_generate_profile(members, cache_key, mode, semaphore)): members
+        for cache_key, members in profiles.items()
+    }
+    pending = set(tasks)
+    completed_students = 0
+    completed_profiles = 0
+    failed_students = 0
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                members = tasks[task]
+                error = task.exception()
+                for student, session in members:
+                    if error is None:
+                        yield {"type": "result", **_student_line(student, session_id=session["session_id"], learning_path=task.result(), profile_size=len(members))}
+                    else:
+                        detail = error.detail if isinstance(error, HTTPException) else str(error)
+                        yield {"type": "error", **_student_line(student, session_id=session["session_id"], detail=detail)}
+                completed_students += len(members)
+                completed_profiles += 1
+                failed_students += len(members) if error is not None else 0
+                yield {
+                    "type": "progress",
+                    "stage": "generating",
+                    "completed_students": completed_students,
+                    "total_students": len(sessions),
+                    "completed_profiles": completed_profiles,
+                    "total_profiles": len(profiles)
+                }
+    finally:
+        # Generations already started still finish and are cached, only the waiting stops
+        for task in pending:
+            task.cancel()
+
+    yield {
+        "type": "done",
+        "cohort_id": cohort_id,
+        "students": len(sessions),
+        "profiles": len(profiles),
+        "failed": failed_students + len(errors) + len(session_errors)
+    }
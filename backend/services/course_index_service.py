@@ -0,0 +1,201 @@
+from config import clients, logger, COURSE_INDEX_DIR, COURSE_INDEX_TOP_K, EMBEDDING_MODEL
+from services.rate_governor import rate_governor, estimate_tokens
+from datetime import datetime
+import json
+import numpy as np
+import os
+import re
+import shutil
+import uuid
+
+EMBEDDING_BATCH_SIZE = 100
+
+# Name of the file in an index directory that points at the current build
+CURRENT_POINTER = "CURRENT"
+
+# Loaded indexes, keyed by assistant key, as (pointer file identity, index)
+_indexes = {}
+
+def course_text(course: dict) -> str:
+    """Build the text that represents a course in the embedding space."""
+    parts = [
+        f"{course.get('code', '')} {course.get('title', '')}".strip(),
+        course.get('description', ''),
+        " ".join(course.get('topics', [])),
+        " ".join(course.get('public_reviews', [])),
+        " ".join(course.get('professor_reviews', []))
+    ]
+    return "\n".join(part for part in parts if part)
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+def find_course_code(title: str, codes) -> str:
+    """Find the course code a step title refers to, or None.
+
+    Codes match as whole words and the longest code wins, so "CS 101 Intro" is
+    not taken for "CS 10". Returns the code as given.
+    """
+    title = normalize_text(title)
+    for code in sorted(codes, key=lambda code: len(normalize_text(code)), reverse=True):
+        normalized = normalize_text(code)
+        if normalized and re.search(rf"(?<!\w){re.escape(normalized)}(?!\w)", title):
+            return code
+    return None
+
+def format_course(course: dict) -> str:
+    """Format a course record compactly for a prompt."""
+    line = f"- {course.get('code', '')} {course.get('title', '')}".rstrip()
+    if 'match_percentage' in course:
+        line += f" [match: {course['match_percentage']}%]"
+    if course.get('prerequisites'):
+        line += f" (prerequisites: {', '.join(course['prerequisites'])})"
+    if course.get('description'):
+        line += f": {course['description']}"
+    for review in course.get('public_reviews', [])[:2]:
+        line += f"\n  Public review: {review}"
+    for review in course.get('professor_reviews', [])[:2]:
+        line += f"\n  Professor review: {review}"
+    return line
+
+async def embed_texts(texts: list) -> np.ndarray:
+    """Embed texts in batches and return unit-normalized float32 vectors."""
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+        response = await rate_governor.call(
+            clients.openai.embeddings.create,
+            tokens=sum(estimate_tokens(text) for text in batch),
+            model=EMBEDDING_MODEL,
+            input=batch
+        )
+        vectors.extend(item.embedding for item in response.data)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+class CourseIndex:
+    """Course records with a memory-mapped matrix of their embedding vectors."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "courses.json")) as f:
+            data = json.load(f)
+        self.courses = data["courses"]
+        self.version = data["built_at"]
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+
+    def top_k(self, query_vectors: np.ndarray, k: int = COURSE_INDEX_TOP_K, weights: np.ndarray = None) -> list:
+        """Return the k courses with the highest weighted cosine similarity to the queries."""
+        # One matrix product scores every course against every query
+        scores = self.embeddings @ query_vectors.T
+        if weights is None:
+            weights = np.ones(query_vectors.shape[0], dtype=np.float32)
+        combined = scores @ (weights / weights.sum())
+
+        k = min(k, len(self.courses))
+        top = np.argpartition(-combined, k - 1)[:k]
+        top = top[np.argsort(-combined[top])]
+        return [{**self.courses[i], "course_index": int(i), "similarity": float(combined[i])} for i in top]
+
+def get_index_dir(assistant_key: str) -> str:
+    return os.path.join(COURSE_INDEX_DIR, assistant_key)
+
+def _build_identity(directory: str):
+    """Identify the current build by its pointer file, "legacy", or None if nothing was built."""
+    try:
+        stat = os.stat(os.path.join(directory, CURRENT_POINTER))
+        # A swap replaces the pointer file, so the inode changes with every build
+        return (stat.st_ino, stat.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    # Indexes built before builds were versioned keep their files in the directory itself
+    if os.path.exists(os.path.join(directory, "embeddings.npy")):
+        return "legacy"
+    return None
+
+def _build_dir(directory: str, identity) -> str:
+    if identity == "legacy":
+        return directory
+    with open(os.path.join(directory, CURRENT_POINTER)) as f:
+        return os.path.join(directory, "builds", f.read().strip())
+
+def get_course_index(assistant_key: str):
+    """Get the course index for a university and major, or None if it was never built.
+
+    Every call checks the index's pointer file, and the first call after a
+    rebuild swapped it loads the new build.
+    """
+    directory = get_index_dir(assistant_key)
+    identity = _build_identity(directory)
+    loaded = _indexes.get(assistant_key)
+    if loaded is not None and loaded[0] == identity:
+        return loaded[1]
+    if identity is None:
+        _indexes.pop(assistant_key, None)
+        return None
+    _indexes[assistant_key] = (identity, CourseIndex(_build_dir(directory, identity)))
+    return _indexes[assistant_key][1]
+
+def get_course_index_version(assistant_key: str) -> str:
+    index = get_course_index(assistant_key)
+    return index.version if index else ""
+
+async def get_relevant_courses(assistant_key: str, responses: list, search_query: str = None, k: int = COURSE_INDEX_TOP_K, index=None):
+    """Select the catalog courses most relevant to the survey responses and search query."""
+    if index is None:
+        index = get_course_index(assistant_key)
+    if index is None:
+        return None
+
+    queries = [f"{response['question']} {response['answer']}" for response in responses if str(response['answer']).strip()]
+    weights = [1.0] * len(queries)
+    if search_query:
+        # The explicit search focus counts as much as all survey answers together
+        queries.append(search_query)
+        weights.append(max(len(weights), 1))
+    if not queries:
+        return [{**course, "course_index": i} for i, course in enumerate(index.courses[:k])]
+
+    try:
+        query_vectors = await embed_texts(queries)
+    except Exception as e:
+        logger.warning(f"Failed to embed course query, using the full catalog: {str(e)}")
+        return None
+    return index.top_k(query_vectors, k, np.asarray(weights, dtype=np.float32))
+
+async def build_course_index(assistant_key: str, catalog_path: str) -> int:
+    """Embed a course catalog (JSON Lines, one course per line) and write its index."""
+    with open(catalog_path) as f:
+        courses = [json.loads(line) for line in f if line.strip()]
+    if not courses:
+        raise ValueError(f"No courses found in {catalog_path}")
+
+    embeddings = await embed_texts([course_text(course) for course in courses])
+
+    # Each build gets its own directory, and one atomic rename of the pointer file
+    # switches readers to it, so they never pair the embeddings of one build with
+    # the courses of another
+    directory = get_index_dir(assistant_key)
+    built_at = datetime.utcnow()
+    build = f"{built_at.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    build_dir = os.path.join(directory, "builds", build)
+    os.makedirs(build_dir)
+    np.save(os.path.join(build_dir, "embeddings.npy"), embeddings)
+    with open(os.path.join(build_dir, "courses.json"), "w") as f:
+        json.dump({"built_at": built_at.isoformat(), "model": EMBEDDING_MODEL, "courses": courses}, f)
+
+    identity = _build_identity(directory)
+    previous_dir = _build_dir(directory, identity) if identity is not None else None
+    pointer = os.path.join(directory, CURRENT_POINTER)
+    with open(f"{pointer}.{build}.tmp", "w") as f:
+        f.write(build)
+    os.replace(f"{pointer}.{build}.tmp", pointer)
+
+    # Keep the previous build for workers still reading it, older ones are no longer used
+    for name in os.listdir(os.path.join(directory, "builds")):
+        path = os.path.join(directory, "builds", name)
+        if path not in (build_dir, previous_dir):
+            shutil.rmtree(path, ignore_errors=True)
+
+    logger.info(f"Built course index {build} for {assistant_key} with {len(courses)} courses")
+    return len(courses)
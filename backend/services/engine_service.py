@@ -0,0 +1,245 @@
+from config import clients, logger, GENERATION_ENGINE, GENERATION_ENGINE_OVERRIDES, CHAT_COMPLETIONS_MODEL, OPENAI_RUN_TOKEN_ESTIMATE
+from fastapi import HTTPException
+from collections import defaultdict
+from data.majors import major_id_to_name
+from services.assistant_service import (
+    get_assistant_key,
+    build_assistant_instructions,
+    build_questions_prompt,
+    build_learning_path_prompt,
+    generate_questions,
+    generate_learning_path_from_responses,
+    stream_learning_path_from_responses,
+)
+from services.course_index_service import get_course_index
+from services.json_stream import JsonArrayStreamParser
+from services.response_parser import parse_questions, parse_learning_path, learning_path_step_validator
+from services.run_service import track_run_usage
+from services.rate_governor import rate_governor, estimate_tokens
+from services.metrics_service import timed, record_token_usage
+import time
+
+QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "freeText": {"type": "boolean"}
+                },
+                "required": ["id", "question", "options", "freeText"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["questions"],
+    "additionalProperties": False
+}
+
+LEARNING_PATH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "learning_path": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "estimated_time": {"type": "string"},
+                    "match_percentage": {"type": "number"},
+                    "public_reviews": {"type": "array", "items": {"type": "string"}},
+                    "professor_reviews": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["title", "description", "estimated_time", "match_percentage", "public_reviews", "professor_reviews"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["learning_path"],
+    "additionalProperties": False
+}
+
+# Per engine and operation latency and token counters, for side by side comparison
+_engine_stats = defaultdict(lambda: {"calls": 0, "failures": 0, "total_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+
+def _record(engine: str, operation: str, started_at: float, usage: dict, failed: bool = False) -> None:
+    stats = _engine_stats[f"{engine}.{operation}"]
+    stats["calls"] += 1
+    stats["failures"] += int(failed)
+    stats["total_seconds"] += time.perf_counter() - started_at
+    stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+    stats["completion_tokens"] += usage.get("completion_tokens", 0)
+
+def get_engine_stats() -> dict:
+    """Get latency and token usage per engine and operation."""
+    return {
+        key: {
+            **stats,
+            "avg_seconds": stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0
+        }
+        for key, stats in _engine_stats.items()
+    }
+
+class AssistantsEngine:
+    """Generates through the Assistants API thread/run lifecycle."""
+
+    name = "assistants"
+    # File search gives the assistant the catalog, retrieved courses only narrow it down
+    needs_course_index = False
+
+    async def generate_questions(self, session: dict, responses: list, courses: list = None) -> list:
+        started_at = time.perf_counter()
+        with track_run_usage() as usage:
+            try:
+                questions = await generate_questions(
+                    session["assistant_id"], responses, session["student_type"], major_id_to_name(session["major_id"]), courses, session
+                )
+            except Exception:
+                _record(self.name, "questions", started_at, usage, failed=True)
+                raise
+        _record(self.name, "questions", started_at, usage)
+        return questions
+
+    async def generate_learning_path(self, session: dict, responses: list, search_query: str = None, courses: list = None, part: str = None) -> list:
+        started_at = time.perf_counter()
+        with track_run_usage() as usage:
+            try:
+                learning_path = await generate_learning_path_from_responses(session["assistant_id"], responses, search_query, courses, session, part)
+            except Exception:
+                _record(self.name, "learning_path", started_at, usage, failed=True)
+                raise
+        _record(self.name, "learning_path", started_at, usage)
+        return learning_path
+
+    async def stream_learning_path(self, session: dict, responses: list, search_query: str = None, courses: list = None):
+        started_at = time.perf_counter()
+        with track_run_usage() as usage:
+            async for step in stream_learning_path_from_responses(session["assistant_id"], responses, search_query, courses, session):
+                yield step
+        _record(self.name, "learning_path_stream", started_at, usage)
+
+class ChatCompletionsEngine:
+    """Generates with a single chat completions request constrained by a JSON schema."""
+
+    name = "chat"
+    # The retrieved courses are the only catalog the model sees
+    needs_course_index = True
+
+    def _messages(self, session: dict, prompt: str) -> list:
+        return [
+            {"role": "system", "content": build_assistant_instructions(session["university_id"], session["major_id"])},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _response_format(self, name: str, schema: dict) -> dict:
+        return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+    async def _complete(self, session: dict, prompt: str, operation: str, schema: dict) -> str:
+        started_at = time.perf_counter()
+        usage = {}
+        try:
+            with timed("openai.chat_completion"):
+                completion = await rate_governor.call(
+                    clients.openai.chat.completions.create,
+                    tokens=estimate_tokens(prompt) + OPENAI_RUN_TOKEN_ESTIMATE,
+                    model=CHAT_COMPLETIONS_MODEL,
+                    messages=self._messages(session, prompt),
+                    response_format=self._response_format(operation, schema)
+                )
+            record_token_usage("chat", completion.usage)
+            if completion.usage:
+                usage = {"prompt_tokens": completion.usage.prompt_tokens, "completion_tokens": completion.usage.completion_tokens}
+            choice = completion.choices[0]
+            if choice.message.refusal:
+                raise HTTPException(status_code=500, detail=f"Model refused the request: {choice.message.refusal}")
+            # Parsed by the caller, which salvages what it can from a truncated reply
+            result = choice.message.content
+        except Exception:
+            _record(self.name, operation, started_at, usage, failed=True)
+            raise
+        _record(self.name, operation, started_at, usage)
+        return result
+
+    async def generate_questions(self, session: dict, responses: list, courses: list = None) -> list:
+        prompt = build_questions_prompt(responses, session["student_type"], major_id_to_name(session["major_id"]), courses)
+        questions = parse_questions(await self._complete(session, prompt, "questions", QUESTIONS_SCHEMA))
+        if not questions:
+            raise HTTPException(status_code=500, detail="Failed to parse the generated questions")
+        return questions
+
+    async def generate_learning_path(self, session: dict, responses: list, search_query: str = None, courses: list = None, part: str = None) -> list:
+        prompt = build_learning_path_prompt(responses, search_query, courses, part)
+        learning_path = parse_learning_path(await self._complete(session, prompt, "learning_path", LEARNING_PATH_SCHEMA))
+        if not learning_path:
+            raise HTTPException(status_code=500, detail="Failed to parse the generated learning path")
+        return learning_path
+
+    async def stream_learning_path(self, session: dict, responses: list, search_query: str = None, courses: list = None):
+        started_at = time.perf_counter()
+        usage = {}
+        parser = JsonArrayStreamParser()
+        validator = learning_path_step_validator()
+        prompt = build_learning_path_prompt(responses, search_query, courses)
+        stream = await rate_governor.call(
+            clients.openai.chat.completions.create,
+            tokens=estimate_tokens(prompt) + OPENAI_RUN_TOKEN_ESTIMATE,
+            model=CHAT_COMPLETIONS_MODEL,
+            messages=self._messages(session, prompt),
+            response_format=self._response_format("learning_path", LEARNING_PATH_SCHEMA),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                record_token_usage("chat", chunk.usage)
+                usage = {"prompt_tokens": chunk.usage.prompt_tokens, "completion_tokens": chunk.usage.completion_tokens}
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for step in parser.feed(chunk.choices[0].delta.content):
+                step = validator.validate(step)
+                if step is not None:
+                    yield step
+        _record(self.name, "learning_path_stream", started_at, usage)
+        if validator.report.record() == "failed":
+            raise HTTPException(status_code=500, detail="Failed to parse the generated learning path")
+
+ENGINES = {
+    AssistantsEngine.name: AssistantsEngine(),
+    ChatCompletionsEngine.name: ChatCompletionsEngine(),
+}
+
+# Majors whose engine fallback was already logged
+_fallbacks_logged = set()
+
+def _usable_engine(name: str, assistant_key: str) -> str:
+    if name not in ENGINES:
+        logger.warning(f"Unknown generation engine {name}, using {AssistantsEngine.name}")
+        return AssistantsEngine.name
+    if ENGINES[name].needs_course_index and get_course_index(assistant_key) is None:
+        # Without an index the prompt would carry no catalog and the model would invent courses
+        if assistant_key not in _fallbacks_logged:
+            _fallbacks_logged.add(assistant_key)
+            logger.warning(f"No course index for {assistant_key}, the {name} engine needs one, using {AssistantsEngine.name}")
+        return AssistantsEngine.name
+    return name
+
+def get_engine_name(university_id: str, major_id: str) -> str:
+    """Get the configured generation engine for a university and major.
+
+    Engines that need a course index fall back to the Assistants engine for
+    majors whose index was not built.
+    """
+    assistant_key = get_assistant_key(university_id, major_id)
+    return _usable_engine(GENERATION_ENGINE_OVERRIDES.get(assistant_key, GENERATION_ENGINE), assistant_key)
+
+def get_engine(session: dict):
+    """Get the generation engine a session was created with, if it can still serve the session."""
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    name = session.get("engine") or GENERATION_ENGINE_OVERRIDES.get(assistant_key, GENERATION_ENGINE)
+    return ENGINES[_usable_engine(name, assistant_key)]
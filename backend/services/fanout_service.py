@@ -0,0 +1,118 @@
+"""Fan-out generation of learning paths.
+
+The ranked courses are clustered by their depth in the prerequisite chain and
+split into consecutive parts, roughly one per semester. The parts are generated
+concurrently, each in its own run, and merged back into one path with repeated
+courses removed and every course placed after the prerequisites the path covers.
+"""
+from config import logger, LEARNING_PATH_FANOUT_PARTS, LEARNING_PATH_FANOUT_CONCURRENCY
+from services.metrics_service import timed, LEARNING_PATH_FANOUT_MERGE
+from services.course_index_service import normalize_text, find_course_code
+import asyncio
+
+def _prerequisite_depths(courses: list) -> dict:
+    """Get how many prerequisites deep each course sits among the given courses."""
+    prerequisites = {
+        normalize_text(course["code"]): [normalize_text(code) for code in course.get("prerequisites", [])]
+        for course in courses if course.get("code")
+    }
+    depths = {}
+
+    def depth(code: str, visiting: set) -> int:
+        if code in depths:
+            return depths[code]
+        if code in visiting:
+            # Cyclic prerequisites, treat the course as having none
+            return 0
+        visiting.add(code)
+        depths[code] = 1 + max((depth(required, visiting) for required in prerequisites[code] if required in prerequisites), default=-1)
+        return depths[code]
+
+    for code in prerequisites:
+        depth(code, set())
+    return depths
+
+def plan_parts(courses: list = None, count: int = LEARNING_PATH_FANOUT_PARTS) -> list:
+    """Split the courses into consecutive parts, foundational courses first.
+
+    Without retrieved courses every part is None and the model splits the path itself.
+    """
+    if not courses:
+        return [None] * max(count, 1)
+    depths = _prerequisite_depths(courses)
+    # sorted is stable, so courses keep their match order within a depth
+    ordered = sorted(courses, key=lambda course: depths.get(normalize_text(course.get("code", "")), 0))
+    count = max(min(count, len(ordered)), 1)
+    return [ordered[index * len(ordered) // count:(index + 1) * len(ordered) // count] for index in range(count)]
+
+def describe_part(index: int, count: int, has_courses: bool) -> str:
+    """Tell the model which part of the learning path to create."""
+    intro = f"This request covers part {index + 1} of {count} of the learning path, the other parts are created separately."
+    if has_courses:
+        return f"{intro} Only create steps for the courses listed above, in the order they should be taken."
+    return (
+        f"{intro} Divide the complete learning path into {count} consecutive stages, from foundational to advanced courses, "
+        f"and only create the steps of stage {index + 1}."
+    )
+
+def _step_key(step: dict, course_codes: list) -> str:
+    """Identify a step by the catalog course it covers, or by its title."""
+    code = find_course_code(step.get("title", ""), course_codes)
+    return code if code is not None else normalize_text(step.get("title", ""))
+
+def merge_learning_paths(parts: list, courses: list = None) -> list:
+    """Merge generated parts in order, dropping repeated courses and fixing prerequisite order."""
+    course_codes = [normalize_text(course["code"]) for course in courses or [] if course.get("code")]
+    prerequisites = {
+        normalize_text(course["code"]): {normalize_text(code) for code in course.get("prerequisites", [])}
+        for course in courses or [] if course.get("code")
+    }
+
+    steps = []
+    keys = []
+    for step in (step for part in parts for step in part):
+        key = _step_key(step, course_codes)
+        if key in keys:
+            LEARNING_PATH_FANOUT_MERGE.inc(action="duplicate")
+            continue
+        steps.append(step)
+        keys.append(key)
+
+    # Stable topological order: take the earliest step whose prerequisites in the path are placed
+    pending = list(range(len(steps)))
+    placed = set()
+    order = []
+    while pending:
+        ready = next(
+            (index for index in pending if not (prerequisites.get(keys[index], set()) & set(keys)) - placed),
+            pending[0]  # a prerequisite cycle, keep the generated order
+        )
+        if ready != pending[0]:
+            LEARNING_PATH_FANOUT_MERGE.inc(action="reordered")
+        pending.remove(ready)
+        placed.add(keys[ready])
+        order.append(ready)
+    return [steps[index] for index in order]
+
+async def generate_fanout_learning_path(engine, session: dict, responses: list, search_query: str = None, courses: list = None) -> list:
+    """Generate the parts of a learning path concurrently and merge them."""
+    parts = plan_parts(courses)
+    semaphore = asyncio.Semaphore(LEARNING_PATH_FANOUT_CONCURRENCY)
+
+    async def generate_part(index: int, part_courses: list) -> list:
+        async with semaphore:
+            with timed("learning_path.fanout_part"):
+                return await engine.generate_learning_path(
+                    session, responses, search_query, part_courses, describe_part(index, len(parts), part_courses is not None)
+                )
+
+    tasks = [asyncio.ensure_future(generate_part(index, part_courses)) for index, part_courses in enumerate(parts)]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # A path with a missing part would be cached as complete, so fail the whole generation
+        for task in tasks:
+            task.cancel()
+        raise
+    logger.info(f"Generated learning path in {len(parts)} parts of {[len(result) for result in results]} steps")
+    return merge_learning_paths(results, courses)
@@ -0,0 +1,249 @@
+from config import clients, logger, JOB_BACKEND, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RETRY_AFTER_SECONDS, JOB_LEASE_SECONDS
+from fastapi import HTTPException
+from google.cloud.firestore import async_transactional
+from datetime import datetime
+from services.session_service import get_session
+from services.learning_path_service import get_learning_path_for_session
+from services.question_bank_service import get_follow_up_questions
+import asyncio
+import time
+import uuid
+
+def _claimable(job: dict, now: float) -> bool:
+    """Whether a job is waiting to run, or was running under a lease that has expired."""
+    if job["status"] == "queued":
+        return True
+    return job["status"] == "running" and (job.get("lease_expires_at") or 0) <= now
+
+def _claim_fields(owner: str, now: float, lease_seconds: float) -> dict:
+    return {
+        "status": "running",
+        "owner": owner,
+        "lease_expires_at": now + lease_seconds,
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+class InMemoryJobStore:
+    """Job store kept in process memory, used for tests and local runs."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    async def create(self, job: dict) -> None:
+        self.jobs[job["job_id"]] = dict(job)
+
+    async def update(self, job_id: str, fields: dict) -> None:
+        self.jobs[job_id].update(fields)
+
+    async def get(self, job_id: str):
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def list_unfinished(self) -> list:
+        return [dict(job) for job in self.jobs.values() if job["status"] in ("queued", "running")]
+
+    async def claim(self, job_id: str, owner: str, now: float, lease_seconds: float):
+        job = self.jobs.get(job_id)
+        if job is None or not _claimable(job, now):
+            return None
+        job.update(_claim_fields(owner, now, lease_seconds))
+        return dict(job)
+
+@async_transactional
+async def _claim_job(transaction, doc_ref, owner: str, now: float, lease_seconds: float):
+    """Mark a job as running for this worker unless another worker holds it, returning the job."""
+    snapshot = await doc_ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    job = snapshot.to_dict()
+    if not _claimable(job, now):
+        return None
+    fields = _claim_fields(owner, now, lease_seconds)
+    transaction.update(doc_ref, fields)
+    return {**job, **fields}
+
+class FirestoreJobStore:
+    """Durable job store backed by a Firestore collection."""
+
+    def __init__(self, collection: str = "generation_jobs"):
+        self.collection = collection
+
+    async def create(self, job: dict) -> None:
+        await clients.db.collection(self.collection).document(job["job_id"]).set(job)
+
+    async def update(self, job_id: str, fields: dict) -> None:
+        await clients.db.collection(self.collection).document(job_id).update(fields)
+
+    async def get(self, job_id: str):
+        doc = await clients.db.collection(self.collection).document(job_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def list_unfinished(self) -> list:
+        query = clients.db.collection(self.collection).where("status", "in", ["queued", "running"])
+        return [doc.to_dict() async for doc in query.stream()]
+
+    async def claim(self, job_id: str, owner: str, now: float, lease_seconds: float):
+        doc_ref = clients.db.collection(self.collection).document(job_id)
+        return await _claim_job(clients.db.transaction(), doc_ref, owner, now, lease_seconds)
+
+async def _run_learning_path_job(session_id: str, search: str = None, mode: str = None) -> dict:
+    session = await get_session(session_id)
+    return {"learning_path": await get_learning_path_for_session(session_id, session, search, mode)}
+
+async def _run_generate_survey_job(session_id: str) -> dict:
+    session = await get_session(session_id)
+    return {"questions": await get_follow_up_questions(session)}
+
+JOB_HANDLERS = {
+    "learning_path": _run_learning_path_job,
+    "generate_survey": _run_generate_survey_job,
+}
+
+class JobQueue:
+    """Bounded generation job queue drained by a fixed pool of workers.
+
+    A worker claims a job in the store before running it and renews the claim's
+    lease while it runs. Several processes can share a store: each job runs
+    once. A reaper rescans the store every lease_seconds / 3, so a job whose
+    process died is taken over once its lease expires.
+    """
+
+    def __init__(self, store, workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.store = store
+        self.worker_count = workers
+        self.max_size = max_size
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self.queue = asyncio.Queue(maxsize=max_size)
+        # Queue slots held by enqueue calls that are still storing their job
+        self.reserved = 0
+        # Ids in the local queue, so the reaper does not queue a job twice
+        self.queued = set()
+        self.workers = []
+        self.reaper = None
+
+    def _full(self) -> bool:
+        return self.queue.qsize() + self.reserved >= self.max_size
+
+    def _put(self, job_id: str) -> None:
+        self.queue.put_nowait(job_id)
+        self.queued.add(job_id)
+
+    async def recover(self) -> int:
+        """Queue stored jobs that are waiting or whose lease expired, returning how many were queued."""
+        recovered = 0
+        now = time.time()
+        for job in await self.store.list_unfinished():
+            if self._full():
+                break
+            # Jobs another live worker is running keep their lease, the claim in _run settles any overlap
+            if job["job_id"] not in self.queued and _claimable(job, now):
+                self._put(job["job_id"])
+                recovered += 1
+        if recovered:
+            logger.info(f"Recovered {recovered} unfinished jobs")
+        return recovered
+
+    async def _reap(self) -> None:
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error(f"Failed to recover unfinished jobs: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def start(self) -> None:
+        """Start the workers and the reaper, which first re-queues jobs a previous process left unfinished."""
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        self.reaper = asyncio.create_task(self._reap())
+
+    async def stop(self) -> None:
+        tasks = self.workers + ([self.reaper] if self.reaper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.reaper = None
+
+    async def enqueue(self, kind: str, session_id: str, params: dict = None) -> dict:
+        """Create a job and queue it, raising 429 when the queue is full."""
+        if self._full():
+            raise HTTPException(
+                status_code=429,
+                detail="Too many generation jobs queued, please retry later",
+                headers={"Retry-After": str(JOB_RETRY_AFTER_SECONDS)}
+            )
+
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "session_id": session_id,
+            "params": params or {},
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        # Hold the slot while the job is stored, so concurrent calls cannot overfill the queue
+        self.reserved += 1
+        try:
+            await self.store.create(job)
+        finally:
+            self.reserved -= 1
+        self._put(job["job_id"])
+        logger.info(f"Queued {kind} job {job['job_id']} for session {session_id}")
+        return job
+
+    async def get(self, job_id: str) -> dict:
+        job = await self.store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self.queue.get()
+            self.queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Worker {index} failed on job {job_id}: {str(e)}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.store.update(job_id, {"lease_expires_at": time.time() + self.lease_seconds})
+            except Exception as e:
+                logger.warning(f"Failed to renew the lease on job {job_id}: {str(e)}")
+
+    async def _run(self, job_id: str) -> None:
+        job = await self.store.claim(job_id, self.owner, time.time(), self.lease_seconds)
+        if job is None:
+            # Finished, or running under another worker's lease
+            return
+
+        renewal = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            result = await JOB_HANDLERS[job["kind"]](job["session_id"], **job["params"])
+            fields = {"status": "succeeded", "result": result}
+        except HTTPException as he:
+            fields = {"status": "failed", "error": he.detail}
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            fields = {"status": "failed", "error": str(e)}
+        finally:
+            renewal.cancel()
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        await self.store.update(job_id, fields)
+
+def _create_store():
+    if JOB_BACKEND == "memory":
+        return InMemoryJobStore()
+    return FirestoreJobStore()
+
+job_queue = JobQueue(_create_store())
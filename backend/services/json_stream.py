@@ -0,0 +1,79 @@
+import json
+
+class JsonArrayStreamParser:
+    """Incrementally parse the first JSON array in a text stream.
+
+    Text is fed in arbitrary chunks and every top-level object of the array is
+    returned as soon as its closing brace arrives, so callers can act on items
+    before the whole array has been generated.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.item_start = None
+
+    def feed(self, text: str) -> list:
+        """Consume a chunk of text and return the objects completed by it."""
+        items = []
+        if self.finished:
+            return items
+        self.buffer += text
+
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+
+            if not self.started:
+                if char == '[':
+                    self.started = True
+                    self.depth = 1
+                self.position += 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '[{':
+                if self.depth == 1 and char == '{':
+                    self.item_start = self.position
+                self.depth += 1
+            elif char in ']}':
+                self.depth -= 1
+                if self.depth == 1 and char == '}' and self.item_start is not None:
+                    item = self._decode(self.buffer[self.item_start:self.position + 1])
+                    if item is not None:
+                        items.append(item)
+                    self.item_start = None
+                elif self.depth == 0:
+                    self.finished = True
+                    break
+            self.position += 1
+
+        self._compact()
+        return items
+
+    def _decode(self, text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+    def _compact(self) -> None:
+        """Drop consumed text that no pending item still needs."""
+        keep_from = self.item_start if self.item_start is not None else self.position
+        if keep_from > 0:
+            self.buffer = self.buffer[keep_from:]
+            self.position -= keep_from
+            if self.item_start is not None:
+                self.item_start -= keep_from
@@ -0,0 +1,182 @@
+from config import logger, LEARNING_PATH_COURSE_COUNT, LEARNING_PATH_MODE
+from fastapi import HTTPException
+from services.assistant_service import get_assistant_key, LEARNING_PATH_PROMPT_VERSION
+from services.course_index_service import get_relevant_courses, get_course_index, get_course_index_version
+from services.scoring_service import rank_courses, apply_match_percentage
+from services.search_service import search_learning_path
+from services.metrics_service import timed, LEARNING_PATH_COALESCED
+from services.single_flight import SingleFlight
+from services.engine_service import get_engine
+from services.cache_service import learning_path_cache, learning_path_cache_key
+from services.session_repository import session_repository
+from services.fanout_service import generate_fanout_learning_path
+import asyncio
+
+# In-flight learning path generations, keyed by session and learning path cache key,
+# which covers the response set, the search query and the prompt version
+_generations = SingleFlight()
+
+# "single" generates the path in one run, "fanout" in concurrent parts that are merged
+LEARNING_PATH_MODES = ("single", "fanout")
+
+def get_survey_responses(session: dict) -> list:
+    """Get all survey responses from a session, failing if there are none."""
+    survey_responses = session.get("survey_responses", {}).get("responses", [])
+    if not survey_responses:
+        raise HTTPException(status_code=400, detail="No survey responses found")
+    return survey_responses
+
+def get_generation_mode(mode: str = None) -> str:
+    """Resolve the requested learning path generation mode, defaulting to the configured one."""
+    mode = mode or LEARNING_PATH_MODE
+    if mode not in LEARNING_PATH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown learning path mode: {mode}")
+    return mode
+
+def get_cache_key(session: dict, search_query: str = None, mode: str = "single") -> str:
+    """Get the learning path cache key for a session, search query and generation mode."""
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    version = f"{LEARNING_PATH_PROMPT_VERSION}:{get_engine(session).name}:{get_course_index_version(assistant_key)}"
+    if mode != "single":
+        version += f":{mode}"
+    return learning_path_cache_key(session["assistant_id"], get_survey_responses(session), search_query, version)
+
+async def get_session_courses(session: dict, responses: list, search_query: str = None):
+    """Retrieve the relevant catalog courses for a session, ranked by their computed match."""
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    # Retrieval and scoring share one index, so course positions refer to the same build
+    index = get_course_index(assistant_key)
+    if index is None:
+        return None
+    with timed("course_index.retrieve"):
+        courses = await get_relevant_courses(assistant_key, responses, search_query, index=index)
+    if courses is None:
+        return None
+    return rank_courses(assistant_key, responses, courses, LEARNING_PATH_COURSE_COUNT, index)
+
+async def save_learning_path(session_id: str, learning_path: list, cache_key: str) -> None:
+    """Store the learning path on the session document, committed with the next batch."""
+    await session_repository.update(session_id, {
+        "learning_path": learning_path,
+        "learning_path_cache_key": cache_key,
+        "status": "learning_path_generated"
+    })
+
+def search_stored_learning_path(session: dict, responses: list, search_query: str = None):
+    """Answer a search refinement locally from the session's current path, if possible."""
+    # A path without a cache key predates the latest responses, so it cannot be refined
+    if not search_query or not session.get("learning_path") or not session.get("learning_path_cache_key"):
+        return None
+    with timed("search.local"):
+        return search_learning_path(session, responses, search_query)
+
+async def _load_or_generate(session_id: str, session: dict, responses: list, search_query: str, cache_key: str, mode: str, on_step=None) -> list:
+    """Load the learning path from the cache or generate it, then store it once on the session.
+
+    on_step, if given, is called with every generated step as it streams in.
+    Fanned out paths are only complete once merged, so their steps follow the merge.
+    """
+    with timed("cache.lookup"):
+        learning_path = await learning_path_cache.get(cache_key)
+    if learning_path is not None:
+        logger.info(f"Learning path cache hit for session {session_id}")
+        if session.get("learning_path_cache_key") != cache_key:
+            await save_learning_path(session_id, learning_path, cache_key)
+        return learning_path
+
+    # Generate learning path using the session's engine
+    engine = get_engine(session)
+    courses = await get_session_courses(session, responses, search_query)
+    if mode == "fanout":
+        learning_path = await generate_fanout_learning_path(engine, session, responses, search_query, courses)
+        if courses is not None:
+            learning_path = [apply_match_percentage(step, courses) for step in learning_path]
+        for step in learning_path if on_step else []:
+            on_step(step)
+    elif on_step is None:
+        learning_path = await engine.generate_learning_path(session, responses, search_query, courses)
+        if courses is not None:
+            learning_path = [apply_match_percentage(step, courses) for step in learning_path]
+    else:
+        learning_path = []
+        async for step in engine.stream_learning_path(session, responses, search_query, courses):
+            if courses is not None:
+                step = apply_match_percentage(step, courses)
+            learning_path.append(step)
+            on_step(step)
+
+    # Persist the complete path once the run has finished
+    await learning_path_cache.set(cache_key, learning_path)
+    await save_learning_path(session_id, learning_path, cache_key)
+    return learning_path
+
+def start_learning_path_generation(session_id: str, session: dict, mode: str = None) -> asyncio.Future:
+    """Start generating a session's learning path in the background, and return the task.
+
+    Requests for the same path join the task instead of generating it again.
+    """
+    survey_responses = get_survey_responses(session)
+    mode = get_generation_mode(mode)
+    cache_key = get_cache_key(session, None, mode)
+    return _generations.start((session_id, cache_key), _load_or_generate, session_id, session, survey_responses, None, cache_key, mode)
+
+def cancel_learning_path_generation(task: asyncio.Future) -> bool:
+    """Cancel a learning path generation unless a request is waiting for it."""
+    return _generations.cancel(task)
+
+async def get_learning_path_for_session(session_id: str, session: dict, search_query: str = None, mode: str = None) -> list:
+    """Get the learning path for a session from the cache, generating it on a miss.
+
+    Concurrent identical requests share one in-flight generation and one session write.
+    """
+    survey_responses = get_survey_responses(session)
+    learning_path = search_stored_learning_path(session, survey_responses, search_query)
+    if learning_path is not None:
+        return learning_path
+
+    mode = get_generation_mode(mode)
+    cache_key = get_cache_key(session, search_query, mode)
+    key = (session_id, cache_key)
+    if _generations.in_flight(key):
+        LEARNING_PATH_COALESCED.inc()
+    return await _generations.do(key, _load_or_generate, session_id, session, survey_responses, search_query, cache_key, mode)
+
+async def stream_learning_path_for_session(session_id: str, session: dict, search_query: str = None, mode: str = None):
+    """Yield learning path steps for a session, replaying cached paths immediately.
+
+    A request that arrives while the same path is being generated waits for that
+    generation instead of starting another one.
+    """
+    survey_responses = get_survey_responses(session)
+    learning_path = search_stored_learning_path(session, survey_responses, search_query)
+    if learning_path is not None:
+        for step in learning_path:
+            yield step
+        return
+
+    mode = get_generation_mode(mode)
+    cache_key = get_cache_key(session, search_query, mode)
+    key = (session_id, cache_key)
+    if _generations.in_flight(key):
+        LEARNING_PATH_COALESCED.inc()
+        for step in await _generations.do(key, _load_or_generate, session_id, session, survey_responses, search_query, cache_key, mode):
+            yield step
+        return
+
+    # The generation runs as a shared task, so it still completes and is saved if this client goes away
+    steps = asyncio.Queue()
+    task = _generations.start(key, _load_or_generate, session_id, session, survey_responses, search_query, cache_key, mode, steps.put_nowait)
+    task.add_done_callback(lambda _: steps.put_nowait(None))
+    yielded = 0
+    with _generations.waiting(task):
+        while True:
+            step = await steps.get()
+            if step is None:
+                break
+            yielded += 1
+            yield step
+
+        # Cache hits return the path without streaming it
+        learning_path = await asyncio.shield(task)
+    for step in learning_path[yielded:]:
+        yield step
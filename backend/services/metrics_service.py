@@ -0,0 +1,132 @@
+"""Hot path instrumentation exported in the Prometheus text format.
+
+Metrics are kept per process, so with several uvicorn workers each worker
+exposes its own series.
+"""
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+_registry = []
+
+def _format_labels(labelnames: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "link_http_request_duration_seconds", "HTTP request latency until the response starts", ("method", "endpoint", "status")
+)
+STAGE_DURATION = Histogram(
+    "link_stage_duration_seconds", "Latency of hot path stages", ("stage",)
+)
+RUN_POLLS = Counter("link_run_polls_total", "Assistant run status polls")
+RUN_RETRIES = Counter("link_run_retries_total", "Assistant run retries and stream-to-poll fallbacks", ("reason",))
+RUN_OUTCOMES = Counter("link_run_outcomes_total", "Finished assistant runs by terminal status", ("status",))
+PARSE_OUTCOMES = Counter("link_parse_outcomes_total", "Generated responses by parse outcome: ok, repaired, partial or failed", ("kind", "outcome"))
+LEARNING_PATH_COALESCED = Counter("link_learning_path_coalesced_total", "Learning path requests that joined an in-flight generation")
+LEARNING_PATH_FANOUT_MERGE = Counter("link_learning_path_fanout_merge_total", "Steps dropped or moved when merging fanned out learning path parts", ("action",))
+FOLLOW_UP_QUESTIONS = Counter("link_follow_up_questions_total", "Follow-up question requests by source: stored, joined, bank or generated", ("source",))
+SPECULATIONS = Counter("link_speculations_total", "Speculative generations by kind and outcome", ("kind", "outcome"))
+SESSION_WRITES = Counter("link_session_writes_total", "Session writes by how they were committed: durable or queued", ("mode",))
+SESSION_COMMITS = Counter("link_session_commits_total", "Batched session commits by outcome", ("outcome",))
+SESSIONS_COMPACTED = Counter("link_sessions_compacted_total", "Stale sessions removed by compaction", ("action",))
+OPENAI_TOKENS = Counter("link_openai_tokens_total", "OpenAI token usage", ("source", "type"))
+
+# Stage timings of the current request, for the opt-in timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def start_request_timings() -> list:
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+@contextmanager
+def timed(stage: str):
+    """Time a hot path stage and record it in the stage histogram."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started_at
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def record_token_usage(source: str, usage) -> None:
+    """Count the prompt and completion tokens of an OpenAI usage object."""
+    if not usage:
+        return
+    OPENAI_TOKENS.inc(usage.prompt_tokens, source=source, type="prompt")
+    OPENAI_TOKENS.inc(usage.completion_tokens, source=source, type="completion")
+
+def format_server_timing(timings: list) -> str:
+    """Format stage timings as a Server-Timing header value."""
+    totals = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f"{stage.replace('.', '-')};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
@@ -0,0 +1,221 @@
+from config import clients, logger
+from fastapi import HTTPException
+from datetime import datetime
+from data.surveys import SURVEY_TYPES
+from services.assistant_service import get_assistant_key, get_or_create_assistant, QUESTIONS_PROMPT_VERSION
+from services.engine_service import get_engine
+from services.course_index_service import get_relevant_courses, get_course_index_version
+from services.cache_service import normalize_responses
+from services.metrics_service import FOLLOW_UP_QUESTIONS
+from services.single_flight import SingleFlight
+from services.session_repository import session_repository
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+
+QUESTION_BANK_COLLECTION = 'question_bank'
+
+# Bank entries fetched by this process, keyed by bank key
+_bank_index = {}
+
+# In-flight follow-up question generations, keyed by session and response fingerprint
+_question_generations = SingleFlight()
+
+def get_answer_profile(student_type: str, responses: list):
+    """Reduce initial survey responses to a profile of multiple-choice answers.
+
+    Returns None when the profile is novel, i.e. a free-text question was answered
+    or an answer is not one of the question's options.
+    """
+    if student_type not in SURVEY_TYPES:
+        return None
+
+    answers = {response['question']: str(response['answer']).strip() for response in responses}
+    profile = []
+    for question in SURVEY_TYPES[student_type]:
+        answer = answers.pop(question.question, "")
+        if question.free_text:
+            if answer:
+                return None
+            continue
+        if answer not in question.options:
+            return None
+        profile.append([question.id, answer])
+
+    # Responses that are not part of the initial survey also make the profile novel
+    if answers:
+        return None
+    return profile
+
+def get_question_bank_version(session: dict) -> str:
+    """Get the version banked questions for a session must have, from the prompt, engine and course index."""
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    return f"{QUESTIONS_PROMPT_VERSION}:{get_engine(session).name}:{get_course_index_version(assistant_key)}"
+
+def question_bank_key(assistant_key: str, student_type: str, profile: list, version: str) -> str:
+    """Build the bank key for an answer profile, generated by the given version."""
+    payload = json.dumps([assistant_key, student_type, profile, version], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def get_banked_questions(session: dict, responses: list):
+    """Get pre-generated follow-up questions for a session, or None if there are none."""
+    profile = get_answer_profile(session["student_type"], responses)
+    if profile is None:
+        return None
+
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    key = question_bank_key(assistant_key, session["student_type"], profile, get_question_bank_version(session))
+    if key in _bank_index:
+        return _bank_index[key]
+
+    try:
+        doc = await clients.db.collection(QUESTION_BANK_COLLECTION).document(key).get()
+    except Exception as e:
+        logger.warning(f"Question bank lookup failed: {str(e)}")
+        return None
+    if not doc.exists:
+        return None
+
+    questions = doc.to_dict()['questions']
+    _bank_index[key] = questions
+    logger.info(f"Serving follow-up questions for {assistant_key} from the question bank")
+    return questions
+
+def response_fingerprint(responses: list) -> str:
+    """Hash a response set, so questions generated for it can be matched to it later."""
+    payload = json.dumps(normalize_responses(responses), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def _save_follow_up_questions(session_id: str, fingerprint: str, questions: list) -> None:
+    await session_repository.update(session_id, {
+        "follow_up_questions": {
+            "fingerprint": fingerprint,
+            "questions": questions,
+            "generated_at": datetime.utcnow().isoformat()
+        }
+    })
+
+async def _load_or_generate_questions(session: dict, responses: list, fingerprint: str) -> list:
+    # Common answer profiles are served from the precomputed question bank
+    questions = await get_banked_questions(session, responses)
+    if questions is not None:
+        FOLLOW_UP_QUESTIONS.inc(source="bank")
+        return questions
+
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    courses = await get_relevant_courses(assistant_key, responses)
+    questions = await get_engine(session).generate_questions(session, responses, courses)
+    FOLLOW_UP_QUESTIONS.inc(source="generated")
+    if session.get("session_id"):
+        await _save_follow_up_questions(session["session_id"], fingerprint, questions)
+    return questions
+
+def start_follow_up_questions(session: dict) -> asyncio.Future:
+    """Start getting the follow-up questions for a session's current responses, and return the task.
+
+    A generation already in flight for the same responses is returned instead of starting another.
+    """
+    survey_responses = session.get("survey_responses", {}).get("responses", [])
+    if not survey_responses:
+        raise HTTPException(status_code=400, detail="No survey responses found")
+    fingerprint = response_fingerprint(survey_responses)
+    return _question_generations.start(
+        (session.get("session_id"), fingerprint), _load_or_generate_questions, session, survey_responses, fingerprint
+    )
+
+def cancel_follow_up_questions(task: asyncio.Future) -> bool:
+    """Cancel a follow-up question generation unless a request is waiting for it."""
+    return _question_generations.cancel(task)
+
+async def get_follow_up_questions(session: dict) -> list:
+    """Get follow-up questions for a session from the bank, generating them live for novel profiles.
+
+    Questions generated earlier for the same responses, e.g. speculatively right
+    after the initial survey was submitted, are returned or joined while in flight.
+    """
+    # Get all survey responses from the session
+    survey_responses = session.get("survey_responses", {}).get("responses", [])
+    if not survey_responses:
+        raise HTTPException(status_code=400, detail="No survey responses found")
+
+    fingerprint = response_fingerprint(survey_responses)
+    stored = session.get("follow_up_questions") or {}
+    if stored.get("fingerprint") == fingerprint:
+        FOLLOW_UP_QUESTIONS.inc(source="stored")
+        return stored["questions"]
+    key = (session.get("session_id"), fingerprint)
+    if _question_generations.in_flight(key):
+        FOLLOW_UP_QUESTIONS.inc(source="joined")
+    return await _question_generations.do(key, _load_or_generate_questions, session, survey_responses, fingerprint)
+
+def enumerate_profiles(student_type: str, limit: int = None, seed: int = 0) -> list:
+    """Enumerate the multiple-choice answer profiles for a survey, sampling if there are too many."""
+    questions = [question for question in SURVEY_TYPES[student_type] if not question.free_text]
+    combinations = itertools.product(*[question.options for question in questions])
+    profiles = [
+        [[question.id, answer] for question, answer in zip(questions, answers)]
+        for answers in combinations
+    ]
+    if limit is not None and len(profiles) > limit:
+        profiles = random.Random(seed).sample(profiles, limit)
+    return profiles
+
+def profile_to_responses(student_type: str, profile: list) -> list:
+    """Turn an answer profile back into survey responses for the assistant."""
+    questions = {question.id: question for question in SURVEY_TYPES[student_type]}
+    return [
+        {"question": questions[question_id].question, "answer": answer}
+        for question_id, answer in profile
+    ]
+
+async def build_question_bank(university_id: str, major_id: str, student_type: str,
+                              limit: int = None, concurrency: int = 4, overwrite: bool = False) -> int:
+    """Pre-generate follow-up questions for the answer profiles of one student type and major.
+
+    Questions are generated the way live sessions generate them, with the
+    major's engine and the courses retrieved for each profile.
+    """
+    # A session without an id, so the engine runs on one-off threads
+    session = {
+        "university_id": university_id,
+        "major_id": major_id,
+        "student_type": student_type,
+        "assistant_id": await get_or_create_assistant(university_id, major_id)
+    }
+    engine = get_engine(session)
+    version = get_question_bank_version(session)
+    assistant_key = get_assistant_key(university_id, major_id)
+    semaphore = asyncio.Semaphore(concurrency)
+    generated = 0
+
+    async def generate(profile: list) -> None:
+        nonlocal generated
+        key = question_bank_key(assistant_key, student_type, profile, version)
+        doc_ref = clients.db.collection(QUESTION_BANK_COLLECTION).document(key)
+        async with semaphore:
+            if not overwrite and (await doc_ref.get()).exists:
+                return
+            try:
+                responses = profile_to_responses(student_type, profile)
+                courses = await get_relevant_courses(assistant_key, responses)
+                questions = await engine.generate_questions(session, responses, courses)
+            except Exception as e:
+                logger.error(f"Failed to generate questions for profile {profile}: {str(e)}")
+                return
+            await doc_ref.set({
+                "university_id": university_id,
+                "major_id": major_id,
+                "student_type": student_type,
+                "profile": [answer for _, answer in profile],
+                "version": version,
+                "questions": questions,
+                "generated_at": datetime.utcnow().isoformat()
+            })
+            generated += 1
+
+    profiles = enumerate_profiles(student_type, limit)
+    logger.info(f"Building question bank for {assistant_key} ({student_type}, {version}): {len(profiles)} profiles")
+    await asyncio.gather(*[generate(profile) for profile in profiles])
+    return generated
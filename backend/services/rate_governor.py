@@ -0,0 +1,244 @@
+"""Adaptive rate governor for OpenAI calls.
+
+Every OpenAI request first takes one request and an estimated number of tokens
+from shared token buckets, and every assistant run holds a run slot while it is
+in flight. A 429 halves the shared rate and pauses all callers for the
+Retry-After period, after which the rate recovers gradually. With the SQLite
+backend the state lives in a local file, so all uvicorn workers on the host
+draw from the same budget.
+"""
+from config import (
+    logger,
+    OPENAI_GOVERNOR_BACKEND,
+    OPENAI_GOVERNOR_SQLITE_PATH,
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    OPENAI_MAX_CONCURRENT_RUNS,
+    OPENAI_MAX_RETRIES,
+)
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from services.metrics_service import Counter, STAGE_DURATION
+import asyncio
+import httpx
+import json
+import openai
+import random
+import sqlite3
+import time
+import uuid
+
+# Lowest fraction of the configured rate the governor slows down to after repeated 429s
+MIN_RATE_FACTOR = 0.1
+# Fraction of the configured rate regained per second without a 429
+RATE_RECOVERY_PER_SECOND = 0.01
+DEFAULT_RETRY_AFTER = 1.0
+MAX_RETRY_DELAY = 30.0
+
+OPENAI_THROTTLES = Counter("link_openai_throttles_total", "OpenAI calls rejected or retried by the rate governor", ("reason",))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for a prompt, about four characters per token."""
+    return len(text or "") // 4 + 1
+
+def _new_state(now: float) -> dict:
+    return {
+        "requests": float(OPENAI_REQUESTS_PER_MINUTE),
+        "tokens": float(OPENAI_TOKENS_PER_MINUTE),
+        "updated_at": now,
+        "factor": 1.0,
+        "paused_until": 0.0,
+        "runs": {}
+    }
+
+def _refill(state: dict, now: float) -> None:
+    elapsed = max(now - state["updated_at"], 0.0)
+    state["factor"] = min(1.0, state["factor"] + elapsed * RATE_RECOVERY_PER_SECOND)
+    state["requests"] = min(float(OPENAI_REQUESTS_PER_MINUTE), state["requests"] + elapsed * OPENAI_REQUESTS_PER_MINUTE / 60 * state["factor"])
+    state["tokens"] = min(float(OPENAI_TOKENS_PER_MINUTE), state["tokens"] + elapsed * OPENAI_TOKENS_PER_MINUTE / 60 * state["factor"])
+    state["updated_at"] = now
+
+def _take(state: dict, now: float, tokens: int) -> float:
+    """Take one request and the given tokens, or return how long to wait before trying again."""
+    _refill(state, now)
+    if state["paused_until"] > now:
+        return state["paused_until"] - now
+    # A single call larger than the whole bucket would otherwise wait forever
+    tokens = min(tokens, OPENAI_TOKENS_PER_MINUTE)
+    if state["requests"] >= 1 and state["tokens"] >= tokens:
+        state["requests"] -= 1
+        state["tokens"] -= tokens
+        return 0.0
+    request_wait = (1 - state["requests"]) / (OPENAI_REQUESTS_PER_MINUTE / 60 * state["factor"])
+    token_wait = (tokens - state["tokens"]) / (OPENAI_TOKENS_PER_MINUTE / 60 * state["factor"])
+    return max(request_wait, token_wait, 0.01)
+
+def _throttle(state: dict, now: float, retry_after: float) -> None:
+    _refill(state, now)
+    state["factor"] = max(MIN_RATE_FACTOR, state["factor"] / 2)
+    state["paused_until"] = max(state["paused_until"], now + retry_after)
+
+def _lease_run(state: dict, now: float, lease_id: str, ttl: float) -> bool:
+    # Leases expire so a crashed worker cannot hold slots forever
+    state["runs"] = {lease: expires_at for lease, expires_at in state["runs"].items() if expires_at > now}
+    if len(state["runs"]) >= OPENAI_MAX_CONCURRENT_RUNS:
+        return False
+    state["runs"][lease_id] = now + ttl
+    return True
+
+def _release_run(state: dict, now: float, lease_id: str) -> None:
+    state["runs"].pop(lease_id, None)
+
+def _snapshot(state: dict, now: float) -> dict:
+    _refill(state, now)
+    return {
+        "requests_available": round(state["requests"], 2),
+        "tokens_available": round(state["tokens"], 2),
+        "rate_factor": round(state["factor"], 3),
+        "paused_for_seconds": round(max(state["paused_until"] - now, 0.0), 2),
+        "active_runs": len([expires_at for expires_at in state["runs"].values() if expires_at > now])
+    }
+
+class InMemoryGovernorStore:
+    """Governor state for a single process."""
+
+    def __init__(self):
+        self.state = _new_state(time.time())
+
+    async def transact(self, fn, *args):
+        return fn(self.state, time.time(), *args)
+
+class SQLiteGovernorStore:
+    """Governor state in a local SQLite file shared by every worker process on the host."""
+
+    def __init__(self, path: str = OPENAI_GOVERNOR_SQLITE_PATH):
+        self.path = path
+        self._created = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        # The file and table are created on the first transaction, not when the store is built
+        if not self._created:
+            conn.execute("CREATE TABLE IF NOT EXISTS governor (id INTEGER PRIMARY KEY CHECK (id = 0), state TEXT NOT NULL)")
+            self._created = True
+        return conn
+
+    def _transact(self, fn, *args):
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front so read-modify-write is atomic across processes
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute("SELECT state FROM governor WHERE id = 0").fetchone()
+            state = json.loads(row[0]) if row else _new_state(now)
+            result = fn(state, now, *args)
+            conn.execute("INSERT OR REPLACE INTO governor (id, state) VALUES (0, ?)", (json.dumps(state),))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def transact(self, fn, *args):
+        return await asyncio.to_thread(self._transact, fn, *args)
+
+def _retry_after(error: openai.APIStatusError) -> float:
+    headers = error.response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return DEFAULT_RETRY_AFTER
+
+def _never_sent(error: openai.APIConnectionError) -> bool:
+    """Whether a connection error happened before the request reached the server."""
+    # The client raises APIConnectionError from the underlying httpx error
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+class RateGovernor:
+    """Token buckets, a concurrent run limit and adaptive 429 handling for OpenAI calls.
+
+    The store is built on first use, so importing the module touches no files.
+    """
+
+    def __init__(self, backend: str = OPENAI_GOVERNOR_BACKEND):
+        self.backend = backend
+        self._store = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = SQLiteGovernorStore() if self.backend == "sqlite" else InMemoryGovernorStore()
+        return self._store
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until the shared buckets hold one request and the given tokens."""
+        started_at = time.perf_counter()
+        while True:
+            wait = await self.store.transact(_take, tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait * random.uniform(1, 1.5))
+        STAGE_DURATION.observe(time.perf_counter() - started_at, stage="openai.governor_wait")
+
+    async def call(self, fn, *args, tokens: int = 0, idempotent: bool = True, **kwargs):
+        """Call an OpenAI client method under the governor, retrying rate limits and transient errors.
+
+        Calls that create something (threads, messages, runs, assistants) pass
+        idempotent=False. A timeout or 5xx does not tell whether the server
+        acted, so they are only retried when the request never left the client.
+        """
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            await self.acquire(tokens)
+            try:
+                return await fn(*args, **kwargs)
+            except openai.RateLimitError as e:
+                retry_after = _retry_after(e)
+                OPENAI_THROTTLES.inc(reason="rate_limited")
+                await self.store.transact(_throttle, retry_after)
+                if attempt == OPENAI_MAX_RETRIES:
+                    raise HTTPException(
+                        status_code=503,
+                        detail="OpenAI rate limit reached, please retry shortly",
+                        headers={"Retry-After": str(max(int(retry_after), 1))}
+                    )
+                logger.warning(f"OpenAI rate limited, pausing {retry_after:.1f}s (attempt {attempt + 1})")
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                retryable = idempotent or (isinstance(e, openai.APIConnectionError) and _never_sent(e))
+                if attempt == OPENAI_MAX_RETRIES or not retryable:
+                    raise
+                OPENAI_THROTTLES.inc(reason="transient_error")
+                delay = min(DEFAULT_RETRY_AFTER * 2 ** attempt, MAX_RETRY_DELAY)
+                logger.warning(f"OpenAI call failed ({str(e)}), retrying in up to {delay:.1f}s")
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    @asynccontextmanager
+    async def run_slot(self, timeout: float):
+        """Hold one of the shared concurrent run slots for the duration of the block."""
+        lease_id = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        delay = 0.05
+        while not await self.store.transact(_lease_run, lease_id, timeout + 30):
+            if loop.time() - started_at > timeout:
+                OPENAI_THROTTLES.inc(reason="run_slots_exhausted")
+                raise HTTPException(status_code=503, detail="Too many generations in progress, please retry shortly", headers={"Retry-After": "5"})
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            delay = min(delay * 2, 1.0)
+        STAGE_DURATION.observe(loop.time() - started_at, stage="openai.run_slot_wait")
+        try:
+            yield
+        finally:
+            # Release even when the run was cancelled, the lease would otherwise linger until it expires
+            await asyncio.shield(self.store.transact(_release_run, lease_id))
+
+    async def get_stats(self) -> dict:
+        return await self.store.transact(_snapshot)
+
+rate_governor = RateGovernor()
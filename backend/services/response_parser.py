@@ -0,0 +1,215 @@
+"""Schema validated parsing of generated questionnaires and learning paths.
+
+The first balanced JSON value is located in the model output, so commentary
+or code fences around it do not matter, and a truncated array still yields its
+complete items. Every item is then validated on its own against a pydantic
+model: items that fail are repaired where the fix is unambiguous and dropped
+otherwise, so one bad item no longer fails the whole response.
+"""
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import List, Optional, Union
+from services.json_stream import JsonArrayStreamParser
+from services.metrics_service import PARSE_OUTCOMES
+from config import logger
+import json
+import re
+
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+
+class Question(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    id: int
+    question: str = Field(min_length=1)
+    options: List[str]
+    freeText: bool
+
+class LearningPathStep(BaseModel):
+    # Unknown fields are kept, the prompt and the frontend evolve independently
+    model_config = ConfigDict(extra="allow", str_strip_whitespace=True)
+
+    title: str = Field(min_length=1)
+    description: str
+    estimated_time: Optional[str] = None
+    match_percentage: Optional[float] = None
+    public_reviews: List[str] = []
+    professor_reviews: List[str] = []
+    resources: Optional[list] = None
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _repair_question(item: dict, position: int) -> dict:
+    item = dict(item)
+    if "question" not in item and "text" in item:
+        item["question"] = item["text"]
+    item.setdefault("id", position + 1)
+    item["options"] = [str(option) for option in _as_list(item.get("options")) if str(option).strip()]
+    # A question without options can only be answered in free text
+    if not isinstance(item.get("freeText"), bool) or not item["options"]:
+        item["freeText"] = not item["options"]
+    return item
+
+def _repair_learning_path_step(item: dict, position: int) -> dict:
+    item = dict(item)
+    if "title" not in item:
+        item["title"] = item.get("course") or item.get("name")
+    if not isinstance(item.get("description"), str):
+        item["description"] = str(item.get("description") or "")
+    if item.get("estimated_time") is not None:
+        item["estimated_time"] = str(item["estimated_time"])
+    if isinstance(item.get("match_percentage"), str):
+        item["match_percentage"] = item["match_percentage"].strip().rstrip("%") or None
+    for field in ("public_reviews", "professor_reviews"):
+        item[field] = [str(review) for review in _as_list(item.get(field))]
+    if "resources" in item:
+        item["resources"] = _as_list(item["resources"])
+    return item
+
+class ParseReport:
+    """Counts of valid, repaired and dropped items for one generated response."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.valid = 0
+        self.repaired = 0
+        self.dropped = 0
+
+    @property
+    def outcome(self) -> str:
+        if not self.valid and not self.repaired:
+            return "failed"
+        if self.dropped:
+            return "partial"
+        return "repaired" if self.repaired else "ok"
+
+    def record(self) -> str:
+        outcome = self.outcome
+        PARSE_OUTCOMES.inc(kind=self.kind, outcome=outcome)
+        if outcome != "ok":
+            logger.warning(f"Parsed {self.kind} {outcome}: {self.valid} valid, {self.repaired} repaired, {self.dropped} dropped")
+        return outcome
+
+class ItemValidator:
+    """Validate items one at a time, repairing or dropping the invalid ones."""
+
+    def __init__(self, model, repair, kind: str):
+        self.model = model
+        self.repair = repair
+        self.report = ParseReport(kind)
+
+    def validate(self, item) -> Optional[dict]:
+        position = self.report.valid + self.report.repaired + self.report.dropped
+        if not isinstance(item, dict):
+            self.report.dropped += 1
+            return None
+        try:
+            validated = self.model.model_validate(item)
+            self.report.valid += 1
+        except ValidationError:
+            try:
+                validated = self.model.model_validate(self.repair(item, position))
+                self.report.repaired += 1
+            except ValidationError as e:
+                logger.warning(f"Dropping invalid {self.report.kind} item: {e.errors()[0]['msg']}")
+                self.report.dropped += 1
+                return None
+        return validated.model_dump(exclude_none=True)
+
+def question_validator(kind: str = "questions") -> ItemValidator:
+    return ItemValidator(Question, _repair_question, kind)
+
+def learning_path_step_validator(kind: str = "learning_path") -> ItemValidator:
+    return ItemValidator(LearningPathStep, _repair_learning_path_step, kind)
+
+def _balanced_end(text: str, start: int) -> int:
+    """Return the index just past the value opened at start, or -1 if it never closes."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for position in range(start, len(text)):
+        char = text[position]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return -1
+
+def extract_json(text: str):
+    """Return the first balanced JSON object or array in the text, or None."""
+    start = 0
+    while True:
+        starts = [position for position in (text.find('{', start), text.find('[', start)) if position != -1]
+        if not starts:
+            return None
+        start = min(starts)
+        end = _balanced_end(text, start)
+        if end == -1:
+            return None
+        candidate = text[start:end]
+        for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+            try:
+                return json.loads(attempt)
+            except json.JSONDecodeError:
+                continue
+        start += 1
+
+def _find_items(value, key: str) -> Optional[list]:
+    """Find the list of items in a decoded response, however it was wrapped."""
+    if isinstance(value, list):
+        # Flatten one level of nesting, e.g. steps grouped into per-semester arrays
+        if value and all(isinstance(item, list) for item in value):
+            return [item for group in value for item in group]
+        return value
+    if isinstance(value, dict):
+        if isinstance(value.get(key), list):
+            return value[key]
+        for nested in value.values():
+            if isinstance(nested, list) and any(isinstance(item, dict) for item in nested):
+                return nested
+    return None
+
+def _decode_items(response: Union[str, dict, list], key: str) -> list:
+    if not isinstance(response, str):
+        return _find_items(response, key) or []
+    items = _find_items(extract_json(response), key)
+    if items is None:
+        # A response cut off mid-array still holds every item completed before the cut
+        items = JsonArrayStreamParser().feed(response)
+    return items
+
+def _parse(response: Union[str, dict, list], key: str, validator: ItemValidator) -> list:
+    items = [validator.validate(item) for item in _decode_items(response, key)]
+    validator.report.record()
+    return [item for item in items if item is not None]
+
+def parse_questions(response: Union[str, dict, list], kind: str = "questions") -> list:
+    """Parse generated questions, returning an empty list if nothing is salvageable."""
+    questions = _parse(response, "questions", question_validator(kind))
+    # Repaired ids may collide with generated ones, the frontend keys questions by id
+    if len({question["id"] for question in questions}) != len(questions):
+        for position, question in enumerate(questions):
+            question["id"] = position + 1
+    return questions
+
+def parse_learning_path(response: Union[str, dict, list], kind: str = "learning_path") -> list:
+    """Parse a generated learning path, returning an empty list if nothing is salvageable."""
+    return _parse(response, "learning_path", learning_path_step_validator(kind))
+
+def build_fix_json_prompt(kind: str) -> str:
+    """Ask the model to restate its last reply as valid JSON."""
+    shape = '{"questions": [...]}' if kind == "questions" else "a JSON array of learning path steps"
+    return f"""Your previous reply could not be parsed. Reply again with only {shape}, as valid JSON with the fields requested earlier, and no other text."""
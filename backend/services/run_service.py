@@ -0,0 +1,230 @@
+from config import (
+    clients,
+    logger,
+    RUN_DEADLINE_SECONDS,
+    RUN_POLL_INITIAL_DELAY,
+    RUN_POLL_MAX_DELAY,
+    RUN_STREAMING_ENABLED,
+    OPENAI_RUN_TOKEN_ESTIMATE,
+)
+from fastapi import HTTPException
+from services.rate_governor import rate_governor
+from services.metrics_service import timed, record_token_usage, RUN_POLLS, RUN_RETRIES, RUN_OUTCOMES, STAGE_DURATION
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import random
+
+TERMINAL_STATES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+ACTIVE_STATES = {"queued", "in_progress", "cancelling"}
+
+# Token usage accumulator for the runs made in the current context, see track_run_usage
+_run_usage = contextvars.ContextVar("run_usage", default=None)
+
+@contextmanager
+def track_run_usage():
+    """Collect the token usage of every run completed inside the block."""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    token = _run_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _run_usage.reset(token)
+
+def _record_usage(run) -> None:
+    usage = _run_usage.get()
+    if usage is None or not getattr(run, "usage", None):
+        return
+    usage["prompt_tokens"] += run.usage.prompt_tokens
+    usage["completion_tokens"] += run.usage.completion_tokens
+    usage["total_tokens"] += run.usage.total_tokens
+
+def _check_run(run):
+    """Raise if a finished run did not complete successfully."""
+    RUN_OUTCOMES.inc(status=run.status)
+    if run.status == "completed":
+        _record_usage(run)
+        record_token_usage("assistants", getattr(run, "usage", None))
+        return run
+    if run.status == "requires_action":
+        # Our assistants have no function tools, so there is nothing we can submit
+        raise HTTPException(status_code=500, detail="Assistant run requires an action that is not supported")
+    logger.error(f"Run {run.id} ended with status {run.status}: {run.last_error}")
+    raise HTTPException(status_code=500, detail=f"Run failed with status: {run.status}")
+
+async def _poll_run(thread_id: str, run_id: str):
+    """Poll a run with jittered exponential backoff until it reaches a terminal state."""
+    delay = RUN_POLL_INITIAL_DELAY
+    while True:
+        RUN_POLLS.inc()
+        run = await rate_governor.call(clients.openai.beta.threads.runs.retrieve, thread_id=thread_id, run_id=run_id)
+        if run.status in TERMINAL_STATES:
+            return run
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+        delay = min(delay * 2, RUN_POLL_MAX_DELAY)
+
+async def _stream_run(thread_id: str, assistant_id: str, state: dict, run_options: dict):
+    """Create a streaming run and wait for its terminal event, polling if the stream drops."""
+    stream = await rate_governor.call(
+        clients.openai.beta.threads.runs.create,
+        tokens=OPENAI_RUN_TOKEN_ESTIMATE,
+        idempotent=False,
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        stream=True,
+        **run_options
+    )
+    # Closing the stream releases its HTTP connection when we return before the stream ends
+    async with stream:
+        async for event in stream:
+            if not event.event.startswith("thread.run.") or event.event.startswith("thread.run.step"):
+                continue
+            state["run_id"] = event.data.id
+            if event.data.status in TERMINAL_STATES:
+                return event.data
+
+    if "run_id" not in state:
+        # No run event arrived, a run created before the stream broke is the thread's active run
+        run = await _active_run(thread_id)
+        if run is None:
+            raise HTTPException(status_code=500, detail="Assistant run stream ended without a run")
+        state["run_id"] = run.id
+
+    # The stream ended without a terminal event, fall back to polling the run
+    logger.warning(f"Run stream for thread {thread_id} ended early, falling back to polling")
+    RUN_RETRIES.inc(reason="stream_ended")
+    return await _poll_run(thread_id, state["run_id"])
+
+async def _active_run(thread_id: str):
+    """Get the run in progress on a thread, or None."""
+    runs = await rate_governor.call(clients.openai.beta.threads.runs.list, thread_id=thread_id, limit=1, order="desc")
+    return next((run for run in runs.data if run.status in ACTIVE_STATES), None)
+
+async def _create_and_poll_run(thread_id: str, assistant_id: str, state: dict, run_options: dict):
+    """Create a run and poll it until it reaches a terminal state."""
+    run = await rate_governor.call(
+        clients.openai.beta.threads.runs.create,
+        tokens=OPENAI_RUN_TOKEN_ESTIMATE,
+        idempotent=False,
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        **run_options
+    )
+    state["run_id"] = run.id
+    return await _poll_run(thread_id, run.id)
+
+async def _wait(thread_id: str, assistant_id: str, state: dict, run_options: dict):
+    if RUN_STREAMING_ENABLED:
+        try:
+            return await _stream_run(thread_id, assistant_id, state, run_options)
+        except HTTPException as he:
+            # Rate governor rejections are not a streaming problem, polling would only queue again
+            raise he
+        except Exception as e:
+            if "run_id" in state:
+                logger.warning(f"Run stream failed ({str(e)}), polling run {state['run_id']}")
+                RUN_RETRIES.inc(reason="stream_failed")
+                return await _poll_run(thread_id, state["run_id"])
+            # The stream may have failed after the run was created, and a thread takes one active run at a time
+            run = await _active_run(thread_id)
+            if run is not None:
+                logger.warning(f"Run stream failed ({str(e)}) before its run id arrived, polling active run {run.id}")
+                RUN_RETRIES.inc(reason="stream_failed")
+                state["run_id"] = run.id
+                return await _poll_run(thread_id, run.id)
+            logger.warning(f"Streaming run unavailable ({str(e)}), falling back to polling")
+            RUN_RETRIES.inc(reason="stream_unavailable")
+    return await _create_and_poll_run(thread_id, assistant_id, state, run_options)
+
+async def run_assistant(thread_id: str, assistant_id: str, deadline: float = None, **run_options):
+    """Run the assistant on a thread and wait for the run to complete.
+
+    Streaming run events are used when available, otherwise the run is polled
+    with jittered exponential backoff. Runs that exceed the deadline are cancelled.
+    Each run holds one of the rate governor's concurrent run slots.
+    Extra keyword arguments are passed to the run, e.g. tools overrides.
+    """
+    deadline = deadline or RUN_DEADLINE_SECONDS
+    state = {}
+    async with rate_governor.run_slot(deadline):
+        try:
+            with timed("openai.run"):
+                run = await asyncio.wait_for(_wait(thread_id, assistant_id, state, run_options), timeout=deadline)
+        except asyncio.TimeoutError:
+            logger.error(f"Run on thread {thread_id} exceeded the {deadline}s deadline")
+            if "run_id" in state:
+                await _cancel_run(thread_id, state["run_id"])
+            raise HTTPException(status_code=504, detail="Assistant run timed out")
+
+        if run.status == "requires_action":
+            await _cancel_run(thread_id, run.id)
+    return _check_run(run)
+
+async def _cancel_run(thread_id: str, run_id: str) -> None:
+    try:
+        await rate_governor.call(clients.openai.beta.threads.runs.cancel, thread_id=thread_id, run_id=run_id)
+    except Exception as e:
+        logger.warning(f"Failed to cancel run {run_id}: {str(e)}")
+
+async def stream_run_text(thread_id: str, assistant_id: str, deadline: float = None, **run_options):
+    """Run the assistant on a thread and yield message text deltas as they arrive."""
+    deadline = deadline or RUN_DEADLINE_SECONDS
+    async with rate_governor.run_slot(deadline):
+        async for text in _stream_run_text(thread_id, assistant_id, deadline, run_options):
+            yield text
+
+async def _stream_run_text(thread_id: str, assistant_id: str, deadline: float, run_options: dict):
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    expires_at = started_at + deadline
+    run_id = None
+    first_token = True
+
+    stream = await rate_governor.call(
+        clients.openai.beta.threads.runs.create,
+        tokens=OPENAI_RUN_TOKEN_ESTIMATE,
+        idempotent=False,
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        stream=True,
+        **run_options
+    )
+    # Closed on every exit, including a client disconnect that closes this generator mid-stream
+    async with stream:
+        events = stream.__aiter__()
+        while True:
+            try:
+                event = await asyncio.wait_for(events.__anext__(), timeout=max(expires_at - loop.time(), 0))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                logger.error(f"Run stream on thread {thread_id} exceeded the {deadline}s deadline")
+                if run_id:
+                    await _cancel_run(thread_id, run_id)
+                raise HTTPException(status_code=504, detail="Assistant run timed out")
+
+            if event.event == "thread.message.delta":
+                for part in event.data.delta.content or []:
+                    if part.type == "text" and part.text and part.text.value:
+                        if first_token:
+                            STAGE_DURATION.observe(loop.time() - started_at, stage="openai.run_stream_first_token")
+                            first_token = False
+                        yield part.text.value
+            elif event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step"):
+                run_id = event.data.id
+                if event.data.status in TERMINAL_STATES:
+                    if event.data.status == "requires_action":
+                        await _cancel_run(thread_id, run_id)
+                    _check_run(event.data)
+                    return
+
+    if run_id is None:
+        raise HTTPException(status_code=500, detail="Assistant run stream ended without a run")
+    # The stream ended without a terminal event, fall back to polling the run
+    RUN_RETRIES.inc(reason="stream_ended")
+    try:
+        run = await asyncio.wait_for(_poll_run(thread_id, run_id), timeout=max(expires_at - loop.time(), 0))
+    except asyncio.TimeoutError:
+        await _cancel_run(thread_id, run_id)
+        raise HTTPException(status_code=504, detail="Assistant run timed out")
+    _check_run(run)
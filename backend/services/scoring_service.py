@@ -0,0 +1,161 @@
+"""Deterministic course match scoring.
+
+Survey answers from the fixed option sets in data/surveys.py are mapped onto a
+feature vector, and every catalog course is scored against it with one matrix
+product. Catalog records describe themselves with optional attributes:
+
+    {
+        "code": "CS 61A",
+        "attributes": {
+            "assessment": ["projects", "exams"],
+            "class_size": "large",
+            "workload": "heavy",
+            "professor_style": ["structured", "challenging"],
+            "format": ["lecture", "hands_on"],
+            "collaboration": ["group"]
+        },
+        "review_sentiment": 0.6
+    }
+
+review_sentiment ranges from -1 (negative) to 1 (positive).
+"""
+from services.course_index_service import get_course_index, find_course_code
+import numpy as np
+
+FEATURES = [
+    "assessment_quizzes", "assessment_exams", "assessment_projects", "assessment_papers", "assessment_presentations",
+    "class_size_small", "class_size_medium", "class_size_large",
+    "workload_light", "workload_moderate", "workload_heavy",
+    "professor_supportive", "professor_structured", "professor_flexible", "professor_challenging", "professor_entertaining",
+    "format_lecture", "format_discussion", "format_hands_on", "format_online",
+    "collaboration_group", "collaboration_individual",
+    "review_sentiment",
+]
+FEATURE_INDEX = {feature: i for i, feature in enumerate(FEATURES)}
+
+# Feature weights for every fixed option in the initial surveys
+OPTION_FEATURES = {
+    # Learning style
+    "Visual": {"format_lecture": 0.5, "format_hands_on": 0.5},
+    "Auditory": {"format_lecture": 1.0, "format_discussion": 0.5},
+    "Reading/Writing": {"assessment_papers": 0.5, "format_online": 0.5},
+    "Kinesthetic": {"format_hands_on": 1.0, "assessment_projects": 0.5},
+    # Collaboration
+    "In groups": {"collaboration_group": 1.0},
+    "Individually": {"collaboration_individual": 1.0},
+    "Team projects": {"collaboration_group": 1.0, "assessment_projects": 0.5},
+    "Individual work": {"collaboration_individual": 1.0},
+    "Regularly": {"collaboration_group": 1.0},
+    "Sometimes": {"collaboration_group": 0.5, "collaboration_individual": 0.5},
+    "Rarely or never": {"collaboration_individual": 1.0},
+    # Assessment
+    "Quizzes": {"assessment_quizzes": 1.0},
+    "Exams": {"assessment_exams": 1.0},
+    "Projects": {"assessment_projects": 1.0},
+    "Presentations": {"assessment_presentations": 1.0},
+    "Research papers": {"assessment_papers": 1.0},
+    "Major projects": {"assessment_projects": 1.0},
+    "Frequent low-stakes quizzes": {"assessment_quizzes": 1.0, "workload_moderate": 0.5},
+    "A few big exams": {"assessment_exams": 1.0},
+    "Research papers or essays": {"assessment_papers": 1.0},
+    # Professor style
+    "Supportive and approachable": {"professor_supportive": 1.0},
+    "Clear, structured, and organized": {"professor_structured": 1.0},
+    "Flexible and laid-back": {"professor_flexible": 1.0, "workload_light": 0.5},
+    "Challenging but fair": {"professor_challenging": 1.0, "workload_heavy": 0.5},
+    "Funny or entertaining": {"professor_entertaining": 1.0},
+    # Learning environment
+    "Lecture-based": {"format_lecture": 1.0},
+    "Discussion-based": {"format_discussion": 1.0, "class_size_small": 0.5},
+    "Hands-on": {"format_hands_on": 1.0},
+    "Online/Asynchronous": {"format_online": 1.0},
+    # Class size
+    "Small (fewer than 25 students)": {"class_size_small": 1.0},
+    "Medium (25–75 students)": {"class_size_medium": 1.0},
+    "Large (75+ students)": {"class_size_large": 1.0},
+    # Motivation
+    "Grades": {"workload_light": 0.5, "professor_structured": 0.5},
+    "Getting good grades": {"workload_light": 0.5, "professor_structured": 0.5},
+    "Personal growth": {"professor_challenging": 0.5},
+    "Career goals": {"assessment_projects": 0.5, "format_hands_on": 0.5},
+    "Support from others": {"professor_supportive": 0.5, "collaboration_group": 0.5},
+    "Peers and social motivation": {"collaboration_group": 1.0},
+    "Passion for the subject": {"professor_challenging": 0.5, "workload_heavy": 0.5},
+    "Genuine interest in the subject": {"professor_challenging": 0.5, "workload_heavy": 0.5},
+}
+
+# Every student is assumed to prefer well-reviewed courses
+REVIEW_SENTIMENT_WEIGHT = 1.0
+
+# Course feature matrices, keyed by assistant key and index version
+_course_matrices = {}
+
+def student_vector(responses: list) -> np.ndarray:
+    """Build a student's preference vector from their fixed-option answers."""
+    vector = np.zeros(len(FEATURES), dtype=np.float32)
+    vector[FEATURE_INDEX["review_sentiment"]] = REVIEW_SENTIMENT_WEIGHT
+    for response in responses:
+        # Answers are single options, some of which contain commas themselves
+        for feature, weight in OPTION_FEATURES.get(" ".join(str(response['answer']).split()), {}).items():
+            vector[FEATURE_INDEX[feature]] += weight
+    return vector
+
+def course_vector(course: dict) -> np.ndarray:
+    """Build a course's feature vector from its catalog attributes, each in [0, 1]."""
+    vector = np.zeros(len(FEATURES), dtype=np.float32)
+    attributes = course.get("attributes", {})
+    for group in ("assessment", "professor_style", "format", "collaboration"):
+        prefix = "professor" if group == "professor_style" else group
+        values = attributes.get(group, [])
+        for value in [values] if isinstance(values, str) else values:
+            feature = f"{prefix}_{value}"
+            if feature in FEATURE_INDEX:
+                vector[FEATURE_INDEX[feature]] = 1.0
+    for group in ("class_size", "workload"):
+        feature = f"{group}_{attributes.get(group)}"
+        if feature in FEATURE_INDEX:
+            vector[FEATURE_INDEX[feature]] = 1.0
+    sentiment = float(course.get("review_sentiment", 0.0))
+    vector[FEATURE_INDEX["review_sentiment"]] = (min(max(sentiment, -1.0), 1.0) + 1) / 2
+    return vector
+
+def get_course_matrix(assistant_key: str, index=None):
+    """Get the feature matrix of every course in a catalog, or None without an index.
+
+    Pass the index the caller already loaded so the matrix rows line up with
+    its courses even if a rebuild is published in between.
+    """
+    if index is None:
+        index = get_course_index(assistant_key)
+    if index is None:
+        return None
+    cache_key = (assistant_key, index.version)
+    if cache_key not in _course_matrices:
+        _course_matrices[cache_key] = np.stack([course_vector(course) for course in index.courses])
+    return _course_matrices[cache_key]
+
+def score_catalog(assistant_key: str, responses: list, index=None):
+    """Score every catalog course against the student's answers, as match percentages."""
+    matrix = get_course_matrix(assistant_key, index)
+    if matrix is None:
+        return None
+    preferences = student_vector(responses)
+    return np.rint(100 * (matrix @ preferences) / preferences.sum()).astype(int)
+
+def rank_courses(assistant_key: str, responses: list, courses: list, limit: int, index=None) -> list:
+    """Attach match percentages to candidate courses and keep the best-scoring ones."""
+    scores = score_catalog(assistant_key, responses, index)
+    if scores is None:
+        return courses[:limit]
+    ranked = [{**course, "match_percentage": int(scores[course["course_index"]])} for course in courses]
+    ranked.sort(key=lambda course: course["match_percentage"], reverse=True)
+    return ranked[:limit]
+
+def apply_match_percentage(step: dict, courses: list) -> dict:
+    """Replace a step's match percentage with the computed score of the course it covers."""
+    step.pop("match_percentage", None)
+    scored = {course["code"]: course for course in courses or [] if course.get("code") and "match_percentage" in course}
+    code = find_course_code(step.get("title", ""), scored)
+    if code is not None:
+        step["match_percentage"] = scored[code]["match_percentage"]
+    return step
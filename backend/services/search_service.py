@@ -0,0 +1,134 @@
+from config import logger, SEARCH_MIN_SCORE, SEARCH_MIN_RESULTS, SEARCH_MAX_RESULTS
+from collections import Counter
+from services.assistant_service import get_assistant_key
+from services.course_index_service import get_course_index, find_course_code
+from services.scoring_service import score_catalog
+import math
+import re
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Steps of the student's own path rank above catalog courses with the same text score
+PATH_STEP_BOOST = 1.5
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "with", "course", "courses", "class", "classes"
+}
+
+# Tokenized catalog courses, keyed by assistant key and index version
+_catalog_tokens = {}
+
+def tokenize(text: str) -> list:
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+def step_text(step: dict) -> str:
+    """Get the searchable text of a learning path step or catalog course."""
+    parts = [
+        step.get("title", ""),
+        step.get("code", ""),
+        step.get("description", ""),
+        " ".join(step.get("topics", [])),
+        " ".join(step.get("public_reviews", [])),
+        " ".join(step.get("professor_reviews", []))
+    ]
+    return " ".join(part for part in parts if part)
+
+class BM25Index:
+    """Okapi BM25 inverted index over a small set of tokenized documents."""
+
+    def __init__(self, documents: list):
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0.0
+        self.postings = {}
+        for doc_id, document in enumerate(documents):
+            for term, frequency in Counter(document).items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+        self.idf = {
+            term: math.log(1 + (len(documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def score(self, query: list) -> dict:
+        """Score the documents containing any query term."""
+        scores = {}
+        for term in set(query):
+            for doc_id, frequency in self.postings.get(term, []):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / self.average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + self.idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+def _catalog_documents(assistant_key: str, index=None):
+    if index is None:
+        index = get_course_index(assistant_key)
+    if index is None:
+        return [], []
+    cache_key = (assistant_key, index.version)
+    if cache_key not in _catalog_tokens:
+        _catalog_tokens[cache_key] = [tokenize(step_text(course)) for course in index.courses]
+    return index.courses, _catalog_tokens[cache_key]
+
+def warm_catalog(assistant_key: str, index=None) -> int:
+    """Tokenize a catalog ahead of its first search, returning its number of courses."""
+    courses, _ = _catalog_documents(assistant_key, index)
+    return len(courses)
+
+def _course_to_step(course: dict, match_percentage: int = None) -> dict:
+    step = {
+        "title": f"{course.get('code', '')} {course.get('title', '')}".strip(),
+        "description": course.get("description", ""),
+        "public_reviews": course.get("public_reviews", []),
+        "professor_reviews": course.get("professor_reviews", [])
+    }
+    if match_percentage is not None:
+        step["match_percentage"] = match_percentage
+    return step
+
+def search_learning_path(session: dict, responses: list, search_query: str):
+    """Re-rank the session's stored path and its major's catalog for a search query.
+
+    Returns None when the local results are not relevant enough, so the caller
+    should regenerate the path with the search focus instead.
+    """
+    learning_path = session.get("learning_path") or []
+    query = tokenize(search_query)
+    if not query:
+        return None
+
+    assistant_key = get_assistant_key(session["university_id"], session["major_id"])
+    index = get_course_index(assistant_key)
+    catalog, catalog_tokens = _catalog_documents(assistant_key, index)
+
+    # Skip catalog courses the stored path already covers
+    codes = [course["code"] for course in catalog if course.get("code")]
+    covered = {find_course_code(step.get("title", ""), codes) for step in learning_path}
+    catalog_ids = [i for i, course in enumerate(catalog) if not course.get("code") or course["code"] not in covered]
+
+    documents = [tokenize(step_text(step)) for step in learning_path] + [catalog_tokens[i] for i in catalog_ids]
+    if not documents:
+        return None
+    scores = BM25Index(documents).score(query)
+
+    ranked = []
+    for doc_id, score in scores.items():
+        if doc_id < len(learning_path):
+            ranked.append((score * PATH_STEP_BOOST, doc_id))
+        else:
+            ranked.append((score, doc_id))
+    ranked = [(score, doc_id) for score, doc_id in sorted(ranked, reverse=True) if score >= SEARCH_MIN_SCORE]
+
+    if len(ranked) < SEARCH_MIN_RESULTS:
+        logger.info(f"Local search for '{search_query}' found {len(ranked)} relevant results, regenerating")
+        return None
+
+    match_scores = score_catalog(assistant_key, responses, index) if len(catalog_ids) else None
+    results = []
+    for _, doc_id in ranked[:SEARCH_MAX_RESULTS]:
+        if doc_id < len(learning_path):
+            results.append(learning_path[doc_id])
+        else:
+            course_id = catalog_ids[doc_id - len(learning_path)]
+            match = int(match_scores[course_id]) if match_scores is not None else None
+            results.append(_course_to_step(catalog[course_id], match))
+    return results
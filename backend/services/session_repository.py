@@ -0,0 +1,370 @@
+"""Session repository, which owns every read and write of session documents.
+
+Active sessions are kept in memory, so reads during a session are served
+locally. Updates are applied to the in-memory copy at once and queued, then
+committed in batches every SESSION_FLUSH_INTERVAL_SECONDS, sooner once
+SESSION_FLUSH_BATCH_SIZE sessions have queued updates, and on shutdown. Writes
+a client must not lose, session creation and survey answers, are committed
+before the call returns. A periodic compaction archives or deletes sessions
+that have not been updated for SESSION_TTL_DAYS.
+"""
+from config import (
+    clients,
+    logger,
+    SESSION_BACKEND,
+    SESSION_CACHE_SIZE,
+    SESSION_HOT_TTL_SECONDS,
+    SESSION_FLUSH_INTERVAL_SECONDS,
+    SESSION_FLUSH_BATCH_SIZE,
+    SESSION_TTL_DAYS,
+    SESSION_COMPACTION_INTERVAL_SECONDS,
+    SESSION_COMPACTION_ACTION,
+    SESSION_COMPACTION_ACTIONS,
+)
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from services.metrics_service import timed, SESSION_WRITES, SESSION_COMMITS, SESSIONS_COMPACTED
+import asyncio
+import copy
+import time
+import uuid
+
+# Firestore accepts at most this many writes per batch
+FIRESTORE_BATCH_LIMIT = 500
+
+def apply_update(data: dict, path: str, value) -> None:
+    """Apply one Firestore update field, including transforms, to a session dict."""
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    field = parts[-1]
+    if value is firestore.DELETE_FIELD:
+        data.pop(field, None)
+    elif isinstance(value, firestore.ArrayUnion):
+        current = data.setdefault(field, [])
+        current.extend(copy.deepcopy(item) for item in value.values if item not in current)
+    elif isinstance(value, firestore.Increment):
+        data[field] = data.get(field, 0) + value.value
+    else:
+        data[field] = copy.deepcopy(value)
+
+def merge_fields(earlier: dict, later: dict) -> dict:
+    """Merge two updates into one with the same effect as applying them in order."""
+    merged = dict(earlier)
+    for path, value in later.items():
+        parent = next((queued for queued in merged if path.startswith(queued + ".")), None)
+        if parent is not None:
+            # Firestore rejects a field and its parent in one update, so fold the field into the parent
+            container = copy.deepcopy(merged[parent]) if isinstance(merged[parent], dict) else {}
+            apply_update(container, path[len(parent) + 1:], value)
+            merged[parent] = container
+            continue
+        for child in [queued for queued in merged if queued.startswith(path + ".")]:
+            del merged[child]
+        previous = merged.get(path)
+        if isinstance(previous, firestore.ArrayUnion) and isinstance(value, firestore.ArrayUnion):
+            merged[path] = firestore.ArrayUnion(list(previous.values) + [item for item in value.values if item not in previous.values])
+        elif isinstance(previous, firestore.Increment) and isinstance(value, firestore.Increment):
+            merged[path] = firestore.Increment(previous.value + value.value)
+        else:
+            merged[path] = value
+    return merged
+
+class InMemorySessionStore:
+    """Session store kept in process memory, used for tests and local runs."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.archived = {}
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex[:20]
+
+    async def get(self, session_id: str):
+        data = self.sessions.get(session_id)
+        return copy.deepcopy(data) if data is not None else None
+
+    async def commit(self, writes: list) -> None:
+        # Check every write first, so a failed commit changes nothing, like a Firestore batch
+        for session_id, _, create in writes:
+            if not create and session_id not in self.sessions:
+                raise NotFound(f"No document to update: sessions/{session_id}")
+        for session_id, fields, create in writes:
+            if create:
+                self.sessions[session_id] = copy.deepcopy(fields)
+                continue
+            for path, value in fields.items():
+                apply_update(self.sessions[session_id], path, value)
+
+    async def list_stale(self, cutoff: str, limit: int) -> list:
+        stale = [(session_id, data) for session_id, data in self.sessions.items() if data.get("updated_at", "") < cutoff]
+        return copy.deepcopy(stale[:limit])
+
+    async def remove(self, sessions: list, archive: bool) -> None:
+        for session_id, data in sessions:
+            if archive:
+                self.archived[session_id] = data
+            self.sessions.pop(session_id, None)
+
+class FirestoreSessionStore:
+    """Durable session store backed by the sessions collection."""
+
+    def __init__(self, collection: str = "sessions", archive_collection: str = "sessions_archive"):
+        self.collection = collection
+        self.archive_collection = archive_collection
+
+    def new_id(self) -> str:
+        # Firestore generates document ids client side
+        return clients.db.collection(self.collection).document().id
+
+    async def get(self, session_id: str):
+        doc = await clients.db.collection(self.collection).document(session_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    async def commit(self, writes: list) -> None:
+        for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+            batch = clients.db.batch()
+            for session_id, fields, create in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                doc_ref = clients.db.collection(self.collection).document(session_id)
+                if create:
+                    batch.set(doc_ref, fields)
+                else:
+                    batch.update(doc_ref, fields)
+            await batch.commit()
+
+    async def list_stale(self, cutoff: str, limit: int) -> list:
+        query = clients.db.collection(self.collection).where("updated_at", "<", cutoff).limit(limit)
+        return [(doc.id, doc.to_dict()) async for doc in query.stream()]
+
+    async def remove(self, sessions: list, archive: bool) -> None:
+        archived_at = datetime.utcnow().isoformat()
+        # Archiving takes two writes per session
+        chunk = FIRESTORE_BATCH_LIMIT // 2
+        for start in range(0, len(sessions), chunk):
+            batch = clients.db.batch()
+            for session_id, data in sessions[start:start + chunk]:
+                if archive:
+                    batch.set(clients.db.collection(self.archive_collection).document(session_id), {**data, "archived_at": archived_at})
+                batch.delete(clients.db.collection(self.collection).document(session_id))
+            await batch.commit()
+
+class SessionRepository:
+    """Hot in-memory sessions in front of a store, with write-behind batched commits."""
+
+    def __init__(self, store, cache_size: int = SESSION_CACHE_SIZE, hot_ttl: float = SESSION_HOT_TTL_SECONDS,
+                 flush_interval: float = SESSION_FLUSH_INTERVAL_SECONDS, batch_size: int = SESSION_FLUSH_BATCH_SIZE):
+        self.store = store
+        self.cache_size = cache_size
+        self.hot_ttl = hot_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # session_id -> (session data including queued updates, monotonic load time)
+        self.sessions = OrderedDict()
+        # session_id -> update fields not committed yet
+        self.pending = {}
+        # Updates taken from pending by the commit in progress
+        self.committing = {}
+        self.commits = 0
+        self._commit_lock = asyncio.Lock()
+        self._flush_requested = asyncio.Event()
+        self._task = None
+        self._last_compaction = time.monotonic()
+
+    def _remember(self, session_id: str, data: dict) -> None:
+        self.sessions[session_id] = (data, time.monotonic())
+        self.sessions.move_to_end(session_id)
+        # Queued updates live in pending, so any session can be evicted
+        while len(self.sessions) > self.cache_size:
+            self.sessions.popitem(last=False)
+
+    async def create(self, data: dict) -> str:
+        """Create a session, committed before returning its id."""
+        session_id = self.store.new_id()
+        with timed("firestore.create_session"):
+            await self.store.commit([(session_id, data, True)])
+        SESSION_WRITES.inc(mode="durable")
+        self._remember(session_id, copy.deepcopy(data))
+        return session_id
+
+    async def create_many(self, sessions: list) -> list:
+        """Create sessions in batched commits, returning their ids in order."""
+        session_ids = [self.store.new_id() for _ in sessions]
+        with timed("firestore.create_sessions"):
+            await self.store.commit([(session_id, data, True) for session_id, data in zip(session_ids, sessions)])
+        SESSION_WRITES.inc(len(sessions), mode="durable")
+        for session_id, data in zip(session_ids, sessions):
+            self._remember(session_id, copy.deepcopy(data))
+        return session_ids
+
+    async def get(self, session_id: str):
+        """Get a copy of a session including its queued updates, or None if it does not exist."""
+        entry = self.sessions.get(session_id)
+        if entry is not None and time.monotonic() - entry[1] < self.hot_ttl:
+            self.sessions.move_to_end(session_id)
+            return copy.deepcopy(entry[0])
+
+        commits = self.commits
+        with timed("firestore.get_session"):
+            data = await self.store.get(session_id)
+        if data is None:
+            return None
+        for fields in (self.committing.get(session_id, {}), self.pending.get(session_id, {})):
+            for path, value in fields.items():
+                apply_update(data, path, value)
+        # A commit that finished during the read may be missing from both the read and pending
+        if commits == self.commits:
+            self._remember(session_id, copy.deepcopy(data))
+        return data
+
+    async def update(self, session_id: str, fields: dict, durable: bool = False) -> None:
+        """Update a session, queueing the write unless it is durable.
+
+        A durable update is committed, together with the session's queued
+        updates, before returning, and raises NotFound for a missing session.
+        """
+        fields = {"updated_at": datetime.utcnow().isoformat(), **fields}
+        if not durable:
+            entry = self.sessions.get(session_id)
+            if entry is not None:
+                for path, value in fields.items():
+                    apply_update(entry[0], path, value)
+            self.pending[session_id] = merge_fields(self.pending.get(session_id, {}), fields)
+            SESSION_WRITES.inc(mode="queued")
+            if len(self.pending) >= self.batch_size:
+                self._flush_requested.set()
+            return
+
+        # The lock keeps commits in order, so an older batch never overwrites this update
+        async with self._commit_lock:
+            queued = self.pending.pop(session_id, {})
+            self.committing = {session_id: queued}
+            try:
+                with timed("firestore.session_update"):
+                    await self.store.commit([(session_id, merge_fields(queued, fields), False)])
+            except NotFound:
+                self.sessions.pop(session_id, None)
+                raise
+            except BaseException:
+                self.pending[session_id] = merge_fields(queued, self.pending.get(session_id, {}))
+                raise
+            finally:
+                self.committing = {}
+                self.commits += 1
+        SESSION_WRITES.inc(mode="durable")
+        entry = self.sessions.get(session_id)
+        if entry is not None:
+            for path, value in fields.items():
+                apply_update(entry[0], path, value)
+
+    def _requeue(self, writes: list) -> None:
+        for session_id, fields in writes:
+            self.pending[session_id] = merge_fields(fields, self.pending.get(session_id, {}))
+
+    async def _commit_each(self, writes: list) -> bool:
+        """Commit writes one session at a time, dropping deleted sessions; False once the store fails."""
+        for position, (session_id, fields) in enumerate(writes):
+            try:
+                await self.store.commit([(session_id, fields, False)])
+            except NotFound:
+                logger.warning(f"Dropping queued updates for deleted session {session_id}")
+                self.sessions.pop(session_id, None)
+            except asyncio.CancelledError:
+                self._requeue(writes[position:])
+                raise
+            except Exception as e:
+                logger.error(f"Failed to commit session updates, retrying on the next flush: {str(e)}")
+                self._requeue(writes[position:])
+                return False
+        return True
+
+    async def flush(self) -> None:
+        """Commit every queued update in batches."""
+        async with self._commit_lock:
+            while self.pending:
+                writes = list(self.pending.items())[:self.batch_size]
+                for session_id, _ in writes:
+                    del self.pending[session_id]
+                self.committing = dict(writes)
+                try:
+                    with timed("firestore.session_commit"):
+                        await self.store.commit([(session_id, fields, False) for session_id, fields in writes])
+                    SESSION_COMMITS.inc(outcome="ok")
+                except asyncio.CancelledError:
+                    self._requeue(writes)
+                    raise
+                except Exception as e:
+                    # One deleted session fails the whole batch, so find out which writes still apply
+                    SESSION_COMMITS.inc(outcome="failed")
+                    logger.warning(f"Batched session commit failed, committing one by one: {str(e)}")
+                    if not await self._commit_each(writes):
+                        return
+                finally:
+                    self.committing = {}
+                    self.commits += 1
+
+    async def compact(self, ttl_days: float = SESSION_TTL_DAYS, action: str = SESSION_COMPACTION_ACTION) -> int:
+        """Archive or delete sessions not updated for ttl_days, returning how many were removed."""
+        if action not in SESSION_COMPACTION_ACTIONS:
+            raise ValueError(f"Unknown compaction action: {action}")
+        await self.flush()
+        cutoff = (datetime.utcnow() - timedelta(days=ttl_days)).isoformat()
+        removed = 0
+        while True:
+            stale = [
+                (session_id, data)
+                for session_id, data in await self.store.list_stale(cutoff, self.batch_size)
+                if session_id not in self.pending
+            ]
+            if not stale:
+                break
+            with timed("firestore.compact_sessions"):
+                await self.store.remove(stale, archive=action == "archive")
+            for session_id, _ in stale:
+                self.sessions.pop(session_id, None)
+            removed += len(stale)
+            SESSIONS_COMPACTED.inc(len(stale), action=action)
+        if removed:
+            logger.info(f"Compacted {removed} sessions not updated since {cutoff} ({action})")
+        return removed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+                if SESSION_TTL_DAYS and SESSION_COMPACTION_INTERVAL_SECONDS and \
+                        time.monotonic() - self._last_compaction >= SESSION_COMPACTION_INTERVAL_SECONDS:
+                    self._last_compaction = time.monotonic()
+                    await self.compact()
+            except Exception as e:
+                logger.error(f"Session repository maintenance failed: {str(e)}", exc_info=True)
+
+    async def start(self) -> None:
+        """Start the background flush and compaction loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background loop and commit everything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self.pending:
+            logger.error(f"Shutting down with queued updates for {len(self.pending)} sessions that could not be committed")
+
+def _create_store():
+    if SESSION_BACKEND == "memory":
+        return InMemorySessionStore()
+    return FirestoreSessionStore()
+
+session_repository = SessionRepository(_create_store())
@@ -1,32 +1,40 @@
-from config import db, logger
+from config import logger
 from fastapi import HTTPException
 from datetime import datetime
 from services.assistant_service import get_or_create_assistant
+from services.survey_service import derive_session_status
+from services.engine_service import get_engine_name
+from services.session_repository import session_repository
+from services.catalog_service import validate_major
 
-def create_session(university_id: str, major_id: str, student_type: str) -> str:
+def build_session_data(university_id: str, major_id: str, student_type: str, assistant_id: str) -> dict:
+    """Build the document of a new session."""
+    return {
+        "university_id": university_id,
+        "major_id": major_id,
+        "student_type": student_type,
+        "assistant_id": assistant_id,
+        "engine": get_engine_name(university_id, major_id),
+        "status": "initialized",
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+async def create_session(university_id: str, major_id: str, student_type: str) -> str:
     """Create a new session and initialize the assistant."""
     try:
         logger.info(f"Creating new session for university {university_id}, major {major_id}, type {student_type}")
+        validate_major(university_id, major_id)
         
         # Get or create assistant
-        assistant_id = get_or_create_assistant(university_id, major_id)
+        assistant_id = await get_or_create_assistant(university_id, major_id)
         
         # Create session document
-        session_data = {
-            "university_id": university_id,
-            "major_id": major_id,
-            "student_type": student_type,
-            "assistant_id": assistant_id,
-            "status": "initialized",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
+        session_data = build_session_data(university_id, major_id, student_type, assistant_id)
         
         try:
             # Add session to Firestore
-            doc_ref = db.collection('sessions').document()
-            doc_ref.set(session_data)
-            session_id = doc_ref.id
+            session_id = await session_repository.create(session_data)
             logger.info(f"Created new session with ID: {session_id}")
             return session_id
         except Exception as e:
@@ -38,14 +46,14 @@ def create_session(university_id: str, major_id: str, student_type: str) -> str:
         logger.error(f"Error in create_session: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_session(session_id: str) -> dict:
-    """Get session data from Firestore."""
+async def get_session(session_id: str) -> dict:
+    """Get session data, served from memory while the session is active."""
     try:
-        doc_ref = db.collection('sessions').document(session_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        session = await session_repository.get(session_id)
+        if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
-        return doc.to_dict()
+        # The id lets services update the document, e.g. to record the session's thread
+        return derive_session_status({**session, "session_id": session_id})
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -0,0 +1,61 @@
+import asyncio
+from contextlib import contextmanager
+
+class SingleFlight:
+    """Share one in-flight call per key between concurrent callers.
+
+    The first caller for a key starts the call, later callers await the same
+    task until it finishes. Cancelling one waiter does not cancel the call.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        # task -> number of callers waiting for it
+        self.waiters = {}
+
+    def in_flight(self, key) -> bool:
+        return key in self.calls
+
+    def start(self, key, fn, *args, **kwargs) -> asyncio.Future:
+        """Start the call for a key unless one is in flight, and return its task."""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    @contextmanager
+    def waiting(self, task: asyncio.Future):
+        """Count the caller as waiting for a task, so cancel leaves the task running."""
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            yield task
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+
+    async def do(self, key, fn, *args, **kwargs):
+        with self.waiting(self.start(key, fn, *args, **kwargs)) as task:
+            return await asyncio.shield(task)
+
+    def cancel(self, task: asyncio.Future) -> bool:
+        """Cancel a call nobody is waiting for, and return whether it was cancelled.
+
+        A call a caller has joined is left to finish for that caller.
+        """
+        if task.done() or self.waiters.get(task):
+            return False
+        # Forget it now, so a caller arriving before the task unwinds starts a fresh call
+        for key in [key for key, call in self.calls.items() if call is task]:
+            del self.calls[key]
+        task.cancel()
+        return True
+
+    def _forget(self, key, task) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Retrieve the exception so abandoned failures are not logged as unhandled
+        if not task.cancelled():
+            task.exception()
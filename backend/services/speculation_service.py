@@ -0,0 +1,96 @@
+"""Speculative generation between survey steps.
+
+The frontend always asks for follow-up questions right after submitting the
+initial survey, and for the learning path right after submitting the follow-up
+answers. Both generations are started as soon as the answers are stored, so the
+request that follows finds them finished or joins them in flight. A speculation
+for a response set that has since changed is cancelled, unless a request has
+already joined it, in which case it finishes for that request.
+"""
+from config import logger, SPECULATIVE_GENERATION_ENABLED
+from data.surveys import SURVEY_TYPES
+from services.session_service import get_session
+from services.question_bank_service import start_follow_up_questions, cancel_follow_up_questions, response_fingerprint
+from services.learning_path_service import start_learning_path_generation, cancel_learning_path_generation
+from services.metrics_service import SPECULATIONS
+import asyncio
+
+# The latest speculation per session, as (kind, fingerprint, task)
+_speculations = {}
+
+# Speculations scheduled after a submit, referenced so they are not garbage collected
+_pending = set()
+
+def get_survey_stage(session: dict, responses: list):
+    """Get which generation the answers so far lead to next.
+
+    Returns "follow_up" once exactly the initial survey is answered, "learning_path"
+    once follow-up answers have been added to it, and None before that.
+    """
+    questions = {question.question for question in SURVEY_TYPES.get(session.get("student_type"), ())}
+    answered = {response['question'] for response in responses}
+    if not questions or not questions <= answered:
+        return None
+    return "learning_path" if answered - questions else "follow_up"
+
+def _start(kind: str, session_id: str, session: dict) -> asyncio.Future:
+    if kind == "follow_up":
+        return start_follow_up_questions(session)
+    return start_learning_path_generation(session_id, session)
+
+def _cancel(kind: str, task: asyncio.Future) -> bool:
+    if kind == "follow_up":
+        return cancel_follow_up_questions(task)
+    return cancel_learning_path_generation(task)
+
+def _on_done(kind: str, task: asyncio.Future) -> None:
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        SPECULATIONS.inc(kind=kind, outcome="failed")
+        logger.warning(f"Speculative {kind} generation failed: {str(task.exception())}")
+    else:
+        SPECULATIONS.inc(kind=kind, outcome="completed")
+
+async def speculate(session_id: str) -> None:
+    """Start the generation a session's next request will need, cancelling stale ones."""
+    try:
+        session = await get_session(session_id)
+        responses = session.get("survey_responses", {}).get("responses", [])
+        fingerprint = response_fingerprint(responses)
+
+        previous = _speculations.get(session_id)
+        if previous is not None and previous[1] == fingerprint:
+            return
+        # The answers changed, so only requests that already joined want what the previous response set leads to
+        if previous is not None and _cancel(previous[0], previous[2]):
+            SPECULATIONS.inc(kind=previous[0], outcome="cancelled")
+            logger.info(f"Cancelled speculative {previous[0]} generation for session {session_id}")
+        _speculations.pop(session_id, None)
+
+        kind = get_survey_stage(session, responses)
+        if kind is None:
+            return
+        task = _start(kind, session_id, session)
+        if task.done():
+            return
+        _speculations[session_id] = (kind, fingerprint, task)
+        SPECULATIONS.inc(kind=kind, outcome="started")
+        task.add_done_callback(lambda done: _on_done(kind, done))
+        task.add_done_callback(lambda done: _forget(session_id, done))
+    except Exception as e:
+        # Speculation is only an optimization, the next request generates whatever is missing
+        logger.warning(f"Speculative generation for session {session_id} not started: {str(e)}")
+
+def _forget(session_id: str, task: asyncio.Future) -> None:
+    current = _speculations.get(session_id)
+    if current is not None and current[2] is task:
+        del _speculations[session_id]
+
+def schedule_speculation(session_id: str) -> None:
+    """Speculate in the background after a submit, without delaying its response."""
+    if not SPECULATIVE_GENERATION_ENABLED:
+        return
+    task = asyncio.ensure_future(speculate(session_id))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
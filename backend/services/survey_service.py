@@ -1,48 +1,74 @@
-from config import db, logger
+from config import logger
 from fastapi import HTTPException
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
 from datetime import datetime
-from data.surveys import SURVEY_TYPES, SurveyQuestion
+from typing import NamedTuple
+import hashlib
+import json
+from data.surveys import SURVEY_TYPES
+from services.session_repository import session_repository
 
-def get_initial_questions(student_type: str) -> list:
-    """Get initial survey questions based on student type."""
-    if student_type not in SURVEY_TYPES:
+class CompiledSurvey(NamedTuple):
+    """A survey serialized to its response body, with a strong ETag over the bytes."""
+    body: bytes
+    etag: str
+
+def compile_survey(questions: tuple) -> CompiledSurvey:
+    """Serialize survey questions into the response body served to clients."""
+    body = json.dumps(
+        {"questions": [question.to_dict() for question in questions]},
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+    return CompiledSurvey(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+# Surveys only change with a deploy, so each one is serialized once when the app starts
+COMPILED_SURVEYS = {student_type: compile_survey(questions) for student_type, questions in SURVEY_TYPES.items()}
+
+def get_initial_survey(student_type: str) -> CompiledSurvey:
+    """Get the precompiled initial survey for a student type."""
+    if student_type not in COMPILED_SURVEYS:
         raise HTTPException(status_code=400, detail=f"Invalid student type: {student_type}")
-    
-    # Convert SurveyQuestion objects to dictionaries
-    questions = [question.to_dict() for question in SURVEY_TYPES[student_type]]
-    return questions
+    return COMPILED_SURVEYS[student_type]
+
+# Sessions with at least this many answers have completed the survey
+SURVEY_COMPLETE_THRESHOLD = 10
+
+def derive_session_status(session: dict) -> dict:
+    """Derive the survey status of a session from its response counter."""
+    if session.get("status") in ("initialized", "survey_in_progress", "survey_completed") and "survey_responses" in session:
+        total = session["survey_responses"].get("total_questions_answered", 0)
+        session["status"] = "survey_in_progress" if total < SURVEY_COMPLETE_THRESHOLD else "survey_completed"
+    return session
 
-def submit_survey_responses(session_id: str, responses: list) -> None:
-    """Submit all survey responses for a session."""
+async def submit_survey_responses(session_id: str, responses: list) -> None:
+    """Append survey responses to a session in a single atomic write."""
     try:
         logger.info(f"Submitting survey responses for session {session_id}")
         
-        # Get session data
-        doc_ref = db.collection('sessions').document(session_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        session_data = doc.to_dict()
-        existing_responses = session_data.get("survey_responses", {}).get("responses", [])
+        submitted_at = datetime.utcnow().isoformat()
         
-        # Combine existing responses with new ones
-        all_responses = existing_responses + responses
-        
-        # Store all responses in Firestore
-        responses_data = {
-            "responses": all_responses,
-            "submitted_at": datetime.utcnow().isoformat(),
-            "total_questions_answered": len(all_responses)
-        }
+        # Tag each response so repeated identical answers are not collapsed by the array union
+        entries = [
+            {**response, "submitted_at": submitted_at, "position": position}
+            for position, response in enumerate(responses)
+        ]
         
         try:
-            # Update the session document with the responses
-            doc_ref.update({
-                "survey_responses": responses_data,
-                "status": "survey_in_progress" if len(all_responses) < 10 else "survey_completed"
-            })
+            # Append server-side, the counter is maintained so status never needs the history.
+            # Answers are committed before returning, the client will not send them again
+            await session_repository.update(session_id, {
+                "survey_responses.responses": firestore.ArrayUnion(entries),
+                "survey_responses.total_questions_answered": firestore.Increment(len(entries)),
+                "survey_responses.submitted_at": submitted_at,
+                # A changed response set has a new cache key, the entry for the old set stays for sessions sharing it
+                "learning_path_cache_key": firestore.DELETE_FIELD,
+                "updated_at": submitted_at
+            }, durable=True)
             logger.info(f"Successfully stored {len(responses)} new responses for session {session_id}")
+        except NotFound:
+            raise HTTPException(status_code=404, detail="Session not found")
         except Exception as e:
             logger.error(f"Failed to store responses in Firestore: {str(e)}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Failed to store responses: {str(e)}")
@@ -50,4 +76,4 @@ def submit_survey_responses(session_id: str, responses: list) -> None:
         raise he
     except Exception as e:
         logger.error(f"Error in submit_survey_responses: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,106 @@
+"""Persistent assistant threads, one per session.
+
+The session document records its thread as
+{"thread_id", "sent_responses", "sent_courses", "tasks", "token_estimate"}, so
+later generations append only what the thread has not seen yet instead of
+resending the whole transcript. Once the thread grows past the token budget it
+is replaced by a fresh one, seeded with a full prompt that restates every
+answer, which drops earlier replies the model no longer needs.
+"""
+from config import clients, logger, SESSION_THREAD_TOKEN_BUDGET
+from contextlib import asynccontextmanager
+from services.rate_governor import rate_governor, estimate_tokens
+from services.metrics_service import timed, Counter
+from services.session_repository import session_repository
+import openai
+
+SESSION_THREADS = Counter("link_session_threads_total", "Generations by how they used the session thread", ("action",))
+
+# Sessions with a generation running on their thread, which cannot take new messages until it ends
+_busy_sessions = set()
+
+class SessionThread:
+    """The thread a generation runs on and what it has added to it."""
+
+    def __init__(self, thread_id: str, state: dict = None):
+        self.thread_id = thread_id
+        self.state = state
+
+    def add_tokens(self, tokens: int) -> None:
+        if self.state is not None:
+            self.state["token_estimate"] += tokens
+
+async def _create_thread(prompt: str) -> str:
+    with timed("openai.thread_create"):
+        thread = await rate_governor.call(clients.openai.beta.threads.create, idempotent=False)
+    await _add_message(thread.id, prompt)
+    return thread.id
+
+async def _add_message(thread_id: str, content: str) -> None:
+    with timed("openai.message_create"):
+        await rate_governor.call(
+            clients.openai.beta.threads.messages.create,
+            tokens=estimate_tokens(content),
+            idempotent=False,
+            thread_id=thread_id,
+            role="user",
+            content=content
+        )
+
+async def _save_thread_state(session_id: str, state: dict) -> None:
+    # Queued, losing the state only costs a fresh thread next time
+    await session_repository.update(session_id, {"thread": state})
+
+@asynccontextmanager
+async def session_thread(session: dict, task: str, full_prompt: str, build_delta, responses: list, courses: list = None):
+    """Yield a thread that holds the prompt for this generation.
+
+    The session's thread is reused while it stays within the token budget, with
+    build_delta(state) building the message for what changed since; it returns
+    None when the thread cannot be continued. Otherwise a new thread starts
+    from full_prompt. Without a session id, or while another generation runs on
+    the session's thread, a one-off thread is used and nothing is recorded.
+    """
+    session_id = session.get("session_id") if session else None
+    if not session_id or session_id in _busy_sessions:
+        SESSION_THREADS.inc(action="one_off" if not session_id else "busy")
+        yield SessionThread(await _create_thread(full_prompt))
+        return
+
+    _busy_sessions.add(session_id)
+    try:
+        state = dict(session.get("thread") or {})
+        course_codes = [course.get("code") for course in courses or [] if course.get("code")]
+        thread = None
+        delta = build_delta(state) if state.get("thread_id") else None
+        if delta is not None:
+            if state.get("token_estimate", 0) + estimate_tokens(delta) <= SESSION_THREAD_TOKEN_BUDGET:
+                try:
+                    await _add_message(state["thread_id"], delta)
+                    thread = SessionThread(state["thread_id"], state)
+                    thread.add_tokens(estimate_tokens(delta))
+                    SESSION_THREADS.inc(action="reused")
+                except openai.BadRequestError as e:
+                    # Usually a run from another worker is still active on the thread
+                    logger.warning(f"Could not append to thread {state['thread_id']} of session {session_id}: {str(e)}")
+            else:
+                logger.info(f"Thread of session {session_id} is over the token budget, starting a fresh one")
+
+        if thread is None:
+            state = {"thread_id": None, "sent_responses": 0, "sent_courses": [], "tasks": [], "token_estimate": 0}
+            state["thread_id"] = await _create_thread(full_prompt)
+            thread = SessionThread(state["thread_id"], state)
+            thread.add_tokens(estimate_tokens(full_prompt))
+            SESSION_THREADS.inc(action="replaced" if session.get("thread") else "created")
+
+        state["sent_responses"] = len(responses)
+        state["sent_courses"] = sorted(set(state["sent_courses"]) | set(course_codes))
+        state["tasks"] = sorted(set(state["tasks"]) | {task})
+        try:
+            yield thread
+        finally:
+            # The message is on the thread whether or not the run succeeded
+            session["thread"] = state
+            await _save_thread_state(session_id, state)
+    finally:
+        _busy_sessions.discard(session_id)
@@ -0,0 +1,66 @@
+import asyncio
+from services import survey_service
+from services.cache_service import SQLiteCacheStore, TwoTierCache, learning_path_cache_key
+from services.learning_path_service import get_cache_key
+from services.session_repository import InMemorySessionStore, SessionRepository
+from services.session_service import build_session_data
+
+RESPONSES = [{"question": "How do you prefer to learn?", "answer": "Hands-on projects"}]
+PATH = [{"title": "CS 101", "description": "Intro"}]
+
+def test_cache_key_ignores_answer_order_and_whitespace():
+    reordered = [{"question": " b ", "answer": "2"}, {"question": "a", "answer": "1  "}]
+    assert learning_path_cache_key("asst", [{"question": "a", "answer": "1"}, {"question": "b", "answer": "2"}]) == \
+        learning_path_cache_key("asst", reordered)
+    assert learning_path_cache_key("asst", RESPONSES, "ai") != learning_path_cache_key("asst", RESPONSES)
+    assert learning_path_cache_key("asst", RESPONSES, prompt_version="v2") != learning_path_cache_key("asst", RESPONSES)
+
+def test_memory_tier_evicts_least_recently_used_entries():
+    async def scenario():
+        cache = TwoTierCache(None, max_size=2, ttl=60)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        await cache.get("a")
+        await cache.set("c", 3)
+        assert [await cache.get(key) for key in "abc"] == [1, None, 3]
+        assert cache.get_stats()["evictions"] == 1
+    asyncio.run(scenario())
+
+def test_memory_tier_expires_entries():
+    async def scenario():
+        cache = TwoTierCache(None, ttl=0)
+        await cache.set("a", 1)
+        assert await cache.get("a") is None
+    asyncio.run(scenario())
+
+def test_persistent_tier_refills_the_memory_tier(tmp_path):
+    async def scenario():
+        store = SQLiteCacheStore(str(tmp_path / "cache.sqlite3"))
+        await TwoTierCache(store, ttl=60).set("a", PATH)
+        # A fresh process only has the persistent tier
+        cache = TwoTierCache(store, ttl=60)
+        assert await cache.get("a") == PATH
+        assert await cache.get("a") == PATH
+        assert cache.stats["persistent_hits"] == 1 and cache.stats["memory_hits"] == 1
+    asyncio.run(scenario())
+
+def test_submitting_answers_keeps_the_entry_other_sessions_share(monkeypatch):
+    async def scenario():
+        repository = SessionRepository(InMemorySessionStore(), hot_ttl=0)
+        monkeypatch.setattr(survey_service, "session_repository", repository)
+        cache = TwoTierCache(None, ttl=60)
+        session_ids = []
+        for _ in range(2):
+            data = build_session_data("berkeley", "cs", "new_student", "asst_1")
+            data["survey_responses"] = {"responses": list(RESPONSES), "total_questions_answered": 1}
+            session_ids.append(await repository.create(data))
+        first, second = [await repository.get(session_id) for session_id in session_ids]
+        key = get_cache_key(first)
+        assert get_cache_key(second) == key
+        await cache.set(key, PATH)
+
+        await survey_service.submit_survey_responses(session_ids[0], [{"question": "Anything else?", "answer": "No"}])
+
+        assert await cache.get(key) == PATH
+        assert get_cache_key(await repository.get(session_ids[0])) != key
+    asyncio.run(scenario())
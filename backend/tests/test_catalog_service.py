@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import main
+from data.catalog import get_major
+from services import catalog_service
+
+@pytest.fixture(autouse=True)
+def report(monkeypatch):
+    report = {}
+    monkeypatch.setattr(catalog_service, "prewarm_report", report)
+    return report
+
+class FakeAssistants:
+    """Stands in for assistant resolution, optionally failing the first call."""
+
+    def __init__(self):
+        self.calls = []
+        self.fail_first = False
+
+    async def get_or_create_assistant(self, university_id: str, major_id: str) -> str:
+        self.calls.append((university_id, major_id))
+        if self.fail_first and len(self.calls) == 1:
+            raise RuntimeError("OpenAI unavailable")
+        return f"asst_{major_id}"
+
+@pytest.fixture
+def assistants(monkeypatch):
+    assistants = FakeAssistants()
+    monkeypatch.setattr(catalog_service, "get_or_create_assistant", assistants.get_or_create_assistant)
+    monkeypatch.setattr(catalog_service, "get_course_index", lambda assistant_key: None)
+    return assistants
+
+def prewarm(major_key=("berkeley", "cs")) -> dict:
+    return asyncio.run(catalog_service.prewarm_major(major_key[0], get_major(*major_key)))
+
+def test_major_without_a_course_index_is_not_reported_warm(assistants):
+    result = prewarm()
+    assert result["status"] == "no_index" and result["assistant_id"] == "asst_cs"
+    assert catalog_service.get_prewarm_summary() == {"warm": [], "no_index": ["berkeley_cs"], "failed": []}
+
+def test_failed_majors_are_retried_until_they_warm(assistants):
+    assistants.fail_first = True
+    assert prewarm()["status"] == "failed"
+    asyncio.run(asyncio.wait_for(catalog_service.retry_failed_majors(interval=0), timeout=1))
+    assert catalog_service.get_prewarm_summary()["failed"] == []
+    assert len(assistants.calls) == 2
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(main.readiness, "ready", True)
+    # Without entering the client, the lifespan and its warm-up do not run
+    return TestClient(main.app)
+
+def test_readiness_fails_while_a_major_failed_to_warm(client, report):
+    report["berkeley_cs"] = {"status": "failed"}
+    report["hpi_dh"] = {"status": "warm"}
+    response = client.get("/health/ready")
+    assert response.status_code == 503 and "berkeley_cs" in response.json()["detail"]
+
+def test_readiness_lists_majors_by_state(client, report):
+    report["berkeley_cs"] = {"status": "no_index"}
+    report["hpi_dh"] = {"status": "warm"}
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["majors"] == {"warm": ["hpi_dh"], "no_index": ["berkeley_cs"], "failed": []}
+
+def test_not_ready_before_warm_up(client, monkeypatch):
+    monkeypatch.setitem(main.readiness, "ready", False)
+    assert client.get("/health/ready").status_code == 503
@@ -0,0 +1,85 @@
+import json
+import pytest
+from fastapi import HTTPException
+from data.catalog import iter_majors
+from data.surveys import SURVEY_TYPES
+from services import cohort_service
+from services.cohort_service import get_cohort_format, parse_cohort
+
+UNIVERSITY, MAJOR = next((university.id, major.id) for university, major in iter_majors())
+STUDENT_TYPE = next(iter(SURVEY_TYPES))
+
+def _csv(*rows) -> bytes:
+    header = "student_id,university_id,major_id,student_type,Preferred learning style"
+    return "\n".join((header,) + rows).encode("utf-8")
+
+def test_csv_rows_become_students_with_their_answers():
+    students, errors = parse_cohort(_csv(f"s1,{UNIVERSITY},{MAJOR},{STUDENT_TYPE}, Hands-on "), "csv")
+    assert errors == []
+    assert students == [{
+        "student_id": "s1", "university_id": UNIVERSITY, "major_id": MAJOR, "student_type": STUDENT_TYPE,
+        "row": 2, "responses": [{"question": "Preferred learning style", "answer": "Hands-on"}]
+    }]
+
+def test_invalid_csv_rows_are_reported_by_row():
+    students, errors = parse_cohort(_csv(
+        f"s1,,{MAJOR},{STUDENT_TYPE},Hands-on",
+        f"s2,{UNIVERSITY},nope,{STUDENT_TYPE},Hands-on",
+        f"s3,{UNIVERSITY},{MAJOR},alien,Hands-on",
+        f"s4,{UNIVERSITY},{MAJOR},{STUDENT_TYPE},",
+    ), "csv")
+    assert students == []
+    assert [(error["row"], error["student_id"]) for error in errors] == [(2, "s1"), (3, "s2"), (4, "s3"), (5, "s4")]
+    assert errors[0]["detail"] == "Missing university_id"
+    assert errors[1]["detail"].startswith("Unknown university or major")
+    assert errors[2]["detail"] == "Invalid student type: alien"
+    assert errors[3]["detail"] == "No survey responses"
+
+def test_jsonl_accepts_response_lists_and_answer_mappings():
+    base = {"university_id": UNIVERSITY, "major_id": MAJOR, "student_type": STUDENT_TYPE}
+    lines = [
+        json.dumps({**base, "student_id": "s1", "responses": [{"question": "Pace", "answer": "Fast"}]}),
+        "",
+        json.dumps({**base, "student_id": "s2", "answers": {"Pace": "Slow"}}),
+        "{not json",
+        "[1, 2]",
+    ]
+    students, errors = parse_cohort("\n".join(lines).encode("utf-8"), "jsonl")
+    assert [(student["row"], student["responses"]) for student in students] == [
+        (1, [{"question": "Pace", "answer": "Fast"}]),
+        (3, [{"question": "Pace", "answer": "Slow"}]),
+    ]
+    assert [error["row"] for error in errors] == [4, 5]
+    assert errors[0]["detail"].startswith("Invalid JSON")
+    assert errors[1]["detail"] == "Expected an object per line"
+
+def test_byte_order_mark_is_stripped():
+    students, _ = parse_cohort(b"\xef\xbb\xbf" + _csv(f"s1,{UNIVERSITY},{MAJOR},{STUDENT_TYPE},Hands-on"), "csv")
+    assert students[0]["student_id"] == "s1"
+
+def test_non_utf8_file_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        parse_cohort(b"\xff\xfe", "csv")
+    assert error.value.status_code == 400
+
+def test_oversized_cohort_is_rejected(monkeypatch):
+    monkeypatch.setattr(cohort_service, "COHORT_MAX_STUDENTS", 1)
+    row = f"s1,{UNIVERSITY},{MAJOR},{STUDENT_TYPE},Hands-on"
+    with pytest.raises(HTTPException) as error:
+        parse_cohort(_csv(row, row), "csv")
+    assert error.value.status_code == 413
+
+@pytest.mark.parametrize("filename, content_type, expected", [
+    ("cohort.csv", None, "csv"),
+    ("cohort.NDJSON", None, "jsonl"),
+    (None, "text/csv", "csv"),
+    (None, "application/x-ndjson", "jsonl"),
+])
+def test_cohort_format_is_detected(filename, content_type, expected):
+    assert get_cohort_format(filename, content_type) == expected
+
+def test_unknown_cohort_format_is_rejected():
+    with pytest.raises(HTTPException):
+        get_cohort_format("cohort.xlsx")
+    with pytest.raises(HTTPException):
+        get_cohort_format(file_format="xlsx")
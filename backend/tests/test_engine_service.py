@@ -0,0 +1,30 @@
+import pytest
+from services import engine_service
+from services.engine_service import get_engine, get_engine_name
+
+@pytest.fixture
+def chat_for_berkeley_cs(monkeypatch):
+    monkeypatch.setattr(engine_service, "GENERATION_ENGINE_OVERRIDES", {"berkeley_cs": "chat"})
+
+def with_index(monkeypatch, built: bool) -> None:
+    monkeypatch.setattr(engine_service, "get_course_index", lambda assistant_key: object() if built else None)
+
+def test_chat_engine_is_used_when_the_course_index_exists(monkeypatch, chat_for_berkeley_cs):
+    with_index(monkeypatch, True)
+    assert get_engine_name("berkeley", "cs") == "chat"
+    assert get_engine_name("hpi", "dh") == "assistants"
+
+def test_chat_engine_falls_back_without_a_course_index(monkeypatch, chat_for_berkeley_cs):
+    with_index(monkeypatch, False)
+    assert get_engine_name("berkeley", "cs") == "assistants"
+
+def test_sessions_created_with_chat_fall_back_once_the_index_is_gone(monkeypatch):
+    session = {"university_id": "berkeley", "major_id": "cs", "engine": "chat"}
+    with_index(monkeypatch, True)
+    assert get_engine(session).name == "chat"
+    with_index(monkeypatch, False)
+    assert get_engine(session).name == "assistants"
+
+def test_unknown_engines_fall_back(monkeypatch):
+    monkeypatch.setattr(engine_service, "GENERATION_ENGINE_OVERRIDES", {"berkeley_cs": "nope"})
+    assert get_engine_name("berkeley", "cs") == "assistants"
@@ -0,0 +1,38 @@
+from services.fanout_service import plan_parts, merge_learning_paths
+
+COURSES = [
+    {"code": "CS 101", "prerequisites": ["CS 10"]},
+    {"code": "CS 10"},
+    {"code": "CS 201", "prerequisites": ["CS 101"]},
+]
+
+def titles(steps: list) -> list:
+    return [step["title"] for step in steps]
+
+def test_plan_parts_orders_courses_by_prerequisite_depth():
+    parts = plan_parts(COURSES, 3)
+    assert [[course["code"] for course in part] for part in parts] == [["CS 10"], ["CS 101"], ["CS 201"]]
+
+def test_plan_parts_without_courses_lets_the_model_split():
+    assert plan_parts(None, 2) == [None, None]
+    assert len(plan_parts(COURSES[:1], 3)) == 1
+
+def test_merge_drops_repeated_courses():
+    parts = [[{"title": "CS 10 Basics"}, {"title": "CS 101 Intro"}], [{"title": "cs 101: Intro again"}, {"title": "CS 201 Data"}]]
+    assert titles(merge_learning_paths(parts, COURSES)) == ["CS 10 Basics", "CS 101 Intro", "CS 201 Data"]
+
+def test_merge_keeps_courses_whose_code_is_a_prefix_of_another():
+    parts = [[{"title": "CS 101 Intro"}], [{"title": "CS 10 Basics"}]]
+    assert titles(merge_learning_paths(parts, COURSES)) == ["CS 10 Basics", "CS 101 Intro"]
+
+def test_merge_places_courses_after_their_prerequisites():
+    parts = [[{"title": "CS 201 Data"}], [{"title": "CS 101 Intro"}], [{"title": "CS 10 Basics"}]]
+    assert titles(merge_learning_paths(parts, COURSES)) == ["CS 10 Basics", "CS 101 Intro", "CS 201 Data"]
+
+def test_merge_keeps_generated_order_for_prerequisite_cycles():
+    courses = [{"code": "A 1", "prerequisites": ["B 1"]}, {"code": "B 1", "prerequisites": ["A 1"]}]
+    assert titles(merge_learning_paths([[{"title": "A 1"}], [{"title": "B 1"}]], courses)) == ["A 1", "B 1"]
+
+def test_merge_identifies_steps_without_a_course_by_title():
+    parts = [[{"title": "Capstone Project"}], [{"title": "capstone  project"}, {"title": "Internship"}]]
+    assert titles(merge_learning_paths(parts, COURSES)) == ["Capstone Project", "Internship"]
@@ -0,0 +1,97 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from services import job_service
+from services.job_service import InMemoryJobStore, JobQueue
+
+class SlowStore(InMemoryJobStore):
+    """In-memory store whose writes take a moment, like a remote store."""
+
+    async def create(self, job: dict) -> None:
+        await asyncio.sleep(0.01)
+        await super().create(job)
+
+@pytest.fixture
+def runs(monkeypatch):
+    runs = []
+
+    async def handler(session_id: str, duration: float = 0.01) -> dict:
+        runs.append(session_id)
+        await asyncio.sleep(duration)
+        return {"session_id": session_id}
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "test", handler)
+    return runs
+
+async def wait_for_status(store, job_id: str, status: str, timeout: float = 2.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while (await store.get(job_id))["status"] != status:
+        assert time.monotonic() < deadline, f"job {job_id} never became {status}"
+        await asyncio.sleep(0.01)
+    return await store.get(job_id)
+
+def test_concurrent_enqueues_beyond_capacity_get_429():
+    async def scenario():
+        store = SlowStore()
+        queue = JobQueue(store, workers=0, max_size=3)
+        results = await asyncio.gather(*[queue.enqueue("test", f"s{i}") for i in range(6)], return_exceptions=True)
+        rejected = [result for result in results if isinstance(result, HTTPException)]
+        assert len(rejected) == 3 and all(error.status_code == 429 for error in rejected)
+        assert queue.queue.qsize() == 3 and len(store.jobs) == 3
+    asyncio.run(scenario())
+
+def test_jobs_run_to_completion(runs):
+    async def scenario():
+        store = InMemoryJobStore()
+        queue = JobQueue(store, workers=2, max_size=10, lease_seconds=30)
+        await queue.start()
+        job = await queue.enqueue("test", "s1")
+        finished = await wait_for_status(store, job["job_id"], "succeeded")
+        await queue.stop()
+        assert finished["result"] == {"session_id": "s1"} and runs == ["s1"]
+    asyncio.run(scenario())
+
+def test_a_job_is_claimed_by_one_worker_only():
+    async def scenario():
+        store = InMemoryJobStore()
+        await store.create({"job_id": "j1", "status": "queued"})
+        claims = [await store.claim("j1", owner, time.time(), 30) for owner in ("a", "b")]
+        assert claims[0]["owner"] == "a" and claims[1] is None
+    asyncio.run(scenario())
+
+def test_jobs_under_a_live_lease_are_not_recovered(runs):
+    async def scenario():
+        store = InMemoryJobStore()
+        await store.create({"job_id": "j1", "kind": "test", "session_id": "s1", "params": {}, "status": "queued"})
+        await store.claim("j1", "other", time.time(), 30)
+        queue = JobQueue(store, workers=1, max_size=10, lease_seconds=30)
+        assert await queue.recover() == 0
+    asyncio.run(scenario())
+
+def test_reaper_takes_over_a_job_once_its_lease_expires(runs):
+    async def scenario():
+        store = InMemoryJobStore()
+        await store.create({"job_id": "j1", "kind": "test", "session_id": "s1", "params": {}, "status": "queued"})
+        # Claimed by a worker that crashed, its lease still runs when this queue starts
+        await store.claim("j1", "crashed", time.time(), 0.2)
+        queue = JobQueue(store, workers=1, max_size=10, lease_seconds=0.15)
+        await queue.start()
+        assert (await store.get("j1"))["status"] == "running"
+        finished = await wait_for_status(store, "j1", "succeeded")
+        await queue.stop()
+        assert finished["owner"] == queue.owner and runs == ["s1"]
+    asyncio.run(scenario())
+
+def test_renewed_lease_keeps_a_long_job_from_being_taken_over(runs):
+    async def scenario():
+        store = InMemoryJobStore()
+        first = JobQueue(store, workers=1, max_size=10, lease_seconds=0.15)
+        second = JobQueue(store, workers=1, max_size=10, lease_seconds=0.15)
+        await first.start()
+        job = await first.enqueue("test", "s1", {"duration": 0.5})
+        await second.start()
+        await wait_for_status(store, job["job_id"], "succeeded")
+        await asyncio.gather(first.stop(), second.stop())
+        assert runs == ["s1"]
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+from services.json_stream import JsonArrayStreamParser
+
+def feed_in_chunks(text: str, size: int) -> list:
+    parser = JsonArrayStreamParser()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+def test_items_are_returned_as_they_complete():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('Here you go: [{"title": "A"}, {"ti') == [{"title": "A"}]
+    assert parser.feed('tle": "B"}') == [{"title": "B"}]
+    assert parser.feed(']') == []
+    assert parser.finished
+
+def test_chunk_boundaries_do_not_matter():
+    text = '```json\n[{"title": "A", "tags": ["x", "y"]}, {"title": "B", "nested": {"k": [1, {"d": 2}]}}]\n```'
+    expected = [{"title": "A", "tags": ["x", "y"]}, {"title": "B", "nested": {"k": [1, {"d": 2}]}}]
+    for size in (1, 2, 3, 7, len(text)):
+        assert feed_in_chunks(text, size) == expected
+
+def test_brackets_and_escaped_quotes_inside_strings():
+    text = '[{"title": "A [draft] {v2}", "note": "say \\"hi\\" \\\\"}, {"title": "B"}]'
+    assert feed_in_chunks(text, 1) == [{"title": "A [draft] {v2}", "note": 'say "hi" \\'}, {"title": "B"}]
+
+def test_truncated_stream_keeps_completed_items():
+    assert feed_in_chunks('[{"title": "A"}, {"title": "B", "descr', 5) == [{"title": "A"}]
+
+def test_text_after_the_array_is_ignored():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('[{"a": 1}] and then [{"b": 2}]') == [{"a": 1}]
+    assert parser.feed('{"c": 3}') == []
+
+def test_buffer_is_compacted_as_items_complete():
+    parser = JsonArrayStreamParser()
+    for index in range(100):
+        parser.feed(f'{"[" if index == 0 else ","}{{"index": {index}}}')
+    assert len(parser.buffer) < 20
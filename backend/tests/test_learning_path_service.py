@@ -0,0 +1,29 @@
+import asyncio
+from types import SimpleNamespace
+from services import course_index_service, learning_path_service, scoring_service
+
+def test_session_courses_retrieve_and_score_from_one_index(monkeypatch):
+    index = SimpleNamespace(
+        courses=[{"code": "CS 101", "title": "Intro"}, {"code": "CS 102", "title": "Data"}],
+        version="v1"
+    )
+    loads = []
+
+    def load_once(assistant_key):
+        loads.append(assistant_key)
+        return index
+
+    def reload(assistant_key):
+        raise AssertionError("the course index was resolved twice")
+
+    monkeypatch.setattr(learning_path_service, "get_course_index", load_once)
+    monkeypatch.setattr(course_index_service, "get_course_index", reload)
+    monkeypatch.setattr(scoring_service, "get_course_index", reload)
+    monkeypatch.setattr(scoring_service, "_course_matrices", {})
+
+    session = {"university_id": "uni", "major_id": "major"}
+    courses = asyncio.run(learning_path_service.get_session_courses(session, []))
+
+    assert len(loads) == 1
+    assert sorted(course["code"] for course in courses) == ["CS 101", "CS 102"]
+    assert all("match_percentage" in course for course in courses)
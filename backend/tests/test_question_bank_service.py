@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from bench.fake_firestore import FakeAsyncFirestore
+from data.surveys import SURVEY_TYPES
+from services import question_bank_service
+from services.question_bank_service import build_question_bank, get_banked_questions, profile_to_responses
+
+STUDENT_TYPE = next(iter(SURVEY_TYPES))
+COURSES = [{"code": "CS 101", "title": "Intro", "course_index": 0}]
+
+class FakeEngine:
+    name = "chat"
+
+    def __init__(self):
+        self.calls = []
+
+    async def generate_questions(self, session: dict, responses: list, courses: list = None) -> list:
+        self.calls.append((session, responses, courses))
+        return [{"id": 1, "question": f"Generated for {len(responses)} answers"}]
+
+@pytest.fixture
+def bank(monkeypatch):
+    engine = FakeEngine()
+    versions = {"index": "v1"}
+
+    async def get_relevant_courses(assistant_key, responses, search_query=None):
+        return COURSES
+
+    async def get_or_create_assistant(university_id, major_id):
+        return "asst_1"
+
+    monkeypatch.setattr(question_bank_service, "clients", SimpleNamespace(db=FakeAsyncFirestore()))
+    monkeypatch.setattr(question_bank_service, "get_engine", lambda session: engine)
+    monkeypatch.setattr(question_bank_service, "get_relevant_courses", get_relevant_courses)
+    monkeypatch.setattr(question_bank_service, "get_or_create_assistant", get_or_create_assistant)
+    monkeypatch.setattr(question_bank_service, "get_course_index_version", lambda assistant_key: versions["index"])
+    monkeypatch.setattr(question_bank_service, "_bank_index", {})
+    return SimpleNamespace(engine=engine, versions=versions)
+
+def _build() -> int:
+    return asyncio.run(build_question_bank("berkeley", "cs", STUDENT_TYPE, limit=2))
+
+def test_bank_is_generated_by_the_session_engine_with_retrieved_courses(bank):
+    assert _build() == 2
+    session, responses, courses = bank.engine.calls[0]
+    assert (session["major_id"], session["student_type"], session["assistant_id"]) == ("cs", STUDENT_TYPE, "asst_1")
+    assert "session_id" not in session
+    assert courses == COURSES
+    assert responses
+
+def test_banked_questions_are_served_for_their_profile(bank):
+    _build()
+    session, responses, _ = bank.engine.calls[0]
+    questions = asyncio.run(get_banked_questions({**session, "session_id": "s1"}, responses))
+    assert questions == [{"id": 1, "question": f"Generated for {len(responses)} answers"}]
+
+def test_bank_built_for_another_index_version_is_not_served(bank):
+    _build()
+    session, responses, _ = bank.engine.calls[0]
+    bank.versions["index"] = "v2"
+    assert asyncio.run(get_banked_questions(session, responses)) is None
+    # A rebuild for the new version generates every profile again
+    assert _build() == 2
+
+def test_existing_entries_are_kept_unless_overwritten(bank):
+    _build()
+    assert _build() == 0
+    assert asyncio.run(build_question_bank("berkeley", "cs", STUDENT_TYPE, limit=2, overwrite=True)) == 2
+
+def test_profile_round_trips_to_responses():
+    profile = question_bank_service.enumerate_profiles(STUDENT_TYPE, limit=1)[0]
+    responses = profile_to_responses(STUDENT_TYPE, profile)
+    assert question_bank_service.get_answer_profile(STUDENT_TYPE, responses) == profile
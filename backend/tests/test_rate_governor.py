@@ -0,0 +1,86 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from services import rate_governor
+from services.rate_governor import RateGovernor, SQLiteGovernorStore, _lease_run, _new_state, _release_run, _take, _throttle
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(rate_governor, "OPENAI_REQUESTS_PER_MINUTE", 60)
+    monkeypatch.setattr(rate_governor, "OPENAI_TOKENS_PER_MINUTE", 600)
+    monkeypatch.setattr(rate_governor, "OPENAI_MAX_CONCURRENT_RUNS", 2)
+    monkeypatch.setattr(rate_governor, "OPENAI_MAX_RETRIES", 2)
+
+def test_take_spends_requests_and_tokens():
+    state = _new_state(0.0)
+    assert _take(state, 0.0, 100) == 0.0
+    assert state["requests"] == 59
+    assert state["tokens"] == 500
+
+def test_take_waits_for_the_scarcer_bucket():
+    state = _new_state(0.0)
+    state["tokens"] = 0.0
+    # 600 tokens a minute refill 10 a second, so 50 tokens take 5 seconds
+    assert _take(state, 0.0, 50) == pytest.approx(5.0)
+    assert _take(state, 5.0, 50) == 0.0
+
+def test_take_caps_a_call_larger_than_the_bucket():
+    state = _new_state(0.0)
+    assert _take(state, 0.0, 10_000) == 0.0
+    assert state["tokens"] == 0.0
+
+def test_throttle_pauses_and_halves_the_rate():
+    state = _new_state(0.0)
+    _throttle(state, 0.0, 3.0)
+    assert state["factor"] == 0.5
+    assert _take(state, 1.0, 1) == pytest.approx(2.0)
+    for _ in range(10):
+        _throttle(state, 1.0, 0.0)
+    assert state["factor"] == rate_governor.MIN_RATE_FACTOR
+
+def test_rate_recovers_without_throttles():
+    state = _new_state(0.0)
+    _throttle(state, 0.0, 0.0)
+    _take(state, 20.0, 1)
+    assert state["factor"] == pytest.approx(0.7)
+
+def test_lease_run_limits_slots_until_release_or_expiry():
+    state = _new_state(0.0)
+    assert _lease_run(state, 0.0, "a", 10.0)
+    assert _lease_run(state, 0.0, "b", 10.0)
+    assert not _lease_run(state, 0.0, "c", 10.0)
+    _release_run(state, 0.0, "a")
+    assert _lease_run(state, 0.0, "c", 10.0)
+    # Leases of crashed workers expire
+    assert _lease_run(state, 11.0, "d", 10.0)
+
+def test_sqlite_store_shares_state_between_instances(tmp_path):
+    path = str(tmp_path / "governor.db")
+
+    async def scenario():
+        await SQLiteGovernorStore(path).transact(_take, 100)
+        return await SQLiteGovernorStore(path).transact(lambda state, now: state["tokens"])
+
+    assert asyncio.run(scenario()) < 501
+
+def _server_error() -> openai.InternalServerError:
+    response = httpx.Response(500, request=httpx.Request("POST", "https://api.openai.com/v1/threads"))
+    return openai.InternalServerError("server error", response=response, body=None)
+
+def test_creates_are_not_retried_after_a_server_error(monkeypatch):
+    monkeypatch.setattr(rate_governor.random, "uniform", lambda low, high: 0.0)
+    attempts = []
+
+    async def create():
+        attempts.append(1)
+        raise _server_error()
+
+    async def scenario(idempotent):
+        with pytest.raises(openai.InternalServerError):
+            await RateGovernor("memory").call(create, idempotent=idempotent)
+
+    asyncio.run(scenario(False))
+    assert len(attempts) == 1
+    asyncio.run(scenario(True))
+    assert len(attempts) == 1 + 3
@@ -0,0 +1,47 @@
+from services.response_parser import extract_json, parse_questions, parse_learning_path
+
+STEP = {"title": "CS 101", "description": "Intro"}
+
+def test_extract_json_ignores_surrounding_text_and_trailing_commas():
+    assert extract_json('Sure! ```json\n{"questions": [{"id": 1},]}\n``` Hope that helps') == {"questions": [{"id": 1}]}
+    assert extract_json("no json here") is None
+
+def test_extract_json_skips_unbalanced_candidates():
+    assert extract_json('a {broken} then [1, 2]') == [1, 2]
+
+def test_parse_questions_from_wrapped_response():
+    response = '{"questions": [{"id": 1, "question": "Pace?", "options": ["Fast", "Slow"], "freeText": false}]}'
+    assert parse_questions(response) == [{"id": 1, "question": "Pace?", "options": ["Fast", "Slow"], "freeText": False}]
+
+def test_parse_questions_repairs_items():
+    questions = parse_questions({"questions": [{"text": "Anything else?"}, {"question": "Size?", "options": ["Small", 3]}]})
+    assert questions == [
+        {"id": 1, "question": "Anything else?", "options": [], "freeText": True},
+        {"id": 2, "question": "Size?", "options": ["Small", "3"], "freeText": False}
+    ]
+
+def test_parse_questions_renumbers_colliding_ids():
+    questions = parse_questions([{"id": 1, "question": "A", "options": [], "freeText": True}, {"question": "B"}])
+    assert [question["id"] for question in questions] == [1, 2]
+    questions = parse_questions([{"id": 2, "question": "A", "options": [], "freeText": True}, {"question": "B"}])
+    assert [question["id"] for question in questions] == [1, 2]
+
+def test_parse_learning_path_drops_only_invalid_steps():
+    steps = parse_learning_path([STEP, "not a step", {"description": "no title"}, {"course": "CS 102", "match_percentage": "80%"}])
+    assert [step["title"] for step in steps] == ["CS 101", "CS 102"]
+    assert steps[1]["match_percentage"] == 80
+    assert steps[1]["description"] == ""
+
+def test_parse_learning_path_keeps_unknown_fields():
+    assert parse_learning_path([{**STEP, "semester": 1}])[0]["semester"] == 1
+
+def test_parse_learning_path_flattens_grouped_steps():
+    assert len(parse_learning_path([[STEP, STEP], [STEP]])) == 3
+
+def test_parse_learning_path_salvages_a_truncated_response():
+    response = '[{"title": "CS 101", "description": "Intro"}, {"title": "CS 102", "descri'
+    assert [step["title"] for step in parse_learning_path(response)] == ["CS 101"]
+
+def test_nothing_salvageable_gives_an_empty_list():
+    assert parse_learning_path("I cannot help with that.") == []
+    assert parse_questions('{"questions": "none"}') == []
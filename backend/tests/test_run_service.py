@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from bench.fake_openai import FakeStream, _text_part
+from services import run_service
+from services.rate_governor import RateGovernor
+
+def _run(status: str, run_id: str = "run_1"):
+    return SimpleNamespace(id=run_id, status=status, usage=None, last_error=None)
+
+class FakeRuns:
+    def __init__(self, events: list, active: list = (), retrieved: str = "completed"):
+        self.events = events
+        self.active = list(active)
+        self.retrieved = retrieved
+        self.streams = []
+
+    async def create(self, thread_id: str, assistant_id: str, stream: bool = False, **kwargs):
+        async def events():
+            for event in self.events:
+                yield event
+        self.streams.append(FakeStream(events()))
+        return self.streams[-1]
+
+    async def list(self, thread_id: str, **kwargs):
+        return SimpleNamespace(data=self.active)
+
+    async def retrieve(self, thread_id: str, run_id: str):
+        return _run(self.retrieved, run_id)
+
+    async def cancel(self, thread_id: str, run_id: str):
+        pass
+
+@pytest.fixture
+def use_runs(monkeypatch):
+    def use(runs: FakeRuns) -> FakeRuns:
+        openai = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+        monkeypatch.setattr(run_service, "clients", SimpleNamespace(openai=openai))
+        monkeypatch.setattr(run_service, "rate_governor", RateGovernor("memory"))
+        monkeypatch.setattr(run_service, "RUN_STREAMING_ENABLED", True)
+        return runs
+    return use
+
+def test_stream_is_closed_after_the_terminal_event(use_runs):
+    runs = use_runs(FakeRuns([
+        SimpleNamespace(event="thread.run.created", data=_run("queued")),
+        SimpleNamespace(event="thread.run.completed", data=_run("completed")),
+        SimpleNamespace(event="done", data=None),
+    ]))
+    assert asyncio.run(run_service.run_assistant("thread_1", "asst_1")).status == "completed"
+    assert runs.streams[0].closed
+
+def test_stream_without_run_events_polls_the_active_run(use_runs):
+    runs = use_runs(FakeRuns([], active=[_run("in_progress", "run_2")]))
+    run = asyncio.run(run_service.run_assistant("thread_1", "asst_1"))
+    assert (run.id, run.status) == ("run_2", "completed")
+    assert runs.streams[0].closed
+
+def test_stream_without_any_run_fails_clearly(use_runs):
+    use_runs(FakeRuns([]))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run_service.run_assistant("thread_1", "asst_1"))
+    assert error.value.detail == "Assistant run stream ended without a run"
+
+def test_text_stream_is_closed_when_the_reader_stops_early(use_runs):
+    delta = SimpleNamespace(event="thread.message.delta", data=SimpleNamespace(delta=SimpleNamespace(content=[_text_part("chunk")])))
+    runs = use_runs(FakeRuns([SimpleNamespace(event="thread.run.created", data=_run("queued")), delta, delta]))
+
+    async def scenario():
+        texts = run_service.stream_run_text("thread_1", "asst_1")
+        assert await texts.__anext__() == "chunk"
+        await texts.aclose()
+
+    asyncio.run(scenario())
+    assert runs.streams[0].closed
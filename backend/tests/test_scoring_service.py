@@ -0,0 +1,34 @@
+import pytest
+from data.surveys import SURVEY_TYPES
+from services.scoring_service import FEATURE_INDEX, OPTION_FEATURES, apply_match_percentage, student_vector
+
+# Options that deliberately express no preference
+NEUTRAL_OPTIONS = {"Other", "No preference"}
+
+SURVEY_OPTIONS = sorted({
+    option
+    for questions in SURVEY_TYPES.values()
+    for question in questions
+    for option in question.options
+    if option not in NEUTRAL_OPTIONS
+})
+
+@pytest.mark.parametrize("option", SURVEY_OPTIONS)
+def test_every_survey_option_maps_to_features(option):
+    assert OPTION_FEATURES.get(option)
+    vector = student_vector([{"question": "q", "answer": option}])
+    assert vector.sum() > vector[FEATURE_INDEX["review_sentiment"]]
+
+def test_options_containing_commas_are_matched_whole():
+    vector = student_vector([{"question": "q", "answer": "Clear, structured, and organized"}])
+    assert vector[FEATURE_INDEX["professor_structured"]] == 1.0
+
+def test_free_text_answers_only_keep_the_review_preference():
+    vector = student_vector([{"question": "q", "answer": "I like robots"}])
+    assert vector.sum() == vector[FEATURE_INDEX["review_sentiment"]]
+
+def test_match_percentage_uses_the_longest_whole_code():
+    courses = [{"code": "CS 10", "match_percentage": 10}, {"code": "CS 101", "match_percentage": 90}]
+    assert apply_match_percentage({"title": "CS 101 Intro", "match_percentage": 50}, courses)["match_percentage"] == 90
+    assert apply_match_percentage({"title": "cs 10: Basics"}, courses)["match_percentage"] == 10
+    assert "match_percentage" not in apply_match_percentage({"title": "CS 1010", "match_percentage": 50}, courses)
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+from services import search_service
+
+CATALOG = [
+    {"code": "CS 10", "title": "Computing Basics", "description": "Robotics for beginners"},
+    {"code": "CS 101", "title": "Intro Programming", "description": "Robotics and programming"},
+]
+
+def _search(monkeypatch, learning_path):
+    index = SimpleNamespace(courses=CATALOG, version="v1")
+    monkeypatch.setattr(search_service, "get_assistant_key", lambda university_id, major_id: "uni_major")
+    monkeypatch.setattr(search_service, "get_course_index", lambda assistant_key: index)
+    monkeypatch.setattr(search_service, "score_catalog", lambda assistant_key, responses, index=None: [50.0] * len(CATALOG))
+    monkeypatch.setattr(search_service, "SEARCH_MIN_SCORE", 0.0)
+    monkeypatch.setattr(search_service, "SEARCH_MIN_RESULTS", 1)
+    monkeypatch.setattr(search_service, "_catalog_tokens", {})
+    session = {"university_id": "uni", "major_id": "major", "learning_path": learning_path}
+    return search_service.search_learning_path(session, [], "robotics")
+
+def test_catalog_course_with_a_prefix_code_is_not_taken_as_covered(monkeypatch):
+    results = _search(monkeypatch, [{"title": "CS 101 Intro Programming", "description": "Robotics"}])
+    titles = [result["title"] for result in results]
+    assert "CS 10 Computing Basics" in titles
+    assert titles.count("CS 101 Intro Programming") == 1
+
+def test_catalog_courses_already_in_the_path_are_skipped(monkeypatch):
+    results = _search(monkeypatch, [{"title": "cs 10: Basics", "description": "Robotics"}])
+    titles = [result["title"] for result in results]
+    assert "CS 10 Computing Basics" not in titles
+    assert "CS 101 Intro Programming" in titles
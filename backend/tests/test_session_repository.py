@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+from firebase_admin import firestore
+from services.session_repository import InMemorySessionStore, SessionRepository, apply_update, merge_fields
+
+def make_repository(store=None, **kwargs) -> SessionRepository:
+    options = {"cache_size": 100, "hot_ttl": 0, "flush_interval": 60, "batch_size": 10}
+    options.update(kwargs)
+    return SessionRepository(store or InMemorySessionStore(), **options)
+
+class FailingStore(InMemorySessionStore):
+    """In-memory store whose commits fail while fail is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = False
+
+    async def commit(self, writes: list) -> None:
+        if self.fail:
+            raise RuntimeError("store unavailable")
+        await super().commit(writes)
+
+def test_apply_update_handles_nested_paths_and_transforms():
+    data = {"survey_responses": {"responses": [{"question": "q1"}]}, "status": "new", "count": 1}
+    apply_update(data, "survey_responses.responses", firestore.ArrayUnion([{"question": "q1"}, {"question": "q2"}]))
+    apply_update(data, "thread.state.turns", 3)
+    apply_update(data, "count", firestore.Increment(2))
+    apply_update(data, "status", firestore.DELETE_FIELD)
+    assert data == {
+        "survey_responses": {"responses": [{"question": "q1"}, {"question": "q2"}]},
+        "thread": {"state": {"turns": 3}},
+        "count": 3
+    }
+
+def test_merge_fields_combines_transforms():
+    merged = merge_fields(
+        {"responses": firestore.ArrayUnion(["a"]), "count": firestore.Increment(1), "status": "new"},
+        {"responses": firestore.ArrayUnion(["a", "b"]), "count": firestore.Increment(2), "status": "done"}
+    )
+    assert merged["responses"].values == ["a", "b"]
+    assert merged["count"].value == 3
+    assert merged["status"] == "done"
+
+def test_merge_fields_folds_a_field_into_its_queued_parent():
+    merged = merge_fields({"thread": {"id": "t1", "turns": 1}}, {"thread.turns": 2})
+    assert merged == {"thread": {"id": "t1", "turns": 2}}
+
+def test_merge_fields_replaces_queued_children_with_a_later_parent():
+    merged = merge_fields({"thread.turns": 2, "status": "new"}, {"thread": {"id": "t2"}})
+    assert merged == {"status": "new", "thread": {"id": "t2"}}
+
+def test_merged_update_has_the_same_effect_as_applying_in_order():
+    updates = [{"thread": {"id": "t1", "turns": 1}}, {"thread.turns": 2, "status": "a"}, {"thread.id": "t2"}, {"status": firestore.DELETE_FIELD}]
+    sequential = {"status": "new"}
+    for fields in updates:
+        for path, value in fields.items():
+            apply_update(sequential, path, value)
+    merged = {}
+    for fields in updates:
+        merged = merge_fields(merged, fields)
+    combined = {"status": "new"}
+    for path, value in merged.items():
+        apply_update(combined, path, value)
+    assert combined == sequential
+
+def test_queued_updates_are_visible_before_and_committed_by_flush():
+    async def scenario():
+        store = InMemorySessionStore()
+        repository = make_repository(store)
+        session_id = await repository.create({"status": "new"})
+        await repository.update(session_id, {"status": "generating"})
+        assert store.sessions[session_id]["status"] == "new"
+        assert (await repository.get(session_id))["status"] == "generating"
+        await repository.flush()
+        assert store.sessions[session_id]["status"] == "generating"
+        assert not repository.pending
+    asyncio.run(scenario())
+
+def test_durable_update_commits_queued_updates_first():
+    async def scenario():
+        store = InMemorySessionStore()
+        repository = make_repository(store)
+        session_id = await repository.create({"status": "new"})
+        await repository.update(session_id, {"status": "queued", "thread": {"id": "t1"}})
+        await repository.update(session_id, {"status": "answered"}, durable=True)
+        assert store.sessions[session_id]["status"] == "answered"
+        assert store.sessions[session_id]["thread"] == {"id": "t1"}
+        assert not repository.pending
+    asyncio.run(scenario())
+
+def test_failed_flush_requeues_updates_ahead_of_later_ones():
+    async def scenario():
+        store = FailingStore()
+        repository = make_repository(store)
+        session_id = await repository.create({"status": "new", "turns": 0})
+        await repository.update(session_id, {"status": "first", "turns": firestore.Increment(1)})
+        store.fail = True
+        await repository.flush()
+        assert session_id in repository.pending
+        await repository.update(session_id, {"status": "second", "turns": firestore.Increment(1)})
+        store.fail = False
+        await repository.flush()
+        assert store.sessions[session_id]["status"] == "second"
+        assert store.sessions[session_id]["turns"] == 2
+    asyncio.run(scenario())
+
+def test_flush_drops_updates_for_deleted_sessions_and_commits_the_rest():
+    async def scenario():
+        store = InMemorySessionStore()
+        repository = make_repository(store)
+        kept = await repository.create({"status": "new"})
+        deleted = await repository.create({"status": "new"})
+        await repository.update(kept, {"status": "kept"})
+        await repository.update(deleted, {"status": "lost"})
+        del store.sessions[deleted]
+        await repository.flush()
+        assert store.sessions[kept]["status"] == "kept"
+        assert deleted not in store.sessions
+        assert not repository.pending
+    asyncio.run(scenario())
+
+def test_read_through_sees_writes_from_another_worker():
+    async def scenario():
+        store = InMemorySessionStore()
+        first, second = make_repository(store), make_repository(store)
+        session_id = await first.create({"status": "new"})
+        assert (await second.get(session_id))["status"] == "new"
+        await first.update(session_id, {"status": "answered"}, durable=True)
+        assert (await second.get(session_id))["status"] == "answered"
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("action", ["archive", "delete"])
+def test_compact_removes_stale_sessions(action):
+    async def scenario():
+        store = InMemorySessionStore()
+        repository = make_repository(store)
+        stale = await repository.create({"updated_at": "2000-01-01T00:00:00"})
+        fresh = await repository.create({"updated_at": "2999-01-01T00:00:00"})
+        assert await repository.compact(ttl_days=30, action=action) == 1
+        assert list(store.sessions) == [fresh]
+        assert (stale in store.archived) == (action == "archive")
+    asyncio.run(scenario())
+
+def test_compact_rejects_unknown_actions():
+    async def scenario():
+        store = InMemorySessionStore()
+        repository = make_repository(store)
+        await repository.create({"updated_at": "2000-01-01T00:00:00"})
+        with pytest.raises(ValueError):
+            await repository.compact(ttl_days=30, action="archve")
+        assert len(store.sessions) == 1
+    asyncio.run(scenario())
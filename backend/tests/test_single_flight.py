@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from services.single_flight import SingleFlight
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"value for {key}"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("a", fetch, "a") for _ in range(5)])
+        assert not flight.in_flight("a")
+        return results
+
+    assert asyncio.run(scenario()) == ["value for a"] * 5
+    assert calls == ["a"]
+
+def test_finished_call_is_not_reused():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        flight = SingleFlight()
+        return await flight.do("a", fetch), await flight.do("a", fetch)
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+def test_failure_reaches_every_caller():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*[flight.do("a", fail) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_cancelling_one_waiter_leaves_the_call_running():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.do("a", slow))
+        second = asyncio.create_task(flight.do("a", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+def test_cancel_stops_a_call_nobody_joined():
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        flight = SingleFlight()
+        task = flight.start("a", slow)
+        assert flight.cancel(task)
+        # A caller arriving after the cancel starts a fresh call
+        fresh = flight.start("a", slow)
+        assert fresh is not task
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert flight.cancel(fresh)
+
+    asyncio.run(scenario())
+
+def test_cancel_leaves_a_joined_call_running():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight()
+        task = flight.start("a", slow)
+        waiter = asyncio.create_task(flight.do("a", slow))
+        await asyncio.sleep(0)
+        assert not flight.cancel(task)
+        assert await waiter == "done"
+        assert not flight.cancel(task)
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+import main
+from data.surveys import SURVEY_TYPES
+
+STUDENT_TYPE = next(iter(SURVEY_TYPES))
+
+@pytest.fixture
+def client():
+    # Without entering the client, the lifespan and its warm-up do not run
+    return TestClient(main.app)
+
+def test_survey_is_served_with_a_strong_etag(client):
+    response = client.get(f"/api/surveys/{STUDENT_TYPE}")
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert len(json.loads(response.content)["questions"]) == len(SURVEY_TYPES[STUDENT_TYPE])
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_matching_if_none_match_gets_304(client, if_none_match):
+    etag = client.get(f"/api/surveys/{STUDENT_TYPE}").headers["etag"]
+    response = client.get(f"/api/surveys/{STUDENT_TYPE}", headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+def test_stale_etag_gets_the_full_survey(client):
+    response = client.get(f"/api/surveys/{STUDENT_TYPE}", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.content
+
+def test_surveys_of_different_types_have_different_etags(client):
+    etags = {client.get(f"/api/surveys/{student_type}").headers["etag"] for student_type in SURVEY_TYPES}
+    assert len(etags) == len(SURVEY_TYPES)
+
+def test_unknown_student_type_is_rejected(client):
+    assert client.get("/api/surveys/unknown").status_code == 400
@@ -53,7 +53,7 @@ export default function Home() {
       });
 
       if (result) {
-        router.push(`/survey/${result.session_id}/initial`);
+        router.push(`/survey/${result.session_id}/initial?type=${type}`);
       } else {
         throw new Error("Failed to start session");
       }
@@ -1,7 +1,7 @@
 "use client";
 
 import { useState } from "react";
-import { useRouter } from "next/navigation";
+import { useRouter, useSearchParams } from "next/navigation";
 import React from "react";
 import {
   Container,
@@ -26,6 +26,7 @@ export default function InitialSurvey({
   params: Promise<{ sessionId: string }>;
 }) {
   const router = useRouter();
+  const searchParams = useSearchParams();
   const toast = useToast();
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0);
   const [answers, setAnswers] = useState<Record<number, string>>({});
@@ -33,7 +34,8 @@ export default function InitialSurvey({
 
   const unwrappedParams = React.use(params);
   const { questions, isLoading, submitResponses } = useInitialSurvey(
-    unwrappedParams.sessionId
+    unwrappedParams.sessionId,
+    searchParams.get("type")
   );
 
   const bgColor = useColorModeValue("white", "gray.900");
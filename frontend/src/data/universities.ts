@@ -1,3 +1,5 @@
+// Generated from backend/data/catalog.py by `python -m scripts.generate_frontend_catalog`, do not edit.
+
 export interface University {
   id: string;
   name: string;
@@ -12,7 +12,7 @@ interface SurveyResponse {
   answer: string;
 }
 
-export function useInitialSurvey(sessionId: string) {
+export function useInitialSurvey(sessionId: string, studentType?: string | null) {
   const [questions, setQuestions] = useState<Question[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const effectRan = useRef(false);
@@ -23,8 +23,12 @@ export function useInitialSurvey(sessionId: string) {
 
     const fetchQuestions = async () => {
       try {
+        // The per-type survey is static and cacheable, the session lookup is only a fallback
+        const url = studentType
+          ? `http://localhost:8000/api/surveys/${studentType}`
+          : `http://localhost:8000/api/initial-survey/${sessionId}`;
         const response = await fetch(
-          `http://localhost:8000/api/initial-survey/${sessionId}`,
+          url,
           {
             method: "GET",
             headers: {
@@ -44,7 +48,7 @@ export function useInitialSurvey(sessionId: string) {
     };
 
     fetchQuestions();
-  }, [sessionId]);
+  }, [sessionId, studentType]);
 
   const submitResponses = async (
     responses: SurveyResponse[]
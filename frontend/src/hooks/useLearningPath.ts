@@ -14,33 +14,44 @@ export function useLearningPath(sessionId: string, searchQuery?: string) {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const effectRan = useRef(false);
+  const eventSourceRef = useRef<EventSource | null>(null);
 
   const fetchLearningPath = useCallback(async () => {
-    try {
-      const url = new URL(
-        `http://localhost:8000/api/learning-path/${sessionId}`
-      );
-      if (searchQuery) {
-        url.searchParams.append("search", searchQuery);
-      }
-
-      const response = await fetch(url.toString(), {
-        method: "GET",
-        headers: {
-          "Content-Type": "application/json",
-        },
-      });
-
-      if (!response.ok) throw new Error("Failed to generate learning path");
-      const { learning_path } = await response.json();
-      setLearningPath(learning_path);
-    } catch (err) {
+    eventSourceRef.current?.close();
+    setLearningPath([]);
+    setError(null);
+    setIsLoading(true);
+
+    const url = new URL(
+      `http://localhost:8000/api/learning-path/${sessionId}/stream`
+    );
+    if (searchQuery) {
+      url.searchParams.append("search", searchQuery);
+    }
+
+    // Steps arrive one by one, so the page can render as soon as the first one does
+    const eventSource = new EventSource(url.toString());
+    eventSourceRef.current = eventSource;
+
+    eventSource.addEventListener("step", (event) => {
+      const step: LearningPathStep = JSON.parse((event as MessageEvent).data);
+      setLearningPath((prev) => [...prev, step]);
+      setIsLoading(false);
+    });
+
+    eventSource.addEventListener("done", () => {
+      eventSource.close();
+      setIsLoading(false);
+    });
+
+    eventSource.addEventListener("error", (event) => {
+      const data = (event as MessageEvent).data;
       setError(
-        err instanceof Error ? err.message : "Failed to generate learning path"
+        data ? JSON.parse(data).detail : "Failed to generate learning path"
       );
-    } finally {
+      eventSource.close();
       setIsLoading(false);
-    }
+    });
   }, [sessionId, searchQuery]);
 
   useEffect(() => {
@@ -49,5 +60,9 @@ export function useLearningPath(sessionId: string, searchQuery?: string) {
     fetchLearningPath();
   }, [fetchLearningPath]);
 
+  useEffect(() => {
+    return () => eventSourceRef.current?.close();
+  }, []);
+
   return { learningPath, isLoading, error, refetch: fetchLearningPath };
 }